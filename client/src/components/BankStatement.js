@@ -29,6 +29,23 @@ function BankStatement() {
   // Reference to the component for PDF generation
   const pdfRef = useRef();
 
+  // Fetch every page of transaction logs by following next_cursor
+  const fetchAllTransactionLogs = async (url) => {
+    let data = null;
+    let cursor = null;
+    do {
+      const separator = url.includes('?') ? '&' : '?';
+      const pageUrl = cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url;
+      const page = await fetch(pageUrl).then((response) => response.json());
+      if (page.error) {
+        return page;
+      }
+      data = data ? { ...page, TransactionLogs: [...data.TransactionLogs, ...page.TransactionLogs] } : page;
+      cursor = page.next_cursor;
+    } while (cursor);
+    return data;
+  };
+
   // Function to fetch transaction logs
   const fetchTransactionLogs = (startDate = '', endDate = '') => {
     setLoading(true);
@@ -38,8 +55,7 @@ function BankStatement() {
       url += `?start_date=${startDate}&end_date=${endDate}`;
     }
 
-    fetch(url)
-      .then((response) => response.json())
+    fetchAllTransactionLogs(url)
       .then((data) => {
         if (data.error) {
           setError(data.error);
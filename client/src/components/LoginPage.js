@@ -1,7 +1,6 @@
 import React, { useState } from 'react';
 import { useAuth } from '../context/AuthContext'; // Import useAuth
 import { useNavigate } from 'react-router-dom'; // Import useNavigate
-import Cookies from 'js-cookie'; // Import Cookies
 import './LoginPage.css';
 
 const LoginPage = () => {
@@ -31,8 +30,7 @@ const LoginPage = () => {
                 login(result.userName); // Call login with the user's name
                 setSuccess(`Login successful! Welcome back!`);
                 setError('');
-                // Store the user ID in a cookie (expires in 0.1 days)
-                Cookies.set('user_id', result.user.id, { expires: 0.1 });
+                // The server has set the signed session cookie (HttpOnly, expires with the session)
 
                 // Redirect after a short delay
                 setTimeout(() => {
@@ -27,12 +27,17 @@ function TransactionLogs() {
     // Fetch transaction logs from the backend
     const fetchLogs = async () => {
       try {
-        const response = await axios.get('/api/transaction_logs');
+        // Follow next_cursor until every page of logs has been loaded
+        let response = await axios.get('/api/transaction_logs');
+        let logs = response.data.TransactionLogs || [];
+        while (response.data.next_cursor) {
+          response = await axios.get('/api/transaction_logs', { params: { cursor: response.data.next_cursor } });
+          logs = logs.concat(response.data.TransactionLogs || []);
+        }
         console.log("Response from API:", response.data); // Log the response
 
         // Check if TransactionLogs exists in the response data
         if (response.data.TransactionLogs) {
-          const logs = response.data.TransactionLogs;
 
           // Group logs by AccountID
           const grouped = logs.reduce((acc, log) => {
@@ -52,6 +57,19 @@ function TransactionLogs() {
     };
 
     fetchLogs();
+
+    // New logs are pushed by the server as they are written, instead of re-fetching every page
+    const events = new EventSource('/api/stream');
+    events.addEventListener('transaction_log', (event) => {
+      const log = JSON.parse(event.data);
+      setGroupedLogs((grouped) => ({
+        ...grouped,
+        [log.AccountID]: [...(grouped[log.AccountID] || []), log],
+      }));
+    });
+    // The stream fell behind and dropped events: reload everything, then keep listening
+    events.addEventListener('resync', fetchLogs);
+    return () => events.close();
   }, []);
 
   const handleAccountSelect = (accountId) => {
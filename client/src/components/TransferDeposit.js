@@ -34,7 +34,7 @@ function TransferDeposit({ userId }) {
     const newTransaction = {
       type: transactionType,
       amount: parseFloat(amount),
-      date: scheduledDate ? scheduledDate.format('YYYY-MM-DD') : new Date().toLocaleDateString(),
+      date: scheduledDate ? scheduledDate.format('YYYY-MM-DD') : new Date().toISOString().slice(0, 10),
       category: transactionType === 'transfer' ? 'Transfer' : 'Deposit',
       recipient: transactionType === 'transfer' ? (newRecipient ? newRecipient : savedRecipients.find((r) => r.id === recipient).name) : 'Self',
     };
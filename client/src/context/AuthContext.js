@@ -17,6 +17,8 @@ export const AuthProvider = ({ children }) => {
     };
 
     const logout = () => {
+        // Clear the server's session cookie; the local state is reset either way
+        fetch('/api/logout', { method: 'POST' }).catch(() => {});
         setUser({ first_name: '', last_name: '', isAuthenticated: false });
         // Remove user data from localStorage
         localStorage.removeItem('user');
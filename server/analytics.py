@@ -0,0 +1,169 @@
+import os
+from datetime import datetime
+import numpy as np
+from cache import analytics_cache
+from db import get_collection
+import versions
+
+# Spending analytics over a user's 'transactions', computed in vectorised NumPy passes.
+# A report covers one month plus the months leading up to it (for trends).
+transactions_collection = get_collection("transactions")
+
+ANALYTICS_HISTORY_MONTHS = int(os.getenv("ANALYTICS_HISTORY_MONTHS", 12))
+ANALYTICS_ROLLING_MONTHS = int(os.getenv("ANALYTICS_ROLLING_MONTHS", 3))
+ANALYTICS_TOP_MERCHANTS = int(os.getenv("ANALYTICS_TOP_MERCHANTS", 5))
+
+# Only the fields a report reads
+PROJECTION = {"_id": 0, "type": 1, "amount": 1, "date": 1, "category": 1, "recipient": 1}
+
+
+class Columns:
+    """A user's transactions as parallel arrays; text fields are integer codes into names."""
+
+    __slots__ = ("amount", "month", "income", "category", "categories", "recipient", "recipients")
+
+    def __init__(self, amount, month, income, category, categories, recipient, recipients):
+        self.amount = amount  # float64
+        self.month = month  # Months since year 0 (year * 12 + month - 1)
+        self.income = income  # True for deposits; everything else is spending
+        self.category = category  # Codes into categories
+        self.categories = categories
+        self.recipient = recipient  # Codes into recipients, -1 when there is none
+        self.recipients = recipients
+
+    def __len__(self):
+        return len(self.amount)
+
+    @classmethod
+    def from_docs(cls, docs):
+        # One pass over the cursor, interning categories and recipients as it goes
+        categories, recipients = {}, {}
+        amount, month, income, category, recipient = [], [], [], [], []
+        for doc in docs:
+            date = doc["date"]
+            amount.append(doc.get("amount") or 0.0)
+            month.append(date.year * 12 + date.month - 1)
+            income.append(doc.get("type") == "deposit")
+            category.append(categories.setdefault(doc.get("category") or "Uncategorised", len(categories)))
+            name = doc.get("recipient")
+            recipient.append(recipients.setdefault(name, len(recipients)) if name else -1)
+        return cls(
+            np.array(amount, dtype=np.float64), np.array(month, dtype=np.int32), np.array(income, dtype=bool),
+            np.array(category, dtype=np.int32), list(categories),
+            np.array(recipient, dtype=np.int32), list(recipients)
+        )
+
+
+def month_index(year, month):
+    return year * 12 + month - 1
+
+
+def history_range(year, month, history=ANALYTICS_HISTORY_MONTHS):
+    # [start, end) datetimes covering the report month and the history before it
+    first = month_index(year, month) - history + 1
+    start = datetime(first // 12, first % 12 + 1, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def load(user_id, year, month, history=ANALYTICS_HISTORY_MONTHS):
+    # Projected range read on the (user_id, date) index; only the report's months are loaded
+    start, end = history_range(year, month, history)
+    cursor = transactions_collection.find(
+        {"user_id": user_id, "date": {"$gte": start, "$lt": end}}, PROJECTION, batch_size=10000
+    )
+    return Columns.from_docs(cursor)
+
+
+def _money(values):
+    return np.round(values, 2).tolist()
+
+
+def _nullable(values):
+    # NaN (e.g. a change against a month with no spending) becomes null in JSON
+    return [None if np.isnan(value) else round(float(value), 4) for value in values]
+
+
+def build_report(columns, year, month, history=ANALYTICS_HISTORY_MONTHS, window=ANALYTICS_ROLLING_MONTHS,
+                 top=ANALYTICS_TOP_MERCHANTS):
+    last = month_index(year, month)
+    offset = columns.month - (last - history + 1)
+    in_range = (offset >= 0) & (offset < history)
+    if not in_range.all():
+        columns = Columns(columns.amount[in_range], columns.month[in_range], columns.income[in_range],
+                          columns.category[in_range], columns.categories, columns.recipient[in_range],
+                          columns.recipients)
+        offset = offset[in_range]
+
+    spending = np.where(columns.income, 0.0, columns.amount)
+    income = np.where(columns.income, columns.amount, 0.0)
+
+    # Month-by-month totals, deltas and a trailing average of spending
+    monthly_spending = np.bincount(offset, weights=spending, minlength=history)
+    monthly_income = np.bincount(offset, weights=income, minlength=history)
+    previous = np.concatenate(([np.nan], monthly_spending[:-1]))
+    change = monthly_spending - previous
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = np.where(previous > 0, change / previous * 100, np.nan)
+    running = np.concatenate(([0.0], np.cumsum(monthly_spending)))
+    ends = np.arange(1, history + 1)
+    starts = np.maximum(ends - window, 0)
+    rolling = (running[ends] - running[starts]) / (ends - starts)
+
+    # The report month's categories and merchants
+    current = offset == history - 1
+    category_spending = np.bincount(columns.category[current], weights=spending[current],
+                                    minlength=len(columns.categories))
+    category_income = np.bincount(columns.category[current], weights=income[current],
+                                  minlength=len(columns.categories))
+    category_count = np.bincount(columns.category[current], minlength=len(columns.categories))
+    month_spending = float(monthly_spending[-1])
+    used = np.flatnonzero(category_count)
+    used = used[np.lexsort((-category_income[used], -category_spending[used]))]
+
+    paid = current & ~columns.income & (columns.recipient >= 0)
+    merchant_spending = np.bincount(columns.recipient[paid], weights=spending[paid],
+                                    minlength=len(columns.recipients))
+    merchant_count = np.bincount(columns.recipient[paid], minlength=len(columns.recipients))
+    merchants = np.flatnonzero(merchant_count)
+    merchants = merchants[np.argsort(-merchant_spending[merchants], kind="stable")][:top]
+
+    months = last - history + 1 + np.arange(history)
+    return {
+        "year": year,
+        "month": month,
+        "totals": {
+            "income": round(float(monthly_income[-1]), 2),
+            "spending": round(month_spending, 2),
+            "net": round(float(monthly_income[-1] - month_spending), 2),
+            "count": int(current.sum()),
+        },
+        "categories": [
+            {"category": columns.categories[code], "spending": spent, "income": earned, "count": count,
+             "share": round(spent / month_spending * 100, 2) if month_spending else None}
+            for code, spent, earned, count in zip(
+                used.tolist(), _money(category_spending[used]), _money(category_income[used]),
+                category_count[used].tolist())
+        ],
+        "monthly": [
+            {"year": index // 12, "month": index % 12 + 1, "income": earned, "spending": spent,
+             "spending_change": delta, "spending_change_pct": pct, "rolling_spending": average}
+            for index, earned, spent, delta, pct, average in zip(
+                months.tolist(), _money(monthly_income), _money(monthly_spending), _nullable(change),
+                _nullable(change_pct), _money(rolling))
+        ],
+        "top_merchants": [
+            {"recipient": columns.recipients[code], "spending": spent, "count": count}
+            for code, spent, count in zip(merchants.tolist(), _money(merchant_spending[merchants]),
+                                          merchant_count[merchants].tolist())
+        ],
+    }
+
+
+def report(user_id, year, month):
+    # Memoised per (user, month) under the user's data version, which every new
+    # transaction bumps, so a cached report is never served after a write
+    version = versions.current(versions.user_key(user_id))
+    return analytics_cache.get_or_load(
+        f"{user_id}:{version}:{year}-{month:02d}", lambda: build_report(load(user_id, year, month), year, month)
+    )
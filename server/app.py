@@ -1,74 +1,93 @@
+import logging
 import os
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify
 from flask_cors import CORS
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-from dotenv import load_dotenv
-from datetime import datetime  # Added datetime for date handling
-from bson import ObjectId  # Import ObjectId for serialization and validation
-import json  # Import json for custom encoding
-from routes import api
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Custom JSON Encoder for handling ObjectId
-class JSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, ObjectId):
-            return str(o)  # Convert ObjectId to string
-        return super().default(o)
-
-app = Flask(__name__)
-app.json_encoder = JSONEncoder  # Use the custom encoder
-CORS(app)
-
-# Get the Mongo URI from the environment variables
-uri = os.getenv("MONGO_URI")
-if not uri:
-    raise ValueError("No MONGO_URI found in environment variables")
-
-# Connect to MongoDB
-client = MongoClient(uri, server_api=ServerApi('1'))
-db = client['your_db_name']  # Replace with your database name
-
-# Test the MongoDB connection
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
-
-# Example route for fetching user transactions
-@app.route('/api/user/<user_id>/transactions', methods=['GET'])
-def get_user_transactions(user_id):
+import db  # First: reads server/.env before the modules below read their settings
+from indexes import ensure_indexes
+from json_provider import BSONJSONProvider
+from logs import configure_logging
+import http_cache
+import metrics
+from routes import api, migrate_transaction_dates
+
+logger = logging.getLogger(__name__)
+
+
+# Flask app whose jsonify understands ObjectId, datetime and Decimal128
+class ZenithFlask(Flask):
+    json_provider_class = BSONJSONProvider
+
+
+# Defaults for create_app(config); any Flask setting can be passed alongside them
+DEFAULT_CONFIG = {
+    # A pymongo-compatible client (e.g. mongomock.MongoClient()) used instead of MONGO_URI
+    "MONGO_CLIENT": None,
+    "MONGO_DB_NAME": None,
+    # Migrate dates and create indexes before serving; 'python -m server.manage ensure-indexes'
+    # does the same on demand
+    "ENSURE_INDEXES_ON_STARTUP": os.getenv("ENSURE_INDEXES_ON_STARTUP", "").lower() in ("1", "true", "yes"),
+}
+
+
+def prepare_database():
+    # Store transaction dates as BSON dates, then create every index the routes rely on
+    try:
+        migrated = migrate_transaction_dates()
+        logger.info("Migrated %d transaction dates", migrated)
+        ensure_indexes(db.get_db())
+        logger.info("Indexes ready")
+    except Exception as e:
+        logger.exception("Error preparing database: %s", e)
+
+
+# Readiness probe: checks the shared MongoDB client can reach the deployment
+def ready():
     try:
-        # Validate if user_id can be converted to ObjectId
-        try:
-            user_object_id = ObjectId(user_id)
-        except Exception as e:
-            print(f"Invalid ObjectId for user_id: {user_id}, error: {str(e)}")
-            return jsonify({"error": "Invalid user_id format"}), 400
-
-        month = request.args.get('month', None)
-        print(f"Fetching transactions for user: {user_id}, month: {month}")
-
-        # Query transactions from MongoDB
-        transactions = list(db.transactions.find({"user_id": user_object_id}))
-
-        # Optionally filter by month
-        if month:
-            transactions = [
-                txn for txn in transactions if datetime.strptime(txn['date'], "%Y-%m-%d").strftime('%B') == month
-            ]
-
-        return jsonify(transactions), 200
+        db.ping()
+        return jsonify({"status": "ready"}), 200
     except Exception as e:
-        print(f"Error fetching transactions: {str(e)}")
-        return jsonify({"error": "An error occurred while fetching transactions"}), 500
+        logger.warning("Error connecting to MongoDB: %s", e)
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+
+
+def create_app(config=None):
+    # Builds and wires an app without touching the network: the MongoDB client is only
+    # created by the first query (or is the one passed as MONGO_CLIENT)
+    configure_logging()
+
+    app = ZenithFlask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    if app.config["MONGO_CLIENT"] is not None:
+        db.use_client(app.config["MONGO_CLIENT"], app.config["MONGO_DB_NAME"])
+
+    CORS(app)
+    # Per-route latency histograms and the Prometheus /metrics endpoint
+    metrics.init_app(app)
+    # gzip/brotli for larger JSON bodies (the read routes' ETags live in http_cache as well)
+    http_cache.init_app(app)
+
+    app.add_url_rule('/api/ready', 'ready', ready, methods=['GET'])
+    app.register_blueprint(api)
+
+    if app.config["ENSURE_INDEXES_ON_STARTUP"]:
+        prepare_database()
+    return app
+
+
+_app = None
+
+
+def __getattr__(name):
+    # 'app' (for 'gunicorn app:app', 'flask run' and older tests) is built on first access,
+    # so importing this module has no side effects
+    global _app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _app is None:
+        _app = create_app()
+    return _app
 
-# Register other routes from the routes module
-app.register_blueprint(api)
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app({"ENSURE_INDEXES_ON_STARTUP": True}).run(debug=True)
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from quart import Blueprint, Quart, jsonify, make_response, request
+from db import DEFAULT_DB_NAME, client_options  # First: reads server/.env before the modules below
+import auth
+import stream
+from cache import account_cache
+from json_provider import BSONJSONProvider
+from models import Account, TransactionLog
+from routes import (
+    build_date_filter,
+    build_transactions_query,
+    decode_cursor,
+    encode_cursor,
+    parse_page_size,
+    serialize_transaction,
+)
+
+logger = logging.getLogger(__name__)
+
+# Async (ASGI) variant of the read-heavy 'api' routes: same URLs and JSON contracts,
+# served by Quart with Motor so an in-flight MongoDB round trip doesn't pin a thread.
+# Run with: hypercorn async_app:app
+api_async = Blueprint('api', __name__)
+
+# One Motor client per process, created on first use inside the server's event loop
+_motor_client = None
+
+
+def get_motor_db():
+    global _motor_client
+    if _motor_client is None:
+        uri = os.getenv("MONGO_URI")
+        if not uri:
+            raise ValueError("No MONGO_URI found in environment variables")
+        _motor_client = AsyncIOMotorClient(uri, **client_options())
+    return _motor_client[os.getenv("MONGO_DB_NAME", DEFAULT_DB_NAME)]
+
+
+def close_motor_client():
+    global _motor_client
+    if _motor_client is not None:
+        _motor_client.close()
+        _motor_client = None
+
+
+async def get_user_accounts(user_id):
+    # The user's accounts, read through the same account cache as the sync routes, under the
+    # same (user, data version) key
+    async def load():
+        return await get_motor_db()["Account"].find({"userID": user_id}, Account.projection()).to_list(None)
+    version = await get_motor_db()["DataVersion"].find_one({"_id": user_id}, {"version": 1})
+    key = f"{user_id}:{version['version'] if version else 0}"
+    return [Account.from_doc(account) for account in await account_cache.get_or_load_async(key, load)]
+
+
+# Route to fetch all transaction logs, a page at a time
+@api_async.route('/api/transaction_logs', methods=['GET'])
+async def get_transaction_logs():
+    try:
+        # The signed-in user, from the same session token as the sync routes
+        user_id = auth.verify_token(request.cookies.get(auth.SESSION_COOKIE))
+
+        if user_id is None:
+            return jsonify({"error": "Not logged in"}), 401
+
+        accounts = [{"_id": account.id} for account in await get_user_accounts(user_id)]
+
+        if not accounts:
+            return jsonify({"message": "No accounts found for this user"}), 404
+
+        query = {"AccountID": {"$in": [account["_id"] for account in accounts]}}
+
+        # Optional date range, page size and cursor from the previous page
+        try:
+            date_filter = build_date_filter(request.args.get('start_date'), request.args.get('end_date'))
+            limit = parse_page_size(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            if date_filter:
+                query["Date"] = date_filter
+            if cursor:
+                query = {"$and": [query, decode_cursor(cursor)]}
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        transaction_logs = [TransactionLog.from_doc(log) for log in await get_motor_db()["TransactionLog"].find(
+            query,
+            TransactionLog.projection(),
+            sort=[('AccountID', ASCENDING), ('Date', ASCENDING), ('_id', ASCENDING)],
+            limit=limit + 1
+        ).to_list(None)]
+
+        next_cursor = None
+        if len(transaction_logs) > limit:
+            transaction_logs = transaction_logs[:limit]
+            next_cursor = encode_cursor(transaction_logs[-1])
+
+        return jsonify({
+            "UserID": user_id,
+            "TransactionLogs": [log.to_json() for log in transaction_logs],
+            "Accounts": accounts,
+            "next_cursor": next_cursor  # None on the last page
+        }), 200
+
+    except Exception as e:
+        logger.exception("Error fetching transaction logs: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to fetch account details by account IDs
+@api_async.route('/api/account_details', methods=['GET'])
+async def get_account_details():
+    try:
+        # The signed-in user, from the same session token as the sync routes
+        user_id = auth.verify_token(request.cookies.get(auth.SESSION_COOKIE))
+
+        if user_id is None:
+            return jsonify({"error": "Not logged in"}), 401
+
+        object_ids = {ObjectId(account_id) for account_id in request.args.getlist('account_ids')}
+        accounts = [account for account in await get_user_accounts(user_id) if account.id in object_ids]
+
+        if not accounts:
+            return jsonify({"message": "No accounts found for the provided IDs."}), 404
+
+        return jsonify([account.to_json() for account in accounts]), 200
+
+    except Exception as e:
+        logger.exception("Error fetching account details: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to push the user's balance changes and new transaction logs as Server-Sent Events;
+# an idle stream is a parked coroutine, so one process holds thousands of them
+@api_async.route('/api/stream', methods=['GET'])
+async def stream_events():
+    user_id = auth.verify_token(request.cookies.get(auth.SESSION_COOKIE))
+
+    if user_id is None:
+        return jsonify({"error": "Not logged in"}), 401
+
+    subscription = stream.hub.subscribe(stream.AsyncSubscription(user_id, asyncio.get_running_loop()))
+    response = await make_response(stream.events_async(stream.hub, subscription), stream.STREAM_HEADERS)
+    response.mimetype = 'text/event-stream'
+    response.timeout = None  # Streams stay open until the client leaves
+    return response
+
+
+# API Endpoint to fetch user transactions
+@api_async.route('/api/user/<user_id>/transactions', methods=['GET'])
+async def get_user_transactions(user_id):
+    # Only the signed-in user's own transactions, as in the sync route
+    signed_in = auth.verify_token(request.cookies.get(auth.SESSION_COOKIE))
+    if signed_in is None:
+        return jsonify({"error": "Not logged in"}), 401
+    if str(signed_in) != user_id:
+        return jsonify({"error": "Forbidden"}), 403
+
+    try:
+        query = build_transactions_query(user_id, request.args.get('month'), request.args.get('year'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    transactions = await get_motor_db()["transactions"].find(query, sort=[("date", ASCENDING)]).to_list(None)
+    return jsonify([serialize_transaction(txn) for txn in transactions])
+
+
+# Quart app whose jsonify understands ObjectId, datetime and Decimal128
+class ZenithQuart(Quart):
+    json_provider_class = BSONJSONProvider
+
+
+def create_async_app():
+    app = ZenithQuart(__name__)
+    app.register_blueprint(api_async)
+
+    @app.after_serving
+    async def shutdown():
+        stream.hub.stop()
+        close_motor_client()
+
+    return app
+
+
+app = create_async_app()
@@ -0,0 +1,139 @@
+import hmac
+import logging
+import os
+import secrets
+from functools import lru_cache, wraps
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from flask import current_app, g, has_app_context, jsonify, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from cache import user_cache
+from db import get_collection
+from models import User
+
+logger = logging.getLogger(__name__)
+
+# Signed, expiring session tokens. Login sets one in an HttpOnly cookie; every request's
+# token is verified once (an HMAC check, no database read) and the user id kept in flask.g.
+# The user record itself is only loaded when a route asks for it, through user_cache.
+users_collection = get_collection("User")
+
+SESSION_COOKIE = "zenith_session"
+# Seconds a token stays valid after login (0.1 days, as the client's old cookie)
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", 8640))
+# Send the cookie over HTTPS only; turn off for local development over http
+SESSION_COOKIE_SECURE = os.getenv("SESSION_COOKIE_SECURE", "false").lower() in ("1", "true", "yes")
+
+# Bearer tokens (comma-separated) accepted on service-to-service endpoints such as bulk
+# ingestion; with none set those endpoints refuse every request
+SERVICE_TOKENS = tuple(token.strip() for token in os.getenv("SERVICE_TOKENS", "").split(",") if token.strip())
+
+_generated_secret = None
+
+
+def signing_secret():
+    # The app's SECRET_KEY, else the SECRET_KEY env var, else a per-process key (sessions
+    # then don't survive a restart or carry over between workers)
+    global _generated_secret
+    secret = (current_app.config.get("SECRET_KEY") if has_app_context() else None) or os.getenv("SECRET_KEY")
+    if secret:
+        return secret
+    if _generated_secret is None:
+        logger.warning("SECRET_KEY is not set; using a random key for this process")
+        _generated_secret = secrets.token_hex(32)
+    return _generated_secret
+
+
+@lru_cache(maxsize=4)
+def _serializer(secret):
+    return URLSafeTimedSerializer(secret, salt="zenith-session")
+
+
+def issue_token(user_id):
+    return _serializer(signing_secret()).dumps(str(user_id))
+
+
+def verify_token(token, max_age=None):
+    # The token's user id, or None if it is missing, tampered with or expired
+    if not token:
+        return None
+    try:
+        return ObjectId(_serializer(signing_secret()).loads(
+            token, max_age=SESSION_MAX_AGE if max_age is None else max_age))
+    except (BadSignature, InvalidId, TypeError):
+        return None
+
+
+def set_session_cookie(response, user_id):
+    response.set_cookie(SESSION_COOKIE, issue_token(user_id), max_age=SESSION_MAX_AGE, httponly=True,
+                        secure=SESSION_COOKIE_SECURE, samesite="Lax")
+    return response
+
+
+def clear_session_cookie(response):
+    response.delete_cookie(SESSION_COOKIE, httponly=True, secure=SESSION_COOKIE_SECURE, samesite="Lax")
+    return response
+
+
+def authenticate():
+    # before_request hook: the signed-in user's id, or None
+    g.user_id = verify_token(request.cookies.get(SESSION_COOKIE))
+
+
+def current_user_id():
+    if "user_id" not in g:
+        authenticate()
+    return g.user_id
+
+
+def current_user():
+    # The signed-in user's record (without the password hash), cached for USER_CACHE_TTL
+    # seconds across requests and for the rest of this one in flask.g
+    if "principal" not in g:
+        user_id = current_user_id()
+        doc = None if user_id is None else user_cache.get_or_load(
+            user_id, lambda: users_collection.find_one(
+                {"_id": user_id}, User.projection("id", "first_name", "last_name", "email", "address")))
+        g.principal = User.from_doc(doc) if doc else None
+    return g.principal
+
+
+def login_required(view):
+    # 401 unless the request carries a valid session token
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_user_id() is None:
+            return jsonify({"error": "Not logged in"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def path_user_required(view):
+    # login_required, and the <user_id> in the URL must be the signed-in user (403 otherwise)
+    @wraps(view)
+    def wrapper(*args, user_id, **kwargs):
+        signed_in = current_user_id()
+        if signed_in is None:
+            return jsonify({"error": "Not logged in"}), 401
+        if str(user_id) != str(signed_in):
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, user_id=user_id, **kwargs)
+    return wrapper
+
+
+def valid_service_token(header):
+    # Constant-time match of an 'Authorization: Bearer <token>' header against SERVICE_TOKENS
+    scheme, _, token = (header or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    return any(hmac.compare_digest(token.encode(), allowed.encode()) for allowed in SERVICE_TOKENS)
+
+
+def service_required(view):
+    # 401 unless the request carries one of SERVICE_TOKENS; session cookies don't count
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not valid_service_token(request.headers.get("Authorization")):
+            return jsonify({"error": "Service credentials required"}), 401, {"WWW-Authenticate": "Bearer"}
+        return view(*args, **kwargs)
+    return wrapper
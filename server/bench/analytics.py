@@ -0,0 +1,86 @@
+"""Benchmark: spending-analytics report over a large transaction history.
+
+Builds --rows synthetic transactions spread over --months months (with
+realistic category and merchant cardinality), then times the vectorised
+report on the columnar arrays, the one-off conversion of cursor documents
+into those arrays, and a memoised (cached) report.
+
+Run from the server directory:
+
+    python -m bench.analytics [--rows 1000000] [--runs 20] [--budget-ms 100]
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime
+
+import numpy as np
+
+import analytics
+from cache import analytics_cache
+
+CATEGORIES = ["Groceries", "Rent", "Transport", "Dining", "Utilities", "Health", "Travel", "Shopping",
+              "Entertainment", "Income"]
+
+
+def synthetic_docs(rows, months, merchants, year, month, seed=7):
+    rng = np.random.default_rng(seed)
+    last = analytics.month_index(year, month)
+    month_indexes = last - rng.integers(0, months, rows)
+    days = rng.integers(1, 29, rows)
+    categories = rng.integers(0, len(CATEGORIES), rows)
+    recipients = rng.integers(0, merchants, rows)
+    amounts = np.round(rng.gamma(2.0, 40.0, rows), 2)
+    for i in range(rows):
+        category = CATEGORIES[categories[i]]
+        deposit = category == "Income"
+        yield {
+            "type": "deposit" if deposit else "transfer",
+            "amount": float(amounts[i]),
+            "date": datetime(int(month_indexes[i] // 12), int(month_indexes[i] % 12 + 1), int(days[i])),
+            "category": category,
+            "recipient": None if deposit else f"Merchant {recipients[i]}",
+        }
+
+
+def timed(function, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--months", type=int, default=analytics.ANALYTICS_HISTORY_MONTHS)
+    parser.add_argument("--merchants", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="Fail if the median report exceeds this")
+    args = parser.parse_args()
+    year, month = 2024, 12
+
+    start = time.perf_counter()
+    columns = analytics.Columns.from_docs(synthetic_docs(args.rows, args.months, args.merchants, year, month))
+    convert_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(columns)} transactions, {len(columns.categories)} categories, "
+          f"{len(columns.recipients)} merchants")
+    print(f"  documents -> columns (once per load, includes generating them): {convert_ms:.0f} ms")
+
+    median, worst = timed(lambda: analytics.build_report(columns, year, month), args.runs)
+    print(f"  report (vectorised):  median {median:.1f} ms, max {worst:.1f} ms")
+
+    key = f"bench:{year}-{month}"
+    analytics_cache.get_or_load(key, lambda: analytics.build_report(columns, year, month))
+    cached, _ = timed(lambda: analytics_cache.get_or_load(key, lambda: None), args.runs)
+    print(f"  report (memoised):    median {cached:.3f} ms")
+
+    within = median <= args.budget_ms
+    print(f"  {'within' if within else 'OVER'} {args.budget_ms:.0f} ms budget")
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,303 @@
+"""Load test: the main banking endpoints against a seeded database.
+
+Seeds users, accounts and transaction logs into an in-process stand-in
+(mongomock, the default) or a real MongoDB (--backend mongo, using MONGO_URI and the
+throwaway --db-name, which is dropped first; see bench.database). Each scenario
+is then driven through the Flask test client and through a real threaded WSGI
+server, and throughput, p50/p95/p99 latency and memory are reported.
+
+Results are saved as JSON so runs can be diffed between commits. Run from server/:
+
+    python -m bench.api_load --users 100 --logs 1000000 --requests 2000 \\
+        --output bench-results/$(git rev-parse --short HEAD).json
+    python -m bench.api_load --compare bench-results/abc123.json --output bench-results/def456.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import httpx
+from bson import ObjectId
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import auth
+import db
+from bench import database as bench_database
+import ledger
+import ratelimit
+import velocity
+from indexes import ensure_indexes
+from passwords import hash_password
+
+PASSWORD = "bench-password"
+SCENARIOS = ("login", "transaction_logs", "account_details", "add_transaction", "monthly_statement")
+
+
+def use_backend(args):
+    # Point the shared client at the stand-in before any route touches the database
+    if args.backend == "mongomock":
+        import mongomock
+        db.use_client(mongomock.MongoClient())
+        # mongomock has no sessions; exercise the ledger's non-transactional path
+        ledger.LEDGER_TRANSACTIONS = "off"
+    else:
+        _, os.environ["MONGO_DB_NAME"] = bench_database.check_target(args)
+    database = db.get_db()
+    database.client.drop_database(database.name)
+    return database
+
+
+def seed(database, users, accounts_per_user, logs, backend):
+    # Hashing is deliberately slow, so every user shares one hash of the same password
+    password_hash = hash_password(PASSWORD)
+    user_docs = [{
+        "_id": ObjectId(), "first_name": "Bench", "last_name": str(i), "email": f"user{i}@bench.test",
+        "password": password_hash, "address": ""
+    } for i in range(users)]
+    database.User.insert_many(user_docs)
+
+    account_docs = [{
+        "_id": ObjectId(), "userID": user["_id"], "accountType": kind, "balance": 1000000.0, "status": "Active"
+    } for user in user_docs for kind in ("Savings", "Checking", "Credit")[:accounts_per_user]]
+    database.Account.insert_many(account_docs)
+
+    start = datetime(2024, 1, 1)
+    batch = []
+    for i in range(logs):
+        batch.append({
+            "AccountID": account_docs[i % len(account_docs)]["_id"],
+            "Date": start + timedelta(minutes=i),
+            "Amount": float(i % 500) - 250.0,
+            "Description": f"Transaction {i}",
+        })
+        if len(batch) == 10000:
+            database.TransactionLog.insert_many(batch)
+            batch = []
+    if batch:
+        database.TransactionLog.insert_many(batch)
+
+    # mongomock ignores partial index filters (the unique transaction_key index would reject
+    # every second transaction) and doesn't use indexes for speed, so only index real servers
+    if backend == "mongo":
+        ensure_indexes(database)
+    return user_docs, account_docs
+
+
+def build_requests(user_docs, account_docs, count):
+    # (scenario, method, path, cookies, json body) for each scenario, round-robin over users
+    accounts_by_user = {}
+    for account in account_docs:
+        accounts_by_user.setdefault(account["userID"], []).append(account["_id"])
+
+    requests = {}
+    for scenario in SCENARIOS:
+        requests[scenario] = []
+        for i in range(count):
+            user = user_docs[i % len(user_docs)]
+            account_ids = accounts_by_user[user["_id"]]
+            cookies = {auth.SESSION_COOKIE: auth.issue_token(user["_id"])}
+            if scenario == "login":
+                request = ("POST", "/api/LoginPage", {}, {"email": user["email"], "password": PASSWORD})
+            elif scenario == "transaction_logs":
+                request = ("GET", "/api/transaction_logs?limit=100", cookies, None)
+            elif scenario == "account_details":
+                query = "&".join(f"account_ids={account_id}" for account_id in account_ids)
+                request = ("GET", f"/api/account_details?{query}", cookies, None)
+            elif scenario == "add_transaction":
+                request = ("POST", f"/api/user/{user['_id']}/transaction", cookies, {
+                    "type": "deposit", "amount": 1.0, "date": "2024-03-01", "category": "Bench",
+                    "account_id": str(account_ids[0])
+                })
+            else:
+                request = ("GET", "/api/statements/2024/3", cookies, None)
+            requests[scenario].append(request)
+    return requests
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # Per-request access log lines would dominate the measurement
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def rss_mb():
+    # Current resident set size where /proc is available, else the peak
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(latencies, errors, elapsed, rss_before):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[max(0, int(len(latencies) * p) - 1)]
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(percentile(0.95), 3),
+        "p99_ms": round(percentile(0.99), 3),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_growth_mb": round(rss_mb() - rss_before, 1),
+    }
+
+
+def drive_test_client(app, requests):
+    # In-process, one request at a time: measures the handler and the database only
+    client = app.test_client()
+    latencies, errors = [], 0
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    for method, path, cookies, body in requests:
+        for name, value in cookies.items():
+            client.set_cookie(name, value)
+        began = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        latencies.append((time.perf_counter() - began) * 1000)
+        errors += response.status_code >= 400
+    return summarize(latencies, errors, time.perf_counter() - start, rss_before)
+
+
+def drive_wsgi(base_url, requests, clients):
+    # Real sockets and a threaded WSGI server, with concurrent keep-alive clients
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def send(request):
+        nonlocal errors
+        method, path, cookies, body = request
+        if not hasattr(local, "client"):
+            local.client = httpx.Client(base_url=base_url, timeout=60)
+        began = time.perf_counter()
+        try:
+            headers = {"Cookie": "; ".join(f"{name}={value}" for name, value in cookies.items())}
+            failed = local.client.request(method, path, headers=headers, json=body).status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        elapsed_ms = (time.perf_counter() - began) * 1000
+        with lock:
+            latencies.append(elapsed_ms)
+            errors += failed
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(send, requests))
+    return summarize(latencies, errors, time.perf_counter() - start, rss_before)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    # Per-scenario change in throughput and p99 against an earlier results file
+    print(f"\nChange vs {previous['meta'].get('commit')}:")
+    for driver, scenarios in current["results"].items():
+        for scenario, result in scenarios.items():
+            before = previous["results"].get(driver, {}).get(scenario)
+            if not before:
+                continue
+            throughput = (result["requests_per_sec"] / before["requests_per_sec"] - 1) * 100
+            p99 = (result["p99_ms"] / before["p99_ms"] - 1) * 100
+            print(f"  {driver:<12} {scenario:<18} throughput {throughput:+6.1f}%  p99 {p99:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("mongomock", "mongo"), default="mongomock")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--accounts-per-user", type=int, choices=(1, 2, 3), default=3)
+    parser.add_argument("--logs", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario and driver")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent clients for the WSGI driver")
+    parser.add_argument("--scenario", action="append", dest="scenarios", choices=SCENARIOS)
+    parser.add_argument("--driver", action="append", dest="drivers", choices=("test_client", "wsgi"))
+    parser.add_argument("--port", type=int, default=5200)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    bench_database.add_arguments(parser)
+    args = parser.parse_args()
+
+    database = use_backend(args)
+    seed_start = time.perf_counter()
+    user_docs, account_docs = seed(database, args.users, args.accounts_per_user, args.logs, args.backend)
+    print(f"Seeded {args.users} users, {len(account_docs)} accounts, {args.logs} logs "
+          f"in {time.perf_counter() - seed_start:.1f}s ({args.backend})")
+
+    from app import create_app
+    app = create_app()
+    # Every scenario repeats the same few users far faster than any customer would; measure
+    # the endpoints rather than the login rate limits and velocity rules tripping on that
+    ratelimit.limiter.enabled = False
+    velocity.engine.rules = []
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    requests = build_requests(user_docs, account_docs, args.requests)
+    drivers = args.drivers or ["test_client", "wsgi"]
+    scenarios = args.scenarios or list(SCENARIOS)
+
+    results = {}
+    if "test_client" in drivers:
+        results["test_client"] = {scenario: drive_test_client(app, requests[scenario]) for scenario in scenarios}
+    if "wsgi" in drivers:
+        server = make_server("127.0.0.1", args.port, app, threaded=True, request_handler=QuietRequestHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            results["wsgi"] = {
+                scenario: drive_wsgi(base_url, requests[scenario], args.clients) for scenario in scenarios
+            }
+        finally:
+            server.shutdown()
+
+    for driver, driver_results in results.items():
+        print(f"{driver} ({args.requests} requests per scenario"
+              f"{f', {args.clients} clients' if driver == 'wsgi' else ''}):")
+        for scenario, result in driver_results.items():
+            print(f"  {scenario:<18} {result['requests_per_sec']:8.1f} req/s  p50 {result['p50_ms']:7.2f} ms"
+                  f"  p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms"
+                  f"  rss {result['rss_mb']:7.1f} MB  errors {result['errors']}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
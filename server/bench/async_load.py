@@ -0,0 +1,166 @@
+"""Load test: sync Flask routes vs the async (Quart + Motor) routes.
+
+Seeds a throwaway database, starts each server in a subprocess and drives
+/api/transaction_logs, /api/account_details and /api/user/<id>/transactions
+with N concurrent clients, then reports requests/sec and tail latency.
+
+Needs a reachable MongoDB in MONGO_URI; data goes to the throwaway --db-name,
+which is dropped first (see bench.database). Run from server/:
+
+    python -m bench.async_load --db-name ZenithBankBench --clients 500 --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from bson import ObjectId
+from pymongo import MongoClient
+
+import auth
+from bench import database as bench_database
+from indexes import ensure_indexes
+
+SERVERS = {
+    "sync (werkzeug, threaded)": [
+        sys.executable, "-c",
+        "import sys; from werkzeug.serving import run_simple; from app import create_app; "
+        "run_simple('127.0.0.1', int(sys.argv[1]), create_app(), threaded=True)",
+        "{port}",
+    ],
+    "async (hypercorn, Quart + Motor)": [
+        sys.executable, "-m", "hypercorn", "async_app:app", "--bind", "127.0.0.1:{port}",
+    ],
+}
+
+
+def seed(uri, db_name, logs):
+    db = MongoClient(uri)[db_name]
+    db.client.drop_database(db_name)
+
+    user_id = ObjectId()
+    account_ids = db.Account.insert_many([
+        {"userID": user_id, "accountType": kind, "balance": 1000.0, "status": "Active"}
+        for kind in ("Savings", "Checking", "Credit")
+    ]).inserted_ids
+
+    start = datetime(2024, 1, 1)
+    db.TransactionLog.insert_many({
+        "AccountID": account_ids[i % len(account_ids)],
+        "Date": start + timedelta(minutes=i),
+        "Amount": float(i % 500) - 250.0,
+        "Description": f"Transaction {i}",
+    } for i in range(logs))
+    db.transactions.insert_many({
+        "user_id": str(user_id), "type": "deposit", "amount": 10, "category": "Income",
+        "date": start + timedelta(hours=i),
+    } for i in range(min(logs, 5000)))
+
+    ensure_indexes(db)
+    return user_id, account_ids
+
+
+async def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(f"{base_url}/api/user/ready/transactions")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not start")
+
+
+async def drive(base_url, paths, cookies, clients, total):
+    latencies = []
+    errors = 0
+    issued = 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal issued, errors
+            while issued < total:
+                path = paths[issued % len(paths)]
+                issued += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--seed-logs", type=int, default=50000)
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    bench_database.add_arguments(parser)
+    args = parser.parse_args()
+
+    uri, db_name = bench_database.check_target(args)
+    user_id, account_ids = seed(uri, db_name, args.seed_logs)
+    paths = [
+        "/api/transaction_logs?limit=100",
+        "/api/account_details?" + "&".join(f"account_ids={account_id}" for account_id in account_ids),
+        f"/api/user/{user_id}/transactions?month=January&year=2024",
+    ]
+    # Both servers verify the session cookie signed here with the same key
+    os.environ.setdefault("SECRET_KEY", "zenith-bench")
+    env = dict(os.environ, MONGO_DB_NAME=db_name)
+
+    results = {}
+    for offset, (name, command) in enumerate(SERVERS.items()):
+        port = args.port + offset
+        server = subprocess.Popen(
+            [part.format(port=port) for part in command], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            asyncio.run(wait_until_up(base_url))
+            results[name] = asyncio.run(
+                drive(base_url, paths, {auth.SESSION_COOKIE: auth.issue_token(user_id)}, args.clients, args.requests)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.requests} requests from {args.clients} concurrent clients")
+    for name, result in results.items():
+        print(f"  {name:<34} {result['requests_per_sec']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms"
+              f"  p95 {result['p95_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  errors {result['errors']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Guards for the benches that seed (and first drop) a real MongoDB database.
+
+A bench only ever drops the database named by its --db-name. It refuses the app's
+own database names, and any MONGO_URI that isn't on this machine unless
+--allow-remote is given, so a stray MONGO_DB_NAME or server/.env can't point a
+run at live data.
+"""
+import os
+import sys
+
+import db
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "[::1]"}
+
+
+def add_arguments(parser):
+    parser.add_argument("--db-name", help="Throwaway database to seed; it is dropped first (required for MongoDB)")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="Allow a MONGO_URI that isn't on this machine (never point this at production)")
+
+
+def uri_hosts(uri):
+    # Host names in a mongodb:// URI; None for mongodb+srv://, whose hosts come from DNS
+    scheme, _, rest = uri.partition("://")
+    if scheme != "mongodb":
+        return None
+    hosts = rest.split("/", 1)[0].split("?", 1)[0].rpartition("@")[2]
+    return [host.rsplit(":", 1)[0] if not host.endswith("]") else host for host in hosts.split(",")]
+
+
+def check_target(args):
+    # The MONGO_URI and database a bench may drop, or exit with the reason it may not
+    uri = os.getenv("MONGO_URI")
+    problem = None
+    if not uri:
+        problem = "MONGO_URI is not set"
+    elif not args.db_name:
+        problem = "--db-name is required: the bench drops that database before seeding it"
+    elif args.db_name in (db.DEFAULT_DB_NAME, os.getenv("MONGO_DB_NAME")):
+        problem = f"refusing to drop '{args.db_name}', the app's database; pick a throwaway name"
+    elif not args.allow_remote:
+        hosts = uri_hosts(uri)
+        if hosts is None or not set(hosts) <= LOCAL_HOSTS:
+            problem = "MONGO_URI is not a local server; pass --allow-remote only for a disposable cluster"
+    if problem:
+        sys.exit(f"error: {problem}")
+    return uri, args.db_name
@@ -0,0 +1,101 @@
+"""Microbenchmark: serializing a 10k-row /api/transaction_logs response.
+
+Compares the old per-request recursive serialize() + stdlib jsonify with the
+BSON-aware JSON provider (orjson when installed, stdlib json otherwise).
+
+Run from the server directory:
+
+    python -m bench.json_encoding [--rows 10000] [--repeat 20]
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+
+import json_provider
+from json_provider import BSONJSONProvider
+
+
+def make_response_body(rows):
+    account_ids = [ObjectId() for _ in range(3)]
+    start = datetime(2024, 1, 1)
+    logs = [{
+        "_id": ObjectId(),
+        "AccountID": account_ids[i % len(account_ids)],
+        "Date": start + timedelta(minutes=i),
+        "Amount": float(i % 500) - 250.0,
+        "Description": f"Transaction {i}",
+    } for i in range(rows)]
+    return {
+        "UserID": ObjectId(),
+        "TransactionLogs": logs,
+        "Accounts": [{"_id": account_id} for account_id in account_ids],
+        "next_cursor": None,
+    }
+
+
+def legacy_serialize(data):
+    # The closure get_transaction_logs used to define on every request
+    if isinstance(data, ObjectId):
+        return str(data)
+    if isinstance(data, list):
+        return [legacy_serialize(item) for item in data]
+    if isinstance(data, dict):
+        return {key: legacy_serialize(value) for key, value in data.items()}
+    return data
+
+
+def time_it(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    body = make_response_body(args.rows)
+
+    legacy_app = Flask("legacy")
+    provider_app = Flask("provider")
+    provider_app.json = BSONJSONProvider(provider_app)
+
+    def legacy():
+        with legacy_app.app_context():
+            legacy_app.json.response(legacy_serialize(body)).get_data()
+
+    def provider():
+        with provider_app.app_context():
+            provider_app.json.response(body).get_data()
+
+    def provider_stdlib():
+        saved, json_provider.orjson = json_provider.orjson, None
+        try:
+            provider()
+        finally:
+            json_provider.orjson = saved
+
+    results = {
+        "legacy serialize() + jsonify": time_it(legacy, args.repeat),
+        "BSONJSONProvider (stdlib json)": time_it(provider_stdlib, args.repeat),
+    }
+    if json_provider.orjson is not None:
+        results["BSONJSONProvider (orjson)"] = time_it(provider, args.repeat)
+
+    baseline = results["legacy serialize() + jsonify"]
+    print(f"Serializing a {args.rows}-row transaction log response (median of {args.repeat} runs)")
+    for name, ms in results.items():
+        print(f"  {name:<32} {ms:8.2f} ms  ({baseline / ms:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Microbenchmark: login latency and throughput for password hash methods.
+
+Hashes and verifies through the same size-bounded pool the login route uses,
+so the numbers reflect HASH_POOL_SIZE as well as the method's cost.
+
+Run from the server directory:
+
+    python -m bench.password_hashing [--logins 200] [--method scrypt --method pbkdf2:sha256:600000]
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+import passwords
+
+DEFAULT_METHODS = ["scrypt", "pbkdf2:sha256:600000", "pbkdf2:sha256:1000000"]
+
+
+def measure(method, logins, clients):
+    stored = generate_password_hash("correct horse", method=method)
+
+    def login():
+        start = time.perf_counter()
+        passwords.verify_password(stored, "correct horse")
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as requests:
+        latencies = sorted(requests.map(lambda _: login(), range(logins)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "logins_per_sec": logins / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=passwords.HASH_POOL_SIZE)
+    parser.add_argument("--method", action="append", dest="methods")
+    args = parser.parse_args()
+
+    print(f"{args.logins} logins from {args.clients} clients, pool size {passwords.HASH_POOL_SIZE}")
+    for method in args.methods or DEFAULT_METHODS:
+        result = measure(method, args.logins, args.clients)
+        print(f"  {method:<24} {result['logins_per_sec']:7.1f} logins/s"
+              f"  p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
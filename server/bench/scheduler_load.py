@@ -0,0 +1,136 @@
+"""Load test: scheduled-payment workers draining a backlog of due payments.
+
+Seeds --payments due one-off payments spread over --accounts accounts, then runs
+--workers scheduler workers (each with --concurrency paying threads) until nothing
+is due. Reports payments per minute and checks every payment was paid exactly once.
+
+Uses a real MongoDB by default (MONGO_URI; data goes to the throwaway --db-name,
+which is dropped first; see bench.database). --backend mongomock runs in-process,
+but mongomock's find_one_and_update isn't atomic across threads, so it is limited
+to one worker and one thread. Run from server/:
+
+    python -m bench.scheduler_load --db-name ZenithBankBench --payments 50000 --workers 4 --concurrency 16
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import db
+import ledger
+from bench import database as bench_database
+import scheduler
+from indexes import ensure_indexes
+
+
+def use_backend(args):
+    if args.backend == "mongomock":
+        import mongomock
+        db._client = mongomock.MongoClient()
+        # mongomock has no sessions; exercise the ledger's non-transactional path
+        ledger.LEDGER_TRANSACTIONS = "off"
+    else:
+        _, os.environ["MONGO_DB_NAME"] = bench_database.check_target(args)
+    database = db.get_db()
+    database.client.drop_database(database.name)
+    if args.backend == "mongomock":
+        # mongomock ignores partial filters; every transaction here carries a key
+        database.transactions.create_index("transaction_key", unique=True)
+    else:
+        ensure_indexes(database)
+    return database
+
+
+def seed(database, payments, accounts, amount):
+    user_id = ObjectId()
+    account_ids = database.Account.insert_many([
+        {"userID": user_id, "accountType": "Checking", "balance": amount * payments, "status": "Active"}
+        for _ in range(accounts)
+    ]).inserted_ids
+
+    due = datetime.utcnow() - timedelta(minutes=1)
+    batch = []
+    for i in range(payments):
+        batch.append(scheduler.new_payment(user_id, account_ids[i % accounts], {
+            "amount": amount, "payee": f"Payee {i % 100}", "paymentType": "one-off",
+            "selectedDate": due.strftime("%Y-%m-%d")
+        }))
+        if len(batch) == 10000:
+            database.ScheduledPayment.insert_many(batch)
+            batch = []
+    if batch:
+        database.ScheduledPayment.insert_many(batch)
+    return account_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("mongo", "mongomock"), default="mongo")
+    parser.add_argument("--payments", type=int, default=20000)
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=scheduler.SCHEDULER_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=scheduler.SCHEDULER_BATCH_SIZE)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    bench_database.add_arguments(parser)
+    args = parser.parse_args()
+    if args.backend == "mongomock":
+        args.workers = args.concurrency = 1
+
+    amount = 1.0
+    database = use_backend(args)
+    account_ids = seed(database, args.payments, args.accounts, amount)
+    opening = sum(account["balance"] for account in database.Account.find({"_id": {"$in": account_ids}}))
+
+    totals = []
+    lock = threading.Lock()
+
+    def worker(number):
+        result = scheduler.run_worker(
+            worker_id=f"bench-{number}", concurrency=args.concurrency, batch_size=args.batch_size, once=True
+        )
+        with lock:
+            totals.append(result)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    paid = sum(result["paid"] for result in totals)
+    closing = sum(account["balance"] for account in database.Account.find({"_id": {"$in": account_ids}}))
+    result = {
+        "payments": args.payments,
+        "paid": paid,
+        "duplicates": sum(result["duplicate"] for result in totals),
+        "failed": sum(result["failed"] for result in totals),
+        "seconds": round(elapsed, 2),
+        "payments_per_minute": round(paid / elapsed * 60),
+        "still_due": database.ScheduledPayment.count_documents({"next_run_at": {"$ne": None}}),
+        "transactions": database.transactions.count_documents({}),
+        "debited": opening - closing,
+    }
+
+    print(f"{args.workers} workers x {args.concurrency} threads ({args.backend}):")
+    print(f"  paid {paid}/{args.payments} in {elapsed:.1f}s = {result['payments_per_minute']} payments/min"
+          f"  (duplicates {result['duplicates']}, failed {result['failed']})")
+    # Exactly once: one transaction and one debit per payment, nothing left due
+    exactly_once = result["transactions"] == args.payments and result["debited"] == amount * args.payments \
+        and result["still_due"] == 0
+    print(f"  exactly once: {'yes' if exactly_once else 'NO'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dict(result, args=vars(args)), f, indent=2)
+    return 0 if exactly_once else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,67 @@
+"""Benchmark: import-to-ready time of the Flask app, without network access.
+
+Each run is a fresh interpreter that imports the app module, calls create_app()
+with a mongomock client injected and serves one request. 'ready' is the time
+from the first import to that response; 'own' leaves out the third-party
+imports (flask, pymongo, ...), which are timed separately as the floor.
+
+Run from the server directory:
+
+    python -m bench.startup [--runs 20] [--budget-ms 100]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in the child interpreter; mongomock is imported first so it is not counted
+CHILD = """
+import json, time
+import mongomock
+start = time.perf_counter()
+import flask, flask_cors, pymongo, dotenv, werkzeug.security
+libraries = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app({"MONGO_CLIENT": mongomock.MongoClient()})
+created = time.perf_counter()
+assert app.test_client().get('/api/ready').status_code == 200
+served = time.perf_counter()
+print(json.dumps({
+    "libraries": libraries - start, "import": imported - libraries, "create_app": created - imported,
+    "first_request": served - created, "own": served - libraries, "ready": served - start,
+}))
+"""
+
+
+def run_once():
+    env = dict(os.environ)
+    env.pop("MONGO_URI", None)  # The injected mongomock client is the only database
+    output = subprocess.run([sys.executable, "-c", CHILD], check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="Fail if median 'own' time exceeds this")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(f"{'phase':<15}{'median ms':>12}{'max ms':>10}")
+    medians = {}
+    for phase in ("libraries", "import", "create_app", "first_request", "own", "ready"):
+        values = [run[phase] * 1000 for run in runs]
+        medians[phase] = statistics.median(values)
+        print(f"{phase:<15}{medians[phase]:>12.1f}{max(values):>10.1f}")
+
+    within = medians["own"] <= args.budget_ms
+    print(f"own import-to-ready {'within' if within else 'OVER'} {args.budget_ms:.0f} ms budget")
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,169 @@
+"""Load test: idle /api/stream subscribers held by one async server process.
+
+Starts async_app under hypercorn in a subprocess (on an in-process mongomock
+database by default, or MONGO_URI with --backend mongo), opens --subscribers
+Server-Sent Event streams for distinct signed-in users, waits for every
+snapshot, then holds them idle for --idle seconds. Reports the server's memory
+per stream and its CPU use while idle, and fails over either budget.
+
+Run from the server directory (the open-file limit is raised to fit, up to the hard limit):
+
+    python -m bench.stream_load [--subscribers 10000] [--idle 60] [--budget-kb 64] [--budget-cpu 5]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from bson import ObjectId
+
+import auth
+
+SERVER = (
+    "import asyncio, sys, db\n"
+    "if sys.argv[2] == 'mongomock':\n"
+    "    import mongomock; db.use_client(mongomock.MongoClient())\n"
+    "from hypercorn.asyncio import serve\n"
+    "from hypercorn.config import Config\n"
+    "from async_app import app\n"
+    "config = Config(); config.bind = ['127.0.0.1:' + sys.argv[1]]; config.backlog = 4096\n"
+    "config.accesslog = None; config.errorlog = None\n"
+    "asyncio.run(serve(app, config))\n"
+)
+
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def cpu_seconds(pid):
+    # utime + stime of the whole process, in clock ticks
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+class Subscriber:
+    # A bare HTTP/1.1 client: keeps one stream open and counts what arrives
+    def __init__(self, port, token):
+        self.port = port
+        self.token = token
+        self.ready = asyncio.Event()
+        self.heartbeats = 0
+        self.failed = None
+
+    async def run(self):
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+            writer.write((f"GET /api/stream HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n"
+                          f"Cookie: {auth.SESSION_COOKIE}={self.token}\r\n\r\n").encode())
+            status = await reader.readline()
+            if b" 200 " not in status:
+                raise RuntimeError(status.decode().strip())
+            while line := await reader.readline():
+                if line.startswith(b"event: snapshot"):
+                    self.ready.set()
+                elif line.startswith(b": keep-alive"):
+                    self.heartbeats += 1
+        except (OSError, RuntimeError) as e:
+            self.failed = e
+        finally:
+            self.ready.set()
+
+
+async def hold(port, pid, count, idle, batch):
+    subscribers = [Subscriber(port, auth.issue_token(ObjectId())) for _ in range(count)]
+    rss_before = rss_kb(pid)
+    tasks = []
+    start = time.perf_counter()
+    # Connect in batches so the listen backlog never overflows
+    for i in range(0, count, batch):
+        tasks += [asyncio.create_task(subscriber.run()) for subscriber in subscribers[i:i + batch]]
+        await asyncio.gather(*(subscriber.ready.wait() for subscriber in subscribers[i:i + batch]))
+    connect_seconds = time.perf_counter() - start
+    failed = [subscriber.failed for subscriber in subscribers if subscriber.failed]
+    rss_connected = rss_kb(pid)
+
+    cpu_before = cpu_seconds(pid)
+    await asyncio.sleep(idle)
+    idle_cpu = (cpu_seconds(pid) - cpu_before) / idle * 100
+    rss_idle = rss_kb(pid)
+    dropped = sum(subscriber.failed is not None for subscriber in subscribers) - len(failed)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "connect_seconds": connect_seconds,
+        "failed": len(failed),
+        "first_error": failed[0] if failed else None,
+        "dropped": dropped,
+        "rss_before_mb": rss_before / 1024,
+        "rss_idle_mb": rss_idle / 1024,
+        "kb_per_stream": (rss_connected - rss_before) / max(1, count - len(failed)),
+        "idle_growth_mb": (rss_idle - rss_connected) / 1024,
+        "idle_cpu_pct": idle_cpu,
+        "heartbeats": sum(subscriber.heartbeats for subscriber in subscribers),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--idle", type=float, default=60, help="Seconds to hold the streams idle")
+    parser.add_argument("--backend", choices=("mongomock", "mongo"), default="mongomock")
+    parser.add_argument("--batch", type=int, default=500, help="Streams opened at a time")
+    parser.add_argument("--port", type=int, default=5300)
+    parser.add_argument("--budget-kb", type=float, default=64, help="Fail above this server memory per stream")
+    parser.add_argument("--budget-cpu", type=float, default=5, help="Fail above this idle server CPU percent")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < args.subscribers + 100:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, args.subscribers + 1000), hard))
+
+    # The server verifies the cookies signed here with the same key, and inherits the raised
+    # open-file limit
+    os.environ.setdefault("SECRET_KEY", "zenith-bench")
+    server = subprocess.Popen([sys.executable, "-c", SERVER, str(args.port), args.backend])
+    try:
+        asyncio.run(wait_until_up(args.port))
+        result = asyncio.run(hold(args.port, server.pid, args.subscribers, args.idle, args.batch))
+    finally:
+        server.terminate()
+        server.wait()
+
+    error = f": {result['first_error']}" if result["failed"] else ""
+    print(f"{args.subscribers} streams opened in {result['connect_seconds']:.1f}s ({result['failed']} failed{error}), "
+          f"held idle {args.idle:g}s ({result['dropped']} dropped, {result['heartbeats']} heartbeats)")
+    print(f"  server RSS: {result['rss_before_mb']:.0f} MB -> {result['rss_idle_mb']:.0f} MB, "
+          f"{result['kb_per_stream']:.1f} KB per stream, {result['idle_growth_mb']:+.1f} MB while idle")
+    print(f"  server CPU while idle: {result['idle_cpu_pct']:.1f}%")
+
+    within = (result["failed"] == 0 and result["dropped"] == 0 and result["kb_per_stream"] <= args.budget_kb
+              and result["idle_cpu_pct"] <= args.budget_cpu)
+    print(f"  {'within' if within else 'OVER'} budget ({args.budget_kb:g} KB per stream, {args.budget_cpu:g}% CPU)")
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
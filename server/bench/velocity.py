@@ -0,0 +1,98 @@
+"""Benchmark: velocity-rule overhead per transaction at a sustained transaction rate.
+
+--threads request threads together offer --tps transfers and deposits per
+second (paced in real time) from --users users to the default rules, for
+--seconds seconds. Reports per-check latency (including lock contention and
+GIL hand-offs between the threads) and the single-thread capacity.
+
+Run from the server directory:
+
+    python -m bench.velocity [--tps 5000] [--seconds 10] [--threads 8] [--budget-ms 1]
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+import velocity
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def make_events(count, users, recipients, seed):
+    rng = random.Random(seed)
+    return [(f"user{rng.randrange(users)}", "deposit" if rng.random() < 0.2 else "transfer",
+             round(rng.uniform(1, 500), 2), f"payee{rng.randrange(recipients)}") for _ in range(count)]
+
+
+def check(engine, event):
+    user_id, kind, amount, recipient = event
+    try:
+        engine.check(user_id, kind, amount, recipient if kind == "transfer" else None)
+        if kind == "transfer":
+            engine.remember_recipient(user_id, recipient)
+        return False
+    except velocity.VelocityLimitExceeded:
+        return True
+
+
+def paced(engine, events, tps, threads):
+    # Each thread sends every threads-th event at its scheduled time
+    samples = [[] for _ in range(threads)]
+    blocked = [0] * threads
+    start = time.perf_counter() + 0.1
+
+    def run(worker):
+        for i in range(worker, len(events), threads):
+            delay = start + i / tps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            began = time.perf_counter()
+            blocked[worker] += check(engine, events[i])
+            samples[worker].append((time.perf_counter() - began) * 1000)
+
+    workers = [threading.Thread(target=run, args=(worker,)) for worker in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [sample for worker in samples for sample in worker], sum(blocked), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tps", type=float, default=5000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--recipients", type=int, default=50, help="Distinct recipients per user")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="Fail if p99 exceeds this")
+    args = parser.parse_args()
+
+    events = make_events(int(args.tps * args.seconds), args.users, args.recipients, seed=7)
+    engine = velocity.RuleEngine(velocity.MemoryWindowStore(), velocity.default_rules())
+    latencies, blocked, elapsed = paced(engine, events, args.tps, args.threads)
+    p99 = percentile(latencies, 0.99)
+    print(f"{len(events)} checks over {elapsed:.1f}s ({len(events) / elapsed:,.0f} TPS offered), "
+          f"{args.threads} threads, {args.users} users, {blocked} blocked")
+    print(f"  per check: p50 {statistics.median(latencies) * 1000:.1f} us, p99 {p99 * 1000:.1f} us, "
+          f"max {max(latencies) * 1000:.1f} us")
+
+    # Back-to-back on one thread: the CPU cost alone, and how far above the target rate it goes
+    unpaced = velocity.RuleEngine(velocity.MemoryWindowStore(), velocity.default_rules())
+    start = time.perf_counter()
+    for event in events:
+        check(unpaced, event)
+    print(f"  capacity (1 thread, unpaced): {len(events) / (time.perf_counter() - start):,.0f} checks/s")
+
+    within = p99 <= args.budget_ms
+    print(f"  {'within' if within else 'OVER'} {args.budget_ms:g} ms p99 budget")
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from bson import json_util
+
+# Marks a miss, so falsy values such as an empty account list can still be cached
+MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Backend for any Redis-compatible client exposing get and set(ex=)."""
+
+    def __init__(self, client, prefix="zenith:"):
+        self._client = client
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return MISSING if raw is None else json_util.loads(raw)
+
+    def set(self, key, value, ttl):
+        # Extended JSON keeps ObjectIds and dates intact across the round trip
+        self._client.set(self._prefix + key, json_util.dumps(value), ex=max(1, int(ttl)))
+
+class ReadThroughCache:
+    """Read-through cache for one kind of lookup, with hit/miss counters."""
+
+    def __init__(self, backend, namespace, ttl):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self._counters = {"hits": 0, "misses": 0}
+        self._counters_lock = threading.Lock()
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def _count(self, counter):
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+    def get_or_load(self, key, loader):
+        value = self.backend.get(self._key(key))
+        if value is not MISSING:
+            self._count("hits")
+            return value
+
+        self._count("misses")
+        value = loader()
+        self.backend.set(self._key(key), value, self.ttl)
+        return value
+
+    async def get_or_load_async(self, key, loader):
+        # Same as get_or_load, awaiting an async loader
+        value = self.backend.get(self._key(key))
+        if value is not MISSING:
+            self._count("hits")
+            return value
+
+        self._count("misses")
+        value = await loader()
+        self.backend.set(self._key(key), value, self.ttl)
+        return value
+
+    def stats(self):
+        with self._counters_lock:
+            return dict(self._counters)
+
+
+def build_backend():
+    # CACHE_BACKEND=redis shares the cache between workers; redis is optional
+    if os.getenv("CACHE_BACKEND", "memory") == "redis":
+        import redis
+        return RedisCache(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    return TTLCache(maxsize=int(os.getenv("CACHE_MAX_ENTRIES", 10000)))
+
+
+# Account lists per (user, data version); account creation and balance writes bump the version
+account_cache = ReadThroughCache(build_backend(), "accounts", ttl=float(os.getenv("ACCOUNT_CACHE_TTL", 60)))
+# Payee lists with their ETag per (user, data version); every payee write bumps the version
+payee_cache = ReadThroughCache(build_backend(), "payees", ttl=float(os.getenv("PAYEE_CACHE_TTL", 300)))
+# Spending reports per (user, data version, month); a new transaction moves the user to a new version
+analytics_cache = ReadThroughCache(build_backend(), "analytics", ttl=float(os.getenv("ANALYTICS_CACHE_TTL", 600)))
+# Signed-in users' records, so authenticated routes don't look the user up on every request
+user_cache = ReadThroughCache(build_backend(), "users", ttl=float(os.getenv("USER_CACHE_TTL", 30)))
+
+CACHES = (account_cache, payee_cache, analytics_cache, user_cache)
@@ -0,0 +1,117 @@
+import os
+import threading
+from dotenv import load_dotenv
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+DEFAULT_DB_NAME = "ZenithBank"
+
+# One client (and connection pool) per process, created on first use
+_client = None
+_client_lock = threading.Lock()
+# Database name set by use_client(); MONGO_DB_NAME otherwise
+_db_name = None
+_environment_loaded = False
+
+
+def load_environment():
+    # Read server/.env once; real environment variables take precedence over the file
+    global _environment_loaded
+    if not _environment_loaded:
+        load_dotenv()
+        _environment_loaded = True
+
+
+# Modules read their settings with os.getenv when they are imported, so the file is read
+# here, before any of them: every app module imports db (directly or via the entry point)
+# first. Reading a local file opens no connections.
+load_environment()
+
+import metrics  # noqa: E402
+
+
+def client_options():
+    # Pool size, timeouts and read preference, overridable from the environment
+    return {
+        "server_api": ServerApi('1'),
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 50)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000)),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000)),
+        "readPreference": os.getenv("MONGO_READ_PREFERENCE", "primary"),
+        "connect": False,  # Don't open sockets or monitor threads until the first operation
+        # Per-command latency and documents returned, exported on /metrics
+        "event_listeners": [metrics.command_listener] if metrics.METRICS_ENABLED else [],
+    }
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # Get the Mongo URI from the environment variables (and server/.env)
+                uri = os.getenv("MONGO_URI")
+                if not uri:
+                    raise ValueError("No MONGO_URI found in environment variables")
+                _client = MongoClient(uri, **client_options())
+    return _client
+
+
+def get_db():
+    return get_client()[_db_name or os.getenv("MONGO_DB_NAME", DEFAULT_DB_NAME)]
+
+
+def use_client(client, db_name=None):
+    # Serve every collection from the given client (e.g. a mongomock stand-in in tests)
+    # instead of building one from MONGO_URI
+    global _client, _db_name
+    with _client_lock:
+        _client = client
+        _db_name = db_name
+
+
+def ping():
+    # Round trip to the deployment, used by the readiness endpoint
+    return get_client().admin.command('ping')
+
+
+def close_client():
+    global _client, _db_name
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+        _db_name = None
+
+
+def _reset_after_fork():
+    # A client inherited from the parent (e.g. a gunicorn master) must not be reused in
+    # the forked worker; drop it without closing so the worker builds its own pool
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class LazyCollection:
+    """Collection handle that resolves the shared client only when it is first used."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
+
+
+def get_collection(name):
+    return LazyCollection(name)
@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import logging
+import os
+from functools import wraps
+from flask import current_app, request
+from pymongo.errors import PyMongoError
+import auth
+import versions
+
+# brotli is optional; without it responses are only gzip-compressed
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this aren't worth compressing; gzip level 1-9, brotli quality 0-11
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/csv", "application/x-ndjson")
+# Preferred first when the client weighs them equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def matching_etag(etag):
+    # The tag in If-None-Match that matches etag, either as sent uncompressed or with the
+    # '-<encoding>' suffix compress() gives each encoded representation
+    for tag in (etag,) + tuple(f"{etag}-{encoding}" for encoding in ENCODINGS):
+        if request.if_none_match.contains(tag):
+            return tag
+    return None
+
+
+def revalidate(response):
+    # Turn a 200 carrying an ETag into an empty 304 when the client's copy is current
+    etag, _ = response.get_etag()
+    matched = etag and matching_etag(etag)
+    if matched:
+        response.set_data(b"")
+        response.status_code = 304
+        response.set_etag(matched)
+        response.headers.pop("Content-Type", None)
+    return response
+
+
+def not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def data_version(user_id):
+    # The user's data version, read once per request: the ETag and the account cache key
+    # come from the same read, so a body is never served under a newer version's tag. Kept
+    # in the WSGI environ rather than flask.g, which an enclosing app context (pytest-flask,
+    # a CLI command) shares across requests.
+    seen = request.environ.setdefault("zenith.data_versions", {})
+    if user_id not in seen:
+        seen[user_id] = versions.current(user_id)
+    return seen[user_id]
+
+
+def conditional(view):
+    # Strong ETag from the user's data version and the requested URL. A client whose copy
+    # is current gets a 304 before the view queries or serialises anything.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = auth.current_user_id()
+        if user_id is None:
+            return view(*args, **kwargs)  # Not signed in; the view (or login_required) responds
+        try:
+            version = data_version(user_id)
+        except PyMongoError as e:
+            logger.warning("Data version unavailable, serving without ETag: %s", e)
+            return view(*args, **kwargs)
+
+        etag = hashlib.sha1(f"{user_id}:{version}:{request.full_path}".encode()).hexdigest()
+        matched = matching_etag(etag)
+        if matched:
+            return not_modified(matched)
+
+        response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    return wrapper
+
+
+def compress(response):
+    # gzip/brotli for buffered text responses above COMPRESSION_MIN_SIZE; streamed exports
+    # and already-encoded bodies pass through untouched
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None or response.content_length is None or response.content_length < COMPRESSION_MIN_SIZE:
+        return response
+
+    data = response.get_data()
+    if encoding == "br":
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+
+    # Each encoding is its own representation, so it gets its own strong ETag
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def init_app(app):
+    if COMPRESSION_ENABLED:
+        app.after_request(compress)
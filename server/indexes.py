@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel
+from scheduler import due_query
+
+# Every index the routes' queries rely on, declared in one place per collection.
+# Names are left to MongoDB's defaults so existing indexes are recognised, not duplicated.
+INDEXES = {
+    "User": [
+        # login and check_email look users up by email; uniqueness replaces the racy
+        # check_email + create_user pre-check with a duplicate-key error
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "Account": [
+        # Every per-user account lookup
+        IndexModel([("userID", ASCENDING)]),
+    ],
+    "TransactionLog": [
+        # The (AccountID, Date, _id) keyset order used to page and export transaction logs
+        IndexModel([("AccountID", ASCENDING), ("Date", ASCENDING), ("_id", ASCENDING)]),
+        # /api/stream's newest-logs read per changed user
+        IndexModel([("AccountID", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "DataVersion": [
+        # /api/stream's poll for recently bumped users when change streams are unavailable
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    "MonthlyRollup": [
+        # One rollup per account and month; also serves the latest-earlier-month lookup
+        IndexModel([("account_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)], unique=True),
+    ],
+    "Payee": [
+        # Per-user payee list in name order, and anchored prefix (typeahead) search
+        IndexModel([("user_id", ASCENDING), ("normalized_name", ASCENDING)]),
+    ],
+    "ScheduledPayment": [
+        # Due-payment claims scan next_run_at; finished payments have none and drop out
+        IndexModel([("next_run_at", ASCENDING)]),
+        # Per-user listing
+        IndexModel([("user_id", ASCENDING), ("selected_date", ASCENDING)]),
+    ],
+    "transactions": [
+        # Per-user, per-month date range queries
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING)]),
+        # Client-supplied keys make bulk ingestion idempotent; rows without a key are unaffected
+        IndexModel([("transaction_key", ASCENDING)], unique=True,
+                   partialFilterExpression={"transaction_key": {"$exists": True}}),
+    ],
+}
+
+
+def ensure_indexes(db, collections=None):
+    # Create any missing indexes; returns the index names per collection
+    created = {}
+    for name, indexes in INDEXES.items():
+        if collections is None or name in collections:
+            created[name] = db[name].create_indexes(indexes)
+    return created
+
+
+def route_queries(db):
+    # The filter and sort each route sends, with sample values taken from the data if present
+    user = db["User"].find_one({}, {"email": 1}) or {"email": "someone@example.com"}
+    account = db["Account"].find_one({}, {"userID": 1}) or {"_id": ObjectId(), "userID": ObjectId()}
+    start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    date_range = {"$gte": start, "$lt": start + timedelta(days=31)}
+
+    return [
+        ("login / check_email", "User", {"email": user["email"]}, None),
+        ("get_accounts_by_user / account_details", "Account", {"userID": account["userID"]}, None),
+        ("transaction_logs", "TransactionLog",
+         {"AccountID": {"$in": [account["_id"]]}, "Date": date_range},
+         [("AccountID", ASCENDING), ("Date", ASCENDING), ("_id", ASCENDING)]),
+        ("monthly statement", "MonthlyRollup",
+         {"account_id": {"$in": [account["_id"]]}, "year": start.year, "month": start.month}, None),
+        ("payee search", "Payee", {"user_id": account["userID"], "normalized_name": {"$regex": "^jo"}},
+         [("normalized_name", ASCENDING)]),
+        ("scheduler claim", "ScheduledPayment", due_query(datetime.utcnow()), [("next_run_at", ASCENDING)]),
+        ("stream new logs", "TransactionLog",
+         {"AccountID": {"$in": [account["_id"]]}, "_id": {"$gt": ObjectId.from_datetime(start)}},
+         [("_id", ASCENDING)]),
+        ("stream poll", "DataVersion", {"updated_at": {"$gte": start}}, None),
+        ("user transactions", "transactions",
+         {"user_id": str(account["userID"]), "date": date_range}, [("date", ASCENDING)]),
+    ]
+
+
+def plan_stages(plan):
+    # Flatten a winning plan into its stages, e.g. 'FETCH <- IXSCAN (userID)'
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage += f" ({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+def explain_route_queries(db):
+    # (route, collection, winning plan, uses an index) for every route query
+    results = []
+    for route, collection, query, sort in route_queries(db):
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        # Newer servers wrap the classic plan in a query-engine specific document
+        plan = plan.get("queryPlan", plan)
+        stages = plan_stages(plan)
+        results.append((route, collection, stages, "IXSCAN" in stages))
+    return results
@@ -0,0 +1,213 @@
+import logging
+import math
+import os
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import ConfigurationError, OperationFailure
+import rollups
+import versions
+from db import get_collection
+
+logger = logging.getLogger(__name__)
+
+# Collections touched by balance changes
+accounts_collection = get_collection("Account")
+transaction_logs_collection = get_collection("TransactionLog")
+transactions_collection = get_collection("transactions")
+
+# Server error raised when a standalone mongod is asked to run a transaction
+ILLEGAL_OPERATION = 20
+
+# 'auto' tries multi-document transactions and falls back if the deployment lacks them
+LEDGER_TRANSACTIONS = os.getenv("LEDGER_TRANSACTIONS", "auto")
+_transactions_supported = None
+
+
+class LedgerError(Exception):
+    pass
+
+
+class AccountNotFound(LedgerError):
+    pass
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+def use_transactions():
+    if LEDGER_TRANSACTIONS == "off":
+        return False
+    if LEDGER_TRANSACTIONS == "on":
+        return True
+    return _transactions_supported is not False
+
+
+def run_atomically(operation):
+    # Run operation(session) in a multi-document transaction when the deployment supports
+    # it (replica set / sharded cluster); otherwise run it with session=None, relying on
+    # the operation's own compensation
+    global _transactions_supported
+    if use_transactions():
+        client = accounts_collection.database.client
+        try:
+            with client.start_session() as session:
+                result = session.with_transaction(operation)
+            _transactions_supported = True
+            return result
+        except (NotImplementedError, ConfigurationError):
+            # No sessions at all: a stand-in client such as mongomock, or a deployment
+            # without session support
+            if LEDGER_TRANSACTIONS == "on":
+                raise
+            _transactions_supported = False
+        except OperationFailure as e:
+            if e.code != ILLEGAL_OPERATION or LEDGER_TRANSACTIONS == "on":
+                raise
+            _transactions_supported = False
+    return operation(None)
+
+
+def _missing_or_short(account_id, user_id, session):
+    # Work out why a guarded update matched nothing
+    if accounts_collection.find_one({"_id": account_id, "userID": user_id}, {"_id": 1}, session=session):
+        return InsufficientFunds("Insufficient funds")
+    return AccountNotFound("Account not found")
+
+
+def _log_leg(account_id, amount, account, description, date, transfer_id, category=None):
+    # account is the Account document as updated by this leg
+    return {
+        "AccountID": account_id,
+        "Amount": amount,
+        "Balance": account["balance"],  # Balance after this leg, for reconciliation
+        "Seq": account["seq"],  # The account's write sequence, which orders its legs
+        "Date": date,
+        "Description": description,
+        "Category": category or description,
+        "TransferID": transfer_id
+    }
+
+
+def _update_rollups(legs, session):
+    # Inside a transaction a failed rollup aborts the whole write; without one the balances
+    # are already final, so leave the rollup for 'manage.py rebuild-rollups' to repair
+    try:
+        for leg in legs:
+            rollups.record(leg["AccountID"], leg["Amount"], leg["Balance"], leg["Seq"], leg["Date"],
+                           leg["Category"], session=session)
+    except Exception as e:
+        if session is not None:
+            raise
+        logger.exception("Error updating monthly rollups: %s", e)
+
+
+def check_amount(amount):
+    # NaN compares false with everything, so it would pass 'amount <= 0' and poison the balance
+    if not math.isfinite(amount):
+        raise ValueError("amount must be a finite number")
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+
+
+def deposit(account_id, user_id, amount, description="Deposit", date=None, transaction=None, category=None):
+    check_amount(amount)
+    date = date or datetime.utcnow()
+
+    def operation(session):
+        account = accounts_collection.find_one_and_update(
+            {"_id": account_id, "userID": user_id},
+            {"$inc": {"balance": amount, "seq": 1}},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if account is None:
+            raise AccountNotFound("Account not found")
+
+        leg = _log_leg(account_id, amount, account, description, date, ObjectId(), category)
+        recorded = False
+        try:
+            # The transaction record goes first, so a duplicate transaction_key fails
+            # before any ledger leg is written
+            if transaction is not None:
+                transactions_collection.insert_one(transaction, session=session)
+                recorded = True
+            transaction_logs_collection.insert_one(leg, session=session)
+        except Exception:
+            if session is None:
+                accounts_collection.update_one({"_id": account_id}, {"$inc": {"balance": -amount}})
+                if recorded:
+                    transactions_collection.delete_one({"_id": transaction["_id"]})
+            raise
+        _update_rollups([leg], session)
+        return {"balance": account["balance"]}
+
+    result = run_atomically(operation)
+    versions.bump(user_id)
+    return result
+
+
+def transfer(from_account_id, user_id, amount, to_account_id=None, description="Transfer",
+             date=None, transaction=None, category=None):
+    # Debit is guarded by balance >= amount so concurrent transfers can never overdraw;
+    # an internal recipient account is credited as the second leg
+    check_amount(amount)
+    if to_account_id == from_account_id:
+        raise ValueError("Cannot transfer to the same account")
+    date = date or datetime.utcnow()
+    transfer_id = ObjectId()
+
+    def operation(session):
+        debited = accounts_collection.find_one_and_update(
+            {"_id": from_account_id, "userID": user_id, "balance": {"$gte": amount}},
+            {"$inc": {"balance": -amount, "seq": 1}},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if debited is None:
+            raise _missing_or_short(from_account_id, user_id, session)
+
+        credited = None
+        recorded = False
+        try:
+            # The transaction record goes first, so a duplicate transaction_key fails
+            # before the recipient is credited or any ledger leg is written
+            if transaction is not None:
+                transactions_collection.insert_one(transaction, session=session)
+                recorded = True
+            legs = [_log_leg(from_account_id, -amount, debited, description, date, transfer_id, category)]
+            if to_account_id is not None:
+                credited = accounts_collection.find_one_and_update(
+                    {"_id": to_account_id},
+                    {"$inc": {"balance": amount, "seq": 1}},
+                    return_document=ReturnDocument.AFTER,
+                    session=session
+                )
+                if credited is None:
+                    raise AccountNotFound("Recipient account not found")
+                legs.append(_log_leg(to_account_id, amount, credited, description, date, transfer_id, category))
+
+            transaction_logs_collection.insert_many(legs, session=session)
+        except Exception:
+            # Without a transaction, undo the writes already applied
+            if session is None:
+                accounts_collection.update_one({"_id": from_account_id}, {"$inc": {"balance": amount}})
+                if credited is not None:
+                    accounts_collection.update_one({"_id": to_account_id}, {"$inc": {"balance": -amount}})
+                if recorded:
+                    transactions_collection.delete_one({"_id": transaction["_id"]})
+            raise
+        _update_rollups(legs, session)
+
+        return {
+            "transfer_id": transfer_id,
+            "balance": debited["balance"],
+            "recipient_user_id": credited["userID"] if credited else None
+        }
+
+    result = run_atomically(operation)
+    # Both owners' balances changed: move them to new data versions (and cache entries)
+    recipient_user_id = result.pop("recipient_user_id")
+    versions.bump(user_id, recipient_user_id)
+    return result
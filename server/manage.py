@@ -0,0 +1,80 @@
+"""Database maintenance commands.
+
+    python -m server.manage ensure-indexes   # create every index the routes rely on
+    python -m server.manage explain          # show each route query's winning plan
+    python -m server.manage migrate-dates    # convert legacy string transaction dates
+    python -m server.manage rebuild-rollups  # recompute monthly statement rollups from the logs
+    python -m server.manage run-scheduler    # pay due scheduled payments (run one or more)
+"""
+import argparse
+import os
+import sys
+
+# Works as 'python -m server.manage' from the repo root and 'python manage.py' in server/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db import get_db  # noqa: E402
+from indexes import ensure_indexes, explain_route_queries  # noqa: E402
+from routes import migrate_transaction_dates  # noqa: E402
+from rollups import rebuild as rebuild_rollups  # noqa: E402
+import scheduler  # noqa: E402
+
+
+def command_ensure_indexes(args):
+    for collection, names in ensure_indexes(get_db()).items():
+        print(f"{collection}: {', '.join(names)}")
+    if args.explain:
+        return command_explain(args)
+
+
+def command_explain(args):
+    all_indexed = True
+    for route, collection, stages, indexed in explain_route_queries(get_db()):
+        all_indexed &= indexed
+        print(f"{'OK  ' if indexed else 'SCAN'} {route:<40} {collection:<15} {stages}")
+    return 0 if all_indexed else 1
+
+
+def command_migrate_dates(args):
+    print(f"Migrated {migrate_transaction_dates()} transaction dates")
+
+
+def command_rebuild_rollups(args):
+    print(f"Rebuilt {rebuild_rollups()} monthly rollups")
+
+
+def command_run_scheduler(args):
+    totals = scheduler.run_worker(
+        worker_id=args.worker_id, concurrency=args.concurrency, batch_size=args.batch_size, once=args.once
+    )
+    print(f"Scheduler finished: {totals}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m server.manage", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ensure = commands.add_parser("ensure-indexes", help="Create every index the routes rely on")
+    ensure.add_argument("--explain", action="store_true", help="Print query plans afterwards")
+    ensure.set_defaults(handler=command_ensure_indexes)
+
+    commands.add_parser("explain", help="Print the winning plan of each route's query").set_defaults(
+        handler=command_explain)
+    commands.add_parser("migrate-dates", help="Convert legacy string transaction dates").set_defaults(
+        handler=command_migrate_dates)
+    commands.add_parser("rebuild-rollups", help="Recompute monthly statement rollups from the logs").set_defaults(
+        handler=command_rebuild_rollups)
+
+    worker = commands.add_parser("run-scheduler", help="Pay due scheduled payments until interrupted")
+    worker.add_argument("--once", action="store_true", help="Exit once no payments are due")
+    worker.add_argument("--worker-id", help="Lease owner name (default host:pid:thread)")
+    worker.add_argument("--concurrency", type=int, default=scheduler.SCHEDULER_CONCURRENCY)
+    worker.add_argument("--batch-size", type=int, default=scheduler.SCHEDULER_BATCH_SIZE)
+    worker.set_defaults(handler=command_run_scheduler)
+
+    args = parser.parse_args(argv)
+    return args.handler(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request
+from pymongo import monitoring
+from cache import CACHES
+
+# Latency buckets in seconds, shared by the request and MongoDB command histograms
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in the Prometheus text format."""
+
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+request_duration = Histogram(
+    "zenith_http_request_duration_seconds", "Request latency by route, method and status.",
+    ("route", "method", "status"))
+mongo_command_duration = Histogram(
+    "zenith_mongo_command_duration_seconds", "MongoDB command latency by command and collection.",
+    ("command", "collection"))
+mongo_documents_returned = Counter(
+    "zenith_mongo_documents_returned_total", "Documents returned in MongoDB cursor batches.",
+    ("command", "collection"))
+mongo_command_failures = Counter(
+    "zenith_mongo_command_failures_total", "Failed MongoDB commands.", ("command", "collection"))
+velocity_check_duration = Histogram(
+    "zenith_velocity_check_duration_seconds", "Time spent evaluating velocity rules per transaction.", (),
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005))
+velocity_blocks = Counter(
+    "zenith_velocity_blocks_total", "Transactions rejected by a velocity rule.", ("rule",))
+rate_limited = Counter(
+    "zenith_rate_limited_total", "Requests rejected by a rate limit before any work was done.", ("limit",))
+
+METRICS = (request_duration, mongo_command_duration, mongo_documents_returned, mongo_command_failures,
+           velocity_check_duration, velocity_blocks, rate_limited)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """pymongo listener recording each command's duration and returned document count."""
+
+    def __init__(self):
+        # Collection names by in-flight request; the reply events don't carry the command
+        self._collections = {}
+
+    def _key(self, event):
+        return event.connection_id, event.request_id
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[self._key(event)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        labels = (event.command_name, self._collections.pop(self._key(event), ""))
+        mongo_command_duration.observe(labels, event.duration_micros / 1e6)
+        cursor = event.reply.get("cursor") if hasattr(event.reply, "get") else None
+        if cursor:
+            batch = cursor.get("firstBatch", cursor.get("nextBatch")) or ()
+            mongo_documents_returned.inc(labels, len(batch))
+
+    def failed(self, event):
+        labels = (event.command_name, self._collections.pop(self._key(event), ""))
+        mongo_command_duration.observe(labels, event.duration_micros / 1e6)
+        mongo_command_failures.inc(labels)
+
+
+# Registered on every client through db.client_options()
+command_listener = CommandMetrics()
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.append("# HELP zenith_cache_events_total Read-through cache hits and misses.")
+    lines.append("# TYPE zenith_cache_events_total counter")
+    for cache in CACHES:
+        for event, value in sorted(cache.stats().items()):
+            lines.append(f'zenith_cache_events_total{{cache="{cache.namespace}",event="{event}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def start_timer():
+    g.request_started_at = time.perf_counter()
+
+
+def record_request(response):
+    started_at = g.pop("request_started_at", None)
+    if started_at is not None:
+        # The URL rule, not the path, so per-user URLs share one series
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        request_duration.observe((route, request.method, str(response.status_code)),
+                                 time.perf_counter() - started_at)
+    return response
+
+
+def metrics_endpoint():
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    # Time every request and expose the metrics at /metrics
+    if not METRICS_ENABLED:
+        return
+    app.before_request(start_timer)
+    app.after_request(record_request)
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint, methods=["GET"])
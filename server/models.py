@@ -1,152 +1,211 @@
-from mongoengine import Document, StringField, IntField, FloatField, DateTimeField, ReferenceField, EmbeddedDocumentField, EmbeddedDocument, ListField
-import datetime
-
-
-# User Model
-class User(Document):
-    first_name = StringField(required=True, max_length=25)
-    last_name = StringField(required=True, max_length=25)
-    password = StringField(required=True, min_length=6)
-    email = StringField(required=True, unique=True)
-    address = StringField()
+from datetime import datetime
+
+# Lean read/write models over the stored documents. Each record names its attributes in
+# FIELDS (attribute -> stored field), keeps them in __slots__, and builds the projection
+# that fetches exactly those fields, so routes never load more than they return.
+
+
+class Record:
+    __slots__ = ()
+    FIELDS = {}
+
+    def __init__(self, **values):
+        for attribute in self.FIELDS:
+            setattr(self, attribute, values.get(attribute))
+
+    @classmethod
+    def projection(cls, *attributes):
+        # Stored fields for the given attributes (all of them by default); _id only if asked for
+        attributes = attributes or tuple(cls.FIELDS)
+        projection = {cls.FIELDS[attribute]: 1 for attribute in attributes if attribute != "id"}
+        if "id" not in attributes:
+            projection["_id"] = 0
+        return projection
+
+    @classmethod
+    def from_doc(cls, doc):
+        record = cls.__new__(cls)
+        for attribute, field in cls.FIELDS.items():
+            setattr(record, attribute, doc.get(field))
+        return record
+
+    def to_doc(self):
+        # Stored representation; unset (None) attributes are left out
+        doc = {}
+        for attribute, field in self.FIELDS.items():
+            value = getattr(self, attribute)
+            if value is not None:
+                doc[field] = value
+        return doc
+
+    def __repr__(self):
+        values = ", ".join(f"{attribute}={getattr(self, attribute)!r}" for attribute in self.FIELDS)
+        return f"{type(self).__name__}({values})"
+
+
+class User(Record):
+    FIELDS = {
+        "id": "_id",
+        "first_name": "first_name",
+        "last_name": "last_name",
+        "email": "email",
+        "address": "address",
+        "password": "password",  # werkzeug hash; only projected for login
+    }
+    __slots__ = tuple(FIELDS)
+    PUBLIC = ("first_name", "last_name", "email", "address")
 
     def to_json(self):
+        # Never includes the password hash
+        return {attribute: getattr(self, attribute) for attribute in self.PUBLIC}
+
+    def login_json(self):
         return {
+            "id": str(self.id),
             "first_name": self.first_name,
             "last_name": self.last_name,
             "email": self.email,
-            "address": self.address
+            "address": self.address if self.address is not None else "N/A"
         }
 
 
-# Account Model
-class Account(Document):
-    user = ReferenceField(User, required=True)
-    transaction_id = StringField()
-    account_type = StringField(choices=["savings", "checking"])
-    balance = FloatField(required=True)
-    status = StringField(choices=["active", "inactive", "closed"], default="active")
+class Account(Record):
+    FIELDS = {
+        "id": "_id",
+        "user_id": "userID",
+        "account_type": "accountType",
+        "balance": "balance",
+        "status": "status",
+    }
+    __slots__ = tuple(FIELDS)
 
     def to_json(self):
         return {
-            "user": self.user.name,
-            "transaction_id": self.transaction_id,
-            "account_type": self.account_type,
+            "id": str(self.id),
+            "userID": str(self.user_id),
+            "accountType": self.account_type,
             "balance": self.balance,
             "status": self.status
         }
 
 
-# Payee Account Model
-class PayeeAccount(Document):
-    user = ReferenceField(User, required=True)
-    bank_details = StringField(required=True)
+class TransactionLog(Record):
+    FIELDS = {
+        "id": "_id",
+        "account_id": "AccountID",
+        "amount": "Amount",
+        "date": "Date",
+        "description": "Description",
+    }
+    __slots__ = tuple(FIELDS)
 
     def to_json(self):
+        # Same keys as the stored document; ObjectIds and dates are left to the JSON provider
         return {
-            "user": self.user.name,
-            "bank_details": self.bank_details
+            "_id": self.id,
+            "AccountID": self.account_id,
+            "Amount": self.amount,
+            "Date": self.date,
+            "Description": self.description
         }
 
-
-# Withdrawal Model
-class Withdrawal(Document):
-    account = ReferenceField(Account, required=True)
-    category_id = StringField()
-    date = DateTimeField(default=datetime.datetime.utcnow)
-    amount = FloatField(required=True)
-    description = StringField()
-
-    def to_json(self):
+    def export_row(self):
+        # Plain values for NDJSON/CSV exports
         return {
-            "account": self.account.id,
-            "category_id": self.category_id,
-            "date": self.date.strftime('%Y-%m-%d %H:%M:%S'),
-            "amount": self.amount,
-            "description": self.description
+            "_id": str(self.id),
+            "AccountID": str(self.account_id),
+            "Date": self.date.isoformat() if isinstance(self.date, datetime) else self.date,
+            "Amount": self.amount,
+            "Description": self.description,
         }
 
 
-# Deposit Model
-class Deposit(Document):
-    account = ReferenceField(Account, required=True)
-    category_id = StringField()
-    date = DateTimeField(default=datetime.datetime.utcnow)
-    amount = FloatField(required=True)
-    description = StringField()
+class Transaction(Record):
+    FIELDS = {
+        "id": "_id",
+        "user_id": "user_id",
+        "type": "type",  # Either 'deposit' or 'transfer'
+        "amount": "amount",
+        "date": "date",
+        "category": "category",
+        "recipient": "recipient",  # Only relevant for transfers
+        "account_id": "account_id",
+        "to_account_id": "to_account_id",
+        "transaction_key": "transaction_key",  # Client-supplied idempotency key for bulk ingest
+    }
+    __slots__ = tuple(FIELDS)
+    # Always present in responses, even when unset
+    BASE = ("user_id", "type", "amount", "date", "category", "recipient")
 
     def to_json(self):
-        return {
-            "account": self.account.id,
-            "category_id": self.category_id,
-            "date": self.date.strftime('%Y-%m-%d %H:%M:%S'),
-            "amount": self.amount,
-            "description": self.description
-        }
-
-
-# Transfer Model
-class Transfer(Document):
-    account = ReferenceField(Account, required=True)
-    category_id = StringField()
-    date = DateTimeField(default=datetime.datetime.utcnow)
-    amount = FloatField(required=True)
-    description = StringField()
+        # Keep the 'YYYY-MM-DD' date format the client expects
+        data = {"_id": self.id} if self.id is not None else {}
+        for attribute in self.FIELDS:
+            value = getattr(self, attribute)
+            if attribute in self.BASE or (attribute != "id" and value is not None):
+                data[attribute] = value
+        if isinstance(self.date, datetime):
+            data["date"] = self.date.strftime("%Y-%m-%d")
+        return data
+
+
+class ScheduledPayment(Record):
+    FIELDS = {
+        "id": "_id",
+        "user_id": "user_id",
+        "account_id": "account_id",  # Account the payment is debited from
+        "to_account_id": "to_account_id",  # Internal recipient account, if any
+        "payee": "payee",
+        "amount": "amount",
+        "payment_type": "payment_type",  # 'one-off' or 'recurring'
+        "selected_date": "selected_date",  # First run; recurring runs are anchored on it
+        "recurrence": "recurrence",  # 'weekly' or 'monthly'
+        "end_date": "end_date",
+        "is_indefinite": "is_indefinite",
+        "status": "status",  # 'scheduled', 'completed' or 'failed'
+        "next_run_at": "next_run_at",  # None once nothing is left to run
+        "runs": "runs",
+        "attempts": "attempts",  # Failed attempts at the current run
+        "last_run_at": "last_run_at",
+        "last_error": "last_error",
+        "lease_owner": "lease_owner",
+        "lease_expires_at": "lease_expires_at",
+    }
+    __slots__ = tuple(FIELDS)
+    PUBLIC = ("id", "account_id", "payee", "amount", "payment_type", "selected_date", "recurrence",
+              "end_date", "is_indefinite", "status", "next_run_at", "runs", "last_run_at", "last_error")
 
     def to_json(self):
-        return {
-            "account": self.account.id,
-            "category_id": self.category_id,
-            "date": self.date.strftime('%Y-%m-%d %H:%M:%S'),
-            "amount": self.amount,
-            "description": self.description
-        }
-
-
-# Categories Model
-class Category(Document):
-    category = StringField(required=True, unique=True)
+        data = {"_id": self.id}
+        for attribute in self.PUBLIC[1:]:
+            value = getattr(self, attribute)
+            if attribute in ("selected_date", "end_date") and isinstance(value, datetime):
+                value = value.strftime("%Y-%m-%d")
+            data[attribute] = value
+        return data
+
+
+class Payee(Record):
+    FIELDS = {
+        "id": "_id",
+        "user_id": "user_id",
+        "first_name": "first_name",
+        "last_name": "last_name",
+        "normalized_name": "normalized_name",  # Lower-cased 'first last', for sorting and prefix search
+        "bank_details": "bank_details",  # {'bank_name', 'bsb', 'account_number'}
+    }
+    __slots__ = tuple(FIELDS)
+    PUBLIC = ("id", "first_name", "last_name", "bank_details")
 
     def to_json(self):
+        # Flattened into the field names the payee forms use
+        bank_details = self.bank_details or {}
         return {
-            "category": self.category
-        }
-
-
-# Transaction Log Model
-class TransactionLog(Document):
-    account = ReferenceField(Account, required=True)
-    user = ReferenceField(User, required=True)
-    category_id = StringField()
-    date = DateTimeField(default=datetime.datetime.utcnow)
-    amount = FloatField(required=True)
-    description = StringField()
-
-    def to_json(self):
-        return {
-            "account": self.account.id,
-            "user": self.user.name,
-            "category_id": self.category_id,
-            "date": self.date.strftime('%Y-%m-%d %H:%M:%S'),
-            "amount": self.amount,
-            "description": self.description
+            "_id": self.id,
+            "first_name": self.first_name,
+            "last_name": self.last_name,
+            "bank_name": bank_details.get("bank_name"),
+            "account_bsb": bank_details.get("bsb"),
+            "account_number": bank_details.get("account_number")
         }
 
-
-# Bank Statement Model
-class BankStatement(Document):
-    account = ReferenceField(Account, required=True)
-    user = ReferenceField(User, required=True)
-    transaction_id = StringField()
-    date = DateTimeField(default=datetime.datetime.utcnow)
-    description = StringField()
-
-    def to_json(self):
-        return {
-            "account": self.account.id,
-            "user": self.user.name,
-            "transaction_id": self.transaction_id,
-            "date": self.date.strftime('%Y-%m-%d %H:%M:%S'),
-            "description": self.description
-        }
-        
\ No newline at end of file
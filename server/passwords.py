@@ -0,0 +1,85 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug hash method and cost, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+# Worker threads doing hashing (hashlib releases the GIL while it works) and how many
+# requests may wait for one before new ones are turned away
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", min(4, os.cpu_count() or 1)))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", HASH_POOL_SIZE * 8))
+HASH_TIMEOUT_SECONDS = float(os.getenv("HASH_TIMEOUT_SECONDS", 10))
+
+
+class HashingPoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    """Size-bounded worker pool for CPU-heavy password hashing."""
+
+    def __init__(self, workers=HASH_POOL_SIZE, queue_size=HASH_QUEUE_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        # One slot per running or queued job; no free slot means back-pressure
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated("Too many password hashing requests in flight")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result(timeout=HASH_TIMEOUT_SECONDS)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# One pool per process, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+_method_prefix = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool()
+    return _pool
+
+
+def _reset_after_fork():
+    # Worker threads don't survive fork; a forked worker builds its own pool
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def hash_password(password):
+    return get_pool().run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return get_pool().run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    # True when a stored hash was made with a different method or cost than configured.
+    # werkzeug fills in default costs, so learn the full prefix from one sample hash.
+    global _method_prefix
+    if _method_prefix is None:
+        _method_prefix = hash_password("").split("$", 1)[0]
+    return password_hash.split("$", 1)[0] != _method_prefix
@@ -0,0 +1,180 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import jsonify, request
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Token-bucket rate limits for the unauthenticated auth routes (login, signup, email check).
+# A request takes one token from each of its buckets (per client IP, and per email where the
+# request names one); an empty bucket rejects it with a 429 before any database or password
+# hashing work. Buckets live in per-process memory by default, or in Redis to share them.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Most buckets the in-memory store keeps, least recently used dropped (a dropped bucket is full)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+
+
+def parse_rate(value):
+    # '<requests>/<seconds>': a burst of <requests>, refilled evenly over <seconds>
+    count, _, seconds = value.partition("/")
+    return int(count), float(seconds or 60)
+
+
+class Limit:
+    """Up to capacity requests at once per key, refilled at capacity / period per second."""
+
+    def __init__(self, name, capacity, period, key):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.key = key  # request -> key, or None when the limit doesn't apply
+
+    @classmethod
+    def from_env(cls, name, env, default, key):
+        capacity, period = parse_rate(os.getenv(env, default))
+        return cls(name, capacity, period, key)
+
+
+class MemoryBucketStore:
+    """Per-process buckets: key -> [tokens, updated_at]."""
+
+    def __init__(self, maxsize=RATE_LIMIT_MAX_KEYS):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        # Returns (allowed, seconds until a token is available)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+                while len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0.0
+            return False, (1 - bucket[0]) / rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Refill and take in one round trip, atomically, so every worker shares one bucket per key
+TAKE_SCRIPT = """
+local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+tokens = math.min(capacity, tokens + elapsed * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """Same buckets in Redis hashes; any store with take() can replace either."""
+
+    def __init__(self, client, prefix="zenith:ratelimit:"):
+        self._take = client.register_script(TAKE_SCRIPT)
+        self._prefix = prefix
+
+    def take(self, key, capacity, rate, now):
+        try:
+            allowed, tokens = self._take(keys=[self._prefix + key], args=[capacity, rate, now])
+        except Exception as e:
+            # Fail open: an unreachable Redis shouldn't lock everyone out of logging in
+            logger.warning("Rate limit store unavailable, allowing request: %s", e)
+            return True, 0.0
+        return bool(int(allowed)), 0.0 if int(allowed) else (1 - float(tokens)) / rate
+
+
+class RateLimiter:
+    def __init__(self, store, clock=time.time, enabled=True):
+        self.store = store
+        self.clock = clock
+        self.enabled = enabled
+
+    def check(self, limits):
+        # The first exhausted limit and its wait, or (None, 0)
+        now = self.clock()
+        for limit in limits:
+            key = limit.key(request)
+            if key is None:
+                continue
+            allowed, retry_after = self.store.take(f"{limit.name}:{key}", limit.capacity, limit.rate, now)
+            if not allowed:
+                return limit, retry_after
+        return None, 0.0
+
+    def limit(self, *limits):
+        # Route decorator: checked before the view runs
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.enabled:
+                    limit, retry_after = self.check(limits)
+                    if limit is not None:
+                        metrics.rate_limited.inc((limit.name,))
+                        response = jsonify({"error": "Too many attempts, please try again later"})
+                        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+                        return response, 429
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def client_ip(req):
+    # The peer address; behind a proxy, wrap the app in werkzeug's ProxyFix so this is the client
+    return req.remote_addr or "unknown"
+
+
+def email_from_body(req):
+    data = req.get_json(silent=True)
+    email = data.get("email") if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def email_from_query(req):
+    email = req.args.get("email", "").strip().lower()
+    return email or None
+
+
+LOGIN_LIMITS = (
+    Limit.from_env("login_ip", "RATE_LIMIT_LOGIN_PER_IP", "20/60", client_ip),
+    Limit.from_env("login_email", "RATE_LIMIT_LOGIN_PER_EMAIL", "5/60", email_from_body),
+)
+SIGNUP_LIMITS = (
+    Limit.from_env("signup_ip", "RATE_LIMIT_SIGNUP_PER_IP", "5/60", client_ip),
+    Limit.from_env("signup_email", "RATE_LIMIT_SIGNUP_PER_EMAIL", "3/60", email_from_body),
+)
+CHECK_EMAIL_LIMITS = (
+    Limit.from_env("check_email_ip", "RATE_LIMIT_CHECK_EMAIL_PER_IP", "30/60", client_ip),
+)
+
+
+def build_store():
+    # RATE_LIMIT_BACKEND=redis shares buckets between workers; redis is optional
+    if os.getenv("RATE_LIMIT_BACKEND", "memory") == "redis":
+        import redis
+        return RedisBucketStore(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    return MemoryBucketStore()
+
+
+limiter = RateLimiter(build_store(), enabled=RATE_LIMIT_ENABLED)
@@ -0,0 +1,178 @@
+from datetime import datetime
+from pymongo import DESCENDING
+from db import get_collection
+
+# Monthly statement summaries per account, kept up to date as transaction logs are written
+rollups_collection = get_collection("MonthlyRollup")
+transaction_logs_collection = get_collection("TransactionLog")
+accounts_collection = get_collection("Account")
+
+UNCATEGORIZED = "Uncategorized"
+
+
+def category_key(category):
+    # Categories become field names under 'totals', so '.' and a leading '$' are not allowed
+    category = str(category or UNCATEGORIZED).replace(".", "_")
+    return "_" + category[1:] if category.startswith("$") else category
+
+
+def latest_month(account_id, session=None):
+    # (year, month) of the account's latest rollup, or None before its first write
+    latest = rollups_collection.find_one(
+        {"account_id": account_id}, {"year": 1, "month": 1},
+        sort=[("year", DESCENDING), ("month", DESCENDING)], session=session
+    )
+    return (latest["year"], latest["month"]) if latest else None
+
+
+def record(account_id, amount, balance_after, seq, date, category=None, session=None):
+    # Fold one transaction log into its account's (year, month) rollup. seq is the account's
+    # write sequence after this leg: without a transaction, legs' rollup writes can land in
+    # any order, so the opening balance comes from the month's lowest sequence and the
+    # closing balance from its highest, each moved only by a guarded update. A log dated
+    # before the account's latest month (back-dated, or written after a forward-dated one)
+    # rebuilds the account's rollups from its month onward instead.
+    latest = latest_month(account_id, session)
+    if latest is not None and (date.year, date.month) < latest:
+        rebuild([account_id], since=date, session=session)
+        return
+
+    month = {"account_id": account_id, "year": date.year, "month": date.month}
+    opening = balance_after - amount
+    result = rollups_collection.update_one(
+        month,
+        {
+            "$setOnInsert": {
+                "opening_balance": opening, "opening_seq": seq,
+                "closing_balance": balance_after, "closing_seq": seq,
+            },
+            "$set": {"updated_at": datetime.utcnow()},
+            "$inc": {
+                "count": 1,
+                "credits": amount if amount > 0 else 0,
+                "debits": -amount if amount < 0 else 0,
+                f"totals.{category_key(category)}": amount,
+            },
+        },
+        upsert=True,
+        session=session
+    )
+    if result.upserted_id is not None:
+        return
+    # Rollups written before sequences existed have no closing_seq; the next leg claims them
+    rollups_collection.update_one(
+        dict(month, closing_seq={"$not": {"$gte": seq}}),
+        {"$set": {"closing_balance": balance_after, "closing_seq": seq}},
+        session=session
+    )
+    rollups_collection.update_one(
+        dict(month, opening_seq={"$gt": seq}),
+        {"$set": {"opening_balance": opening, "opening_seq": seq}},
+        session=session
+    )
+
+
+def rebuild(account_ids=None, since=None, session=None):
+    # Recompute rollups from the raw transaction logs (backfill / repair), optionally only
+    # for the months from since onward. Balances are walked backwards from each account's
+    # current balance.
+    match = {"AccountID": {"$in": list(account_ids)}} if account_ids is not None else {}
+    if since is not None:
+        match["Date"] = {"$gte": datetime(since.year, since.month, 1)}
+    groups = transaction_logs_collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "account_id": "$AccountID",
+                "year": {"$year": "$Date"},
+                "month": {"$month": "$Date"},
+                "category": {"$ifNull": ["$Category", UNCATEGORIZED]},
+            },
+            "net": {"$sum": "$Amount"},
+            "credits": {"$sum": {"$cond": [{"$gt": ["$Amount", 0]}, "$Amount", 0]}},
+            "debits": {"$sum": {"$cond": [{"$lt": ["$Amount", 0]}, {"$abs": "$Amount"}, 0]}},
+            "count": {"$sum": 1},
+            # Logs written before sequences existed count as sequence 0
+            "first_seq": {"$min": {"$ifNull": ["$Seq", 0]}},
+            "last_seq": {"$max": {"$ifNull": ["$Seq", 0]}},
+        }},
+    ], allowDiskUse=True, session=session)
+
+    months = {}
+    for group in groups:
+        key = group["_id"]
+        rollup = months.setdefault((key["account_id"], key["year"], key["month"]), {
+            "net": 0, "credits": 0, "debits": 0, "count": 0, "totals": {},
+            "first_seq": group["first_seq"], "last_seq": group["last_seq"]
+        })
+        rollup["net"] += group["net"]
+        rollup["credits"] += group["credits"]
+        rollup["debits"] += group["debits"]
+        rollup["count"] += group["count"]
+        rollup["first_seq"] = min(rollup["first_seq"], group["first_seq"])
+        rollup["last_seq"] = max(rollup["last_seq"], group["last_seq"])
+        category = category_key(key["category"])
+        rollup["totals"][category] = rollup["totals"].get(category, 0) + group["net"]
+
+    balances = {
+        account["_id"]: account.get("balance", 0)
+        for account in accounts_collection.find(
+            {"_id": {"$in": list({account_id for account_id, _, _ in months})}}, {"balance": 1}, session=session
+        )
+    }
+
+    rebuilt = 0
+    for account_id, year, month in sorted(months, key=lambda key: (str(key[0]), key[1], key[2]), reverse=True):
+        rollup = months[(account_id, year, month)]
+        closing = balances.get(account_id, 0)
+        opening = closing - rollup["net"]
+        balances[account_id] = opening
+        rollups_collection.replace_one(
+            {"account_id": account_id, "year": year, "month": month},
+            {
+                "account_id": account_id,
+                "year": year,
+                "month": month,
+                "opening_balance": opening,
+                "opening_seq": rollup["first_seq"],
+                "closing_balance": closing,
+                "closing_seq": rollup["last_seq"],
+                "credits": rollup["credits"],
+                "debits": rollup["debits"],
+                "count": rollup["count"],
+                "totals": rollup["totals"],
+                "updated_at": datetime.utcnow(),
+            },
+            upsert=True,
+            session=session
+        )
+        rebuilt += 1
+    return rebuilt
+
+
+def statement(account_ids, year, month):
+    # One rollup read per account; accounts without activity that month carry the
+    # closing balance of their latest earlier month
+    rollups = {
+        rollup["account_id"]: rollup
+        for rollup in rollups_collection.find(
+            {"account_id": {"$in": account_ids}, "year": year, "month": month}, {"_id": 0, "updated_at": 0, "opening_seq": 0, "closing_seq": 0}
+        )
+    }
+
+    for account_id in account_ids:
+        if account_id in rollups:
+            continue
+        previous = rollups_collection.find_one(
+            {"account_id": account_id, "$or": [{"year": {"$lt": year}}, {"year": year, "month": {"$lt": month}}]},
+            {"closing_balance": 1},
+            sort=[("year", DESCENDING), ("month", DESCENDING)]
+        )
+        balance = previous["closing_balance"] if previous else None
+        rollups[account_id] = {
+            "account_id": account_id, "year": year, "month": month,
+            "opening_balance": balance, "closing_balance": balance,
+            "credits": 0, "debits": 0, "count": 0, "totals": {}
+        }
+
+    return [rollups[account_id] for account_id in account_ids]
@@ -1,64 +1,208 @@
-from flask import Blueprint, request, jsonify
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-import os
-from dotenv import load_dotenv
+from flask import Blueprint, Response, current_app, request, jsonify
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+import base64
+import calendar
+import csv
+import hashlib
+import io
+import json
+import logging
+import math
+import re
+from bson import json_util
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from concurrent.futures import TimeoutError as HashingTimeout
 from datetime import datetime, timedelta
-
-# Load environment variables
-load_dotenv()
+from db import get_collection
+from json_provider import BSONJSONProvider
+from models import Account, Payee, ScheduledPayment, Transaction, TransactionLog, User
+import auth
+import http_cache
+import ratelimit
+import scheduler
+import stream
+import velocity
+import versions
+import ledger
+import rollups
+from cache import account_cache, payee_cache
+from passwords import HashingPoolSaturated, hash_password, needs_rehash, verify_password
+
+logger = logging.getLogger(__name__)
 
 # Create a blueprint for the API routes
 api = Blueprint('api', __name__)
 
-# Get MongoDB URI from environment variables
-uri = os.getenv("MONGO_URI")
-if not uri:
-    raise ValueError("No MONGO_URI found in environment variables")
 
-# Connect to MongoDB using the provided URI
-client = MongoClient(uri, server_api=ServerApi('1'))
+@api.record_once
+def use_bson_json_provider(state):
+    # Routes return raw MongoDB documents, so whichever app registers the blueprint needs
+    # a provider that understands ObjectId, datetime and Decimal128
+    if not isinstance(state.app.json, BSONJSONProvider):
+        state.app.json = BSONJSONProvider(state.app)
+
+
+# Verify the session token once per request, for whichever app registers the blueprint
+api.before_app_request(auth.authenticate)
+
+# Collections on the shared, lazily created MongoDB client
+accounts_collection = get_collection("Account")
+users_collection = get_collection("User")
+transaction_logs_collection = get_collection("TransactionLog")
+transactions_collection = get_collection('transactions')  # Define the transactions collection
+payees_collection = get_collection("Payee")
+
+def get_user_accounts(user_id):
+    # The user's accounts, read through the account cache (which holds plain documents) under
+    # the user's data version: a write in any process bumps it, so no process serves the old
+    # balances, and the ETag conditional routes send is derived from the same version
+    def load():
+        return list(accounts_collection.find({"userID": user_id}, Account.projection()))
+
+    try:
+        version = http_cache.data_version(user_id)
+    except PyMongoError as e:
+        logger.warning("Data version unavailable, reading accounts uncached: %s", e)
+        accounts = load()
+    else:
+        accounts = account_cache.get_or_load(f"{user_id}:{version}", load)
+    return [Account.from_doc(account) for account in accounts]
+
+
+# Month names accepted by the month filter, e.g. 'September' -> 9
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+
 
-# Select the database and collection
-db = client["ZenithBank"]
-accounts_collection = db["Account"]
-users_collection = db["User"]
-transaction_logs_collection = db["TransactionLog"]
-transactions_collection = db['transactions']  # Define the transactions collection
+def parse_transaction_date(value):
+    # Transaction dates arrive as 'YYYY-MM-DD' (or full ISO 8601) strings
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid date: {value!r}")
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def month_date_range(month, year=None):
+    # Turn a month name ('September') or number ('9') into a [start, end) datetime range
+    month = str(month).strip()
+    number = int(month) if month.isdigit() else MONTHS.get(month.lower())
+    if not number or not 1 <= number <= 12:
+        raise ValueError(f"Invalid month: {month}")
+
+    year = int(year) if year else datetime.utcnow().year
+    start = datetime(year, number, 1)
+    end = datetime(year + 1, 1, 1) if number == 12 else datetime(year, number + 1, 1)
+    return start, end
+
+
+def build_transactions_query(user_id, month=None, year=None):
+    # Filter by user and, optionally, by a server-side date range for the month
+    query = {"user_id": user_id}
+    if month:
+        start, end = month_date_range(month, year)
+        query["date"] = {"$gte": start, "$lt": end}
+    return query
+
+
+def serialize_transaction(txn):
+    # Keep the 'YYYY-MM-DD' date format the client expects; ObjectIds are left to the JSON provider
+    return Transaction.from_doc(txn).to_json()
+
+
+def build_transaction(user_id, data):
+    # Validate a transaction payload and build the document stored in 'transactions'
+    missing = [field for field in ('type', 'amount', 'date', 'category') if field not in data]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    if isinstance(data['amount'], bool) or not isinstance(data['amount'], (int, float)):
+        raise ValueError("amount must be a number")
+    # json accepts NaN and Infinity, which would poison a balance
+    if not math.isfinite(data['amount']):
+        raise ValueError("amount must be a finite number")
+
+    return Transaction(
+        user_id=user_id,
+        type=data['type'],  # Either 'deposit' or 'transfer'
+        amount=data['amount'],
+        date=parse_transaction_date(data['date']),  # Stored as a BSON date for range queries
+        category=data['category'],
+        recipient=data.get('recipient', None)  # Only relevant for transfers
+    ).to_doc()
+
+
+def migrate_transaction_dates(collection=transactions_collection):
+    # Convert legacy 'YYYY-MM-DD' string dates to BSON dates; unparseable values are left as-is
+    result = collection.update_many(
+        {"date": {"$type": "string"}},
+        [{"$set": {"date": {"$dateFromString": {
+            "dateString": "$date", "format": "%Y-%m-%d", "onError": "$date"
+        }}}}]
+    )
+    return result.modified_count
 
 # Route to handle user login
 @api.route('/api/LoginPage', methods=['POST'])
+@ratelimit.limiter.limit(*ratelimit.LOGIN_LIMITS)
 def login():
     data = request.get_json()
     email = data.get('email')  # Capture email from request
     password = data.get('password')
 
     # Find the user by email
-    user = users_collection.find_one({'email': email})
+    user = users_collection.find_one({'email': email}, User.projection())
 
     if not user:
         return jsonify({'error': 'User not found'}), 404  # User not found
+    user = User.from_doc(user)
 
-    # Check the password
-    if check_password_hash(user['password'], password):
-        return jsonify({
+    # Check the password on the hashing pool, shedding load when it is saturated
+    try:
+        password_ok = verify_password(user.password, password)
+    except (HashingPoolSaturated, HashingTimeout):
+        return hashing_unavailable()
+
+    if password_ok:
+        upgrade_password_hash(user, password)
+        response = jsonify({
             'message': 'Login successful', 
-            'user': {
-                'id': str(user['_id']),  # Convert ObjectId to string for JSON serialization
-                'first_name': user['first_name'],
-                'last_name': user['last_name'], 
-                'email': user['email'], 
-                'address': user.get('address', 'N/A')
-            }
-        }), 200  # Login successful
+            'user': user.login_json()
+        })
+        # The signed session token authenticates every later request
+        return auth.set_session_cookie(response, user.id), 200  # Login successful
     else:
         return jsonify({'error': 'Invalid password'}), 401  # Invalid password
 
+
+# Route to end the session
+@api.route('/api/logout', methods=['POST'])
+def logout():
+    return auth.clear_session_cookie(jsonify({'message': 'Logged out'})), 200
+
+
+def hashing_unavailable():
+    response = jsonify({'error': 'Server busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+def upgrade_password_hash(user, password):
+    # Re-hash with the configured method/cost after a successful login; best effort only
+    try:
+        if needs_rehash(user.password):
+            users_collection.update_one(
+                {'_id': user.id, 'password': user.password},
+                {'$set': {'password': hash_password(password)}}
+            )
+    except Exception as e:
+        logger.warning("Skipped password hash upgrade: %s", e)
+
 @api.route('/api/create_user', methods=['POST'])
+@ratelimit.limiter.limit(*ratelimit.SIGNUP_LIMITS)
 def create_user():
     try:
         data = request.get_json()
@@ -67,20 +211,26 @@ def create_user():
         if not all(field in data for field in ['first_name', 'last_name', 'email', 'password']):
             return jsonify({"error": "All fields are required!"}), 400
 
-        # Hash the password
-        hashed_password = generate_password_hash(data['password'])
+        # Hash the password on the hashing pool
+        try:
+            hashed_password = hash_password(data['password'])
+        except (HashingPoolSaturated, HashingTimeout):
+            return hashing_unavailable()
         
         # Create a new user with first name, last name, and hashed password
-        new_user = {
-            "first_name": data['first_name'],
-            "last_name": data['last_name'],
-            "password": hashed_password,  # Store the hashed password
-            "email": data['email'],
-            "address": data.get('address', "")  # Default to empty string if address not provided
-        }
+        new_user = User(
+            first_name=data['first_name'],
+            last_name=data['last_name'],
+            password=hashed_password,  # Store the hashed password
+            email=data['email'],
+            address=data.get('address', "")  # Default to empty string if address not provided
+        ).to_doc()
         
-        # Insert the new user into the 'users' collection
-        users_collection.insert_one(new_user)
+        # Insert the new user; the unique email index rejects duplicates atomically
+        try:
+            users_collection.insert_one(new_user)
+        except DuplicateKeyError:
+            return jsonify({"error": "An account with this email already exists"}), 409
 
         return jsonify({"message": "User created successfully!"}), 201
 
@@ -89,6 +239,7 @@ def create_user():
     
 
 @api.route('/api/check_email', methods=['GET'])
+@ratelimit.limiter.limit(*ratelimit.CHECK_EMAIL_LIMITS)
 def check_email():
     email = request.args.get('email')  # Get the email from the query parameter
 
@@ -96,7 +247,7 @@ def check_email():
         return jsonify({"error": "Email is required!"}), 400
 
     # Check if the email already exists in the 'users' collection
-    existing_user = users_collection.find_one({"email": email})
+    existing_user = users_collection.find_one({"email": email}, {"_id": 1})
 
     if existing_user:
         return jsonify({"exists": True}), 200  # Email exists
@@ -105,59 +256,100 @@ def check_email():
 
 
 @api.route('/api/create_account', methods=['POST'])
+@auth.login_required
 def create_account():
     try:
         # Get data from the POST request
         data = request.get_json()
 
         # Log the received data
-        print("Received data:", data)  # Add logging for debugging
-
-        # Get user_id from the cookies
-        user_id = request.cookies.get('user_id')
-        print("User ID from cookie:", user_id)  # Log user ID
+        logger.debug("Received account data", extra={"data": data})
 
-        if not user_id:
-            return jsonify({"error": "User ID not found in cookies!"}), 400
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
 
-        # Check if the user exists in the 'users' collection
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        if not user:
+        # The user may have been deleted since the token was issued (read through the user cache)
+        if auth.current_user() is None:
             return jsonify({"error": "User not found!"}), 404
 
         # Prepare the account data
-        new_account = {
-            "userID": ObjectId(user_id),  # Use user_id from cookies
-            "accountType": data['accountType'],
-            "balance": float(data['balance']),
-            "status": 'Active'
-        }
+        new_account = Account(
+            user_id=user_id,  # The signed-in user
+            account_type=data['accountType'],
+            balance=float(data['balance']),
+            status='Active'
+        ).to_doc()
 
         # Insert the new account into the 'accounts' collection
         result = accounts_collection.insert_one(new_account)
+        versions.bump(user_id)
 
         # Return a success message with the inserted ID
         return jsonify({"message": "Account created successfully!", "account_id": str(result.inserted_id)}), 200
 
     except Exception as e:
-        print(f"Error in create_account: {str(e)}")  # Log the exception message
+        logger.exception("Error in create_account: %s", e)
         return jsonify({"error": str(e)}), 500
 
+# Page size limits for /api/transaction_logs
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(log):
+    # Opaque cursor holding the (AccountID, Date, _id) position of the last log on a page
+    position = json_util.dumps([log.account_id, log.date, log.id])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        account_id, date, log_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    # The values go straight into the query, so a crafted cursor must not smuggle in operators
+    if not (isinstance(account_id, ObjectId) and isinstance(date, datetime) and isinstance(log_id, ObjectId)):
+        raise ValueError("Invalid cursor")
+
+    # Only logs strictly after the cursor position, in (AccountID, Date, _id) order
+    return {"$or": [
+        {"AccountID": {"$gt": account_id}},
+        {"AccountID": account_id, "Date": {"$gt": date}},
+        {"AccountID": account_id, "Date": date, "_id": {"$gt": log_id}},
+    ]}
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        limit = int(value) if value else default
+    except ValueError:
+        raise ValueError("limit must be a positive integer")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def build_date_filter(start_date=None, end_date=None):
+    # Inclusive 'YYYY-MM-DD' bounds turned into a [start, end + 1 day) range on Date
+    date_filter = {}
+    if start_date:
+        date_filter["$gte"] = parse_transaction_date(start_date)
+    if end_date:
+        date_filter["$lt"] = parse_transaction_date(end_date) + timedelta(days=1)
+    return date_filter
+
+
 # Route to fetch all accounts
 @api.route('/api/transaction_logs', methods=['GET'])
+@auth.login_required
+@http_cache.conditional
 def get_transaction_logs():
     try:
-        # Get user_id from the cookies
-        user_id = request.cookies.get('user_id')
-
-        if not user_id:
-            return jsonify({"error": "User ID not found in cookies!"}), 400
-
-        # Convert the user_id to an ObjectId
-        user_id = ObjectId(user_id)
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
 
         # Find all accounts associated with the user
-        accounts = list(accounts_collection.find({"userID": user_id}, {"_id": 1}))
+        accounts = [{"_id": account.id} for account in get_user_accounts(user_id)]
 
         if not accounts:
             return jsonify({"message": "No accounts found for this user"}), 404
@@ -168,51 +360,173 @@ def get_transaction_logs():
         # Create query filters for transactions (multiple accounts)
         query = {"AccountID": {"$in": account_ids}}  # Match any of the user's accounts
 
-        # Fetch the filtered transaction logs
-        transaction_logs = list(transaction_logs_collection.find(
+        # Optional date range, page size and cursor from the previous page
+        try:
+            date_filter = build_date_filter(request.args.get('start_date'), request.args.get('end_date'))
+            limit = parse_page_size(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            if date_filter:
+                query["Date"] = date_filter
+            if cursor:
+                query = {"$and": [query, decode_cursor(cursor)]}
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Fetch one page of transaction logs in keyset order, plus one row to detect a next page
+        transaction_logs = [TransactionLog.from_doc(log) for log in transaction_logs_collection.find(
             query,
-            {'Amount': 1, 'Date': 1, 'Description': 1, 'AccountID': 1, '_id': 0}
-        ))
-
-        # Create a function to serialize ObjectId
-        def serialize(data):
-            if isinstance(data, ObjectId):
-                return str(data)
-            if isinstance(data, list):
-                return [serialize(item) for item in data]
-            if isinstance(data, dict):
-                return {key: serialize(value) for key, value in data.items()}
-            return data
-
-        # Serialize transaction logs and accounts
-        serialized_transaction_logs = serialize(transaction_logs)
-        serialized_accounts = serialize(accounts)
-
-        # Create response object
+            TransactionLog.projection(),
+            sort=[('AccountID', ASCENDING), ('Date', ASCENDING), ('_id', ASCENDING)],
+            limit=limit + 1
+        )]
+
+        next_cursor = None
+        if len(transaction_logs) > limit:
+            transaction_logs = transaction_logs[:limit]
+            next_cursor = encode_cursor(transaction_logs[-1])
+
+        # ObjectIds and dates are serialized by the app's BSON-aware JSON provider
         response = {
-            "UserID": str(user_id),
-            "TransactionLogs": serialized_transaction_logs,
-            "Accounts": serialized_accounts
+            "UserID": user_id,
+            "TransactionLogs": [log.to_json() for log in transaction_logs],
+            "Accounts": accounts,
+            "next_cursor": next_cursor  # None on the last page
         }
 
         return jsonify(response), 200
 
     except Exception as e:
-        print(f"Error fetching transaction logs: {e}")
+        logger.exception("Error fetching transaction logs: %s", e)
         return jsonify({"error": str(e)}), 500
     
+# Rows fetched per round trip (and written per response chunk) when exporting statements
+EXPORT_BATCH_SIZE = 2000
+EXPORT_FIELDS = ['_id', 'AccountID', 'Date', 'Amount', 'Description']
+
+
+def export_row(log):
+    # Flatten a transaction log into plain values for NDJSON/CSV
+    return TransactionLog.from_doc(log).export_row()
+
+
+def generate_ndjson(cursor):
+    # One JSON object per line, yielded a batch at a time
+    lines = []
+    for log in cursor:
+        lines.append(json.dumps(export_row(log)))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def generate_csv(cursor):
+    # Header row first, then the rows a batch at a time through a reused buffer
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for count, log in enumerate(cursor, 1):
+        writer.writerow(export_row(log))
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def close_after(chunks, cursor):
+    # Release the server-side cursor even if the client disconnects mid-export
+    try:
+        yield from chunks
+    finally:
+        close = getattr(cursor, 'close', None)
+        if close:
+            close()
+
+
+# Route to stream a statement export straight from the MongoDB cursor
+@api.route('/api/statements/export', methods=['GET'])
+@auth.login_required
+def export_statement():
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in ('ndjson', 'csv'):
+            return jsonify({"error": "format must be 'ndjson' or 'csv'"}), 400
+
+        # Find all accounts associated with the user
+        accounts = get_user_accounts(user_id)
+
+        if not accounts:
+            return jsonify({"message": "No accounts found for this user"}), 404
+
+        query = {"AccountID": {"$in": [account.id for account in accounts]}}
+        try:
+            date_filter = build_date_filter(request.args.get('start_date'), request.args.get('end_date'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if date_filter:
+            query["Date"] = date_filter
+
+        # The cursor is consumed lazily by the response, batch_size rows per round trip
+        cursor = transaction_logs_collection.find(
+            query,
+            TransactionLog.projection(),
+            sort=[('AccountID', ASCENDING), ('Date', ASCENDING), ('_id', ASCENDING)],
+            batch_size=EXPORT_BATCH_SIZE
+        )
+
+        if export_format == 'csv':
+            chunks, mimetype = generate_csv(cursor), 'text/csv'
+        else:
+            chunks, mimetype = generate_ndjson(cursor), 'application/x-ndjson'
+
+        return Response(
+            close_after(chunks, cursor),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=statement.{export_format}"}
+        )
+
+    except Exception as e:
+        logger.exception("Error exporting statement: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to fetch a month's statement summary from the precomputed monthly rollups
+@api.route('/api/statements/<int:year>/<int:month>', methods=['GET'])
+@auth.login_required
+def get_monthly_statement(year, month):
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        if not 1 <= month <= 12:
+            return jsonify({"error": "month must be between 1 and 12"}), 400
+
+        accounts = get_user_accounts(user_id)
+
+        if not accounts:
+            return jsonify({"message": "No accounts found for this user"}), 404
+
+        summaries = rollups.statement([account.id for account in accounts], year, month)
+        return jsonify({"year": year, "month": month, "Accounts": summaries}), 200
+
+    except Exception as e:
+        logger.exception("Error fetching monthly statement: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
 # Route to fetch account details by account IDs
 @api.route('/api/account_details', methods=['GET'])
+@auth.login_required
+@http_cache.conditional
 def get_account_details():
     try:
-        # Get user_id from the cookies
-        user_id = request.cookies.get('user_id')
-
-        if not user_id:
-            return jsonify({"error": "User ID not found in cookies!"}), 400
-
-        # Convert the user_id to an ObjectId
-        user_id = ObjectId(user_id)
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
 
         # Get account IDs from query parameters
         account_ids = request.args.getlist('account_ids')  # List of account IDs
@@ -220,68 +534,591 @@ def get_account_details():
         # Convert account IDs to ObjectId
         object_ids = [ObjectId(account_id) for account_id in account_ids]
 
-        # Find accounts by IDs
-        accounts = list(accounts_collection.find({"_id": {"$in": object_ids}, "userID": user_id}))
+        # Pick the requested accounts out of the user's cached account list
+        object_ids = set(object_ids)
+        accounts = [account for account in get_user_accounts(user_id) if account.id in object_ids]
 
         if not accounts:
             return jsonify({"message": "No accounts found for the provided IDs."}), 404
 
         # Serialize account data
-        serialized_accounts = []
-        for account in accounts:
-            serialized_accounts.append({
-                "id": str(account["_id"]),
-                "userID": str(account["userID"]),
-                "accountType": account["accountType"],
-                "balance": account["balance"],
-                "status": account["status"]
-            })
+        serialized_accounts = [account.to_json() for account in accounts]
 
         return jsonify(serialized_accounts), 200
 
     except Exception as e:
-        print(f"Error fetching account details: {e}")
+        logger.exception("Error fetching account details: %s", e)
         return jsonify({"error": str(e)}), 500
     
+# Number of recent logs the dashboard returns by default
+DEFAULT_RECENT_LOGS = 10
+
+
+def dashboard_pipeline(user_id, recent_limit):
+    # One aggregation over Account joining each account's TransactionLog activity
+    return [
+        {"$match": {"userID": user_id}},
+        {"$lookup": {
+            "from": transaction_logs_collection.name,
+            "let": {"account_id": "$_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$AccountID", "$$account_id"]}}},
+                {"$facet": {
+                    "count": [{"$count": "n"}],
+                    "monthly": [{"$group": {
+                        "_id": {"year": {"$year": "$Date"}, "month": {"$month": "$Date"}},
+                        "in": {"$sum": {"$cond": [{"$gt": ["$Amount", 0]}, "$Amount", 0]}},
+                        "out": {"$sum": {"$cond": [{"$lt": ["$Amount", 0]}, {"$abs": "$Amount"}, 0]}}
+                    }}],
+                    "recent": [
+                        {"$sort": {"Date": DESCENDING, "_id": DESCENDING}},
+                        {"$limit": recent_limit},
+                        {"$project": TransactionLog.projection()}
+                    ]
+                }}
+            ],
+            "as": "activity"
+        }},
+        {"$unwind": "$activity"},
+        {"$group": {
+            "_id": None,
+            "totalBalance": {"$sum": "$balance"},
+            "accounts": {"$push": {
+                "id": "$_id",
+                "accountType": "$accountType",
+                "balance": "$balance",
+                "status": "$status",
+                "TransactionCount": {"$ifNull": [{"$arrayElemAt": ["$activity.count.n", 0]}, 0]}
+            }},
+            "monthly": {"$push": "$activity.monthly"},
+            "recent": {"$push": "$activity.recent"}
+        }}
+    ]
+
+
+# Route to fetch balances, activity totals and recent logs for every account in one request
+@api.route('/api/dashboard', methods=['GET'])
+@auth.login_required
+@http_cache.conditional
+def get_dashboard():
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        try:
+            recent_limit = parse_page_size(request.args.get('recent'), DEFAULT_RECENT_LOGS)
+        except ValueError:
+            return jsonify({"error": "recent must be a positive integer"}), 400
+
+        summary = next(iter(accounts_collection.aggregate(dashboard_pipeline(user_id, recent_limit))), None)
+
+        if not summary:
+            return jsonify({"message": "No accounts found for this user"}), 404
+
+        # Fold the per-account monthly totals and recent logs together (one entry per account)
+        monthly = {}
+        for account_months in summary["monthly"]:
+            for entry in account_months:
+                key = (entry["_id"]["year"], entry["_id"]["month"])
+                totals = monthly.setdefault(key, {"year": key[0], "month": key[1], "in": 0, "out": 0})
+                totals["in"] += entry["in"]
+                totals["out"] += entry["out"]
+
+        recent_logs = sorted(
+            (log for account_logs in summary["recent"] for log in account_logs),
+            key=lambda log: (log["Date"], log["_id"]),
+            reverse=True
+        )[:recent_limit]
+
+        return jsonify({
+            "UserID": user_id,
+            "TotalBalance": summary["totalBalance"],
+            "Accounts": summary["accounts"],
+            "Monthly": [monthly[key] for key in sorted(monthly)],
+            "RecentLogs": recent_logs
+        }), 200
+
+    except Exception as e:
+        logger.exception("Error fetching dashboard: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to push the user's balance changes and new transaction logs as Server-Sent Events
+@api.route('/api/stream', methods=['GET'])
+@auth.login_required
+def stream_events():
+    # Each open stream holds a worker thread here; async_app serves the same stream without one
+    subscription = stream.hub.subscribe(stream.Subscription(auth.current_user_id()))
+    return Response(stream.events(stream.hub, subscription), mimetype='text/event-stream',
+                    headers=stream.STREAM_HEADERS)
+
+
 # API Endpoint to fetch user transactions
 @api.route('/api/user/<user_id>/transactions', methods=['GET'])
+@auth.path_user_required
 def get_user_transactions(user_id):
     month = request.args.get('month', None)  # Optional query param for month filter
-    print(f"Received request to get transactions for user: {user_id} with month filter: {month}")
+    year = request.args.get('year', None)  # Optional year, defaults to the current year
+    logger.debug("Fetching transactions", extra={"user_id": user_id, "month": month, "year": year})
 
-    user_transactions = list(transactions_collection.find({"user_id": user_id}))
-    print(f"Fetched transactions for user {user_id}: {user_transactions}")
+    # Let MongoDB apply the month filter as a date range on the (user_id, date) index
+    try:
+        query = build_transactions_query(user_id, month, year)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Optionally filter by month
-    if month:
-        user_transactions = [
-            txn for txn in user_transactions if datetime.strptime(txn['date'], "%Y-%m-%d").strftime('%B') == month
-        ]
-        print(f"Filtered transactions for month {month}: {user_transactions}")
+    user_transactions = [
+        serialize_transaction(txn)
+        for txn in transactions_collection.find(query, sort=[("date", ASCENDING)])
+    ]
+    logger.debug("Fetched transactions", extra={"user_id": user_id, "count": len(user_transactions)})
 
     return jsonify(user_transactions)
 
+# API Endpoint for spending analytics: category totals, monthly trends and top merchants
+@api.route('/api/user/<user_id>/analytics', methods=['GET'])
+@auth.path_user_required
+def get_user_analytics(user_id):
+    try:
+        # Report month by name or number (e.g. ?month=September&year=2024), default this month
+        now = datetime.utcnow()
+        try:
+            start, _ = month_date_range(request.args.get('month') or now.month, request.args.get('year') or now.year)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # NumPy is loaded by the first report rather than at startup
+        import analytics
+        return jsonify(analytics.report(user_id, start.year, start.month)), 200
+
+    except Exception as e:
+        logger.exception("Error building analytics: %s", e)
+        return jsonify({"error": str(e)}), 500
+
 # API Endpoint to add a transaction (Transfer/Deposit)
 @api.route('/api/user/<user_id>/transaction', methods=['POST'])
+@auth.path_user_required
 def add_transaction(user_id):
     data = request.json
-    new_transaction = {
-        "user_id": user_id,
-        "type": data['type'],  # Either 'deposit' or 'transfer'
-        "amount": data['amount'],
-        "date": data['date'],  # Expected format 'YYYY-MM-DD'
-        "category": data['category'],
-        "recipient": data.get('recipient', None)  # Only relevant for transfers
-    }
-    transactions_collection.insert_one(new_transaction)
-    return jsonify({"message": "Transaction added successfully"}), 201
+    try:
+        new_transaction = build_transaction(user_id, data)  # Date expected as 'YYYY-MM-DD'
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Without an account the transaction is only recorded, as before
+        if not data.get('account_id'):
+            transactions_collection.insert_one(new_transaction)
+            versions.bump(versions.user_key(user_id))
+            return jsonify({"message": "Transaction added successfully"}), 201
+
+        # Otherwise move the money: balances and ledger legs are updated atomically
+        account_id = ObjectId(data['account_id'])
+        new_transaction["account_id"] = account_id
+        description = data.get('description') or data['category']
+        recipient = None
+        if new_transaction["type"] != 'deposit':
+            to_account_id = ObjectId(data['to_account_id']) if data.get('to_account_id') else None
+            new_transaction["to_account_id"] = to_account_id
+            recipient = to_account_id or new_transaction.get("recipient")
+
+        # Velocity rules run on in-memory counters before any money moves
+        velocity.engine.check(ObjectId(user_id), new_transaction["type"], new_transaction["amount"], recipient)
+
+        if new_transaction["type"] == 'deposit':
+            result = ledger.deposit(
+                account_id, ObjectId(user_id), new_transaction["amount"],
+                description=description, date=new_transaction["date"], transaction=new_transaction,
+                category=new_transaction["category"]
+            )
+        else:
+            result = ledger.transfer(
+                account_id, ObjectId(user_id), new_transaction["amount"], to_account_id=to_account_id,
+                description=description, date=new_transaction["date"], transaction=new_transaction,
+                category=new_transaction["category"]
+            )
+    except (InvalidId, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except ledger.AccountNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except ledger.InsufficientFunds as e:
+        return jsonify({"error": str(e)}), 409
+    except velocity.VelocityLimitExceeded as e:
+        return jsonify({"error": str(e), "rule": e.rule.name}), 429, {"Retry-After": str(int(e.rule.window))}
+    except Exception as e:
+        logger.exception("Error adding transaction: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+    velocity.engine.remember_recipient(ObjectId(user_id), recipient)
+    return jsonify({"message": "Transaction added successfully", "balance": result["balance"]}), 201
+
+# Rows validated and written per insert_many call during bulk ingestion
+BULK_CHUNK_SIZE = 1000
+DUPLICATE_KEY_ERROR = 11000
+
+
+def iter_bulk_rows():
+    # Rows from an NDJSON body (read line by line) or a JSON array body
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+    else:
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list):
+            raise ValueError("Body must be a JSON array or NDJSON")
+        yield from rows
+
+
+def validate_bulk_row(row):
+    if isinstance(row, Exception):
+        raise ValueError(f"Invalid JSON: {row}")
+    if not isinstance(row, dict):
+        raise ValueError("Row must be a JSON object")
+    for field in ('user_id', 'transaction_key'):
+        if not row.get(field):
+            raise ValueError(f"Missing fields: {field}")
+
+    transaction = build_transaction(str(row['user_id']), row)
+    transaction["transaction_key"] = str(row['transaction_key'])
+    return transaction
+
+
+def insert_bulk_chunk(docs, rows, ordered, report):
+    # Write one chunk; duplicate transaction keys were already ingested and count as done.
+    # Returns False when an ordered write hit a real error and ingestion must stop.
+    while docs:
+        try:
+            result = transactions_collection.insert_many(docs, ordered=ordered)
+            report["inserted"] += len(result.inserted_ids)
+            return True
+        except BulkWriteError as e:
+            details = e.details
+            report["inserted"] += details.get("nInserted", 0)
+            for error in details.get("writeErrors", []):
+                if error["code"] == DUPLICATE_KEY_ERROR:
+                    report["duplicates"] += 1
+                else:
+                    report["failed"].append({"row": rows[error["index"]], "error": error["errmsg"]})
+
+            if not ordered:
+                return True
+
+            # An ordered insert stops at its first error: skip past a duplicate, stop otherwise
+            last = details["writeErrors"][-1]
+            if last["code"] != DUPLICATE_KEY_ERROR:
+                report["failed"].extend(
+                    {"row": row, "error": "Not processed after an earlier error"}
+                    for row in rows[last["index"] + 1:]
+                )
+                return False
+            docs, rows = docs[last["index"] + 1:], rows[last["index"] + 1:]
+    return True
+
+
+# API Endpoint to ingest many transactions (e.g. the nightly core banking feed) in one request
+@api.route('/api/transactions/bulk', methods=['POST'])
+@auth.service_required
+def add_transactions_bulk():
+    ordered = request.args.get('ordered', 'false').lower() == 'true'
+    report = {"received": 0, "inserted": 0, "duplicates": 0, "failed": []}
+    docs, rows = [], []
+    touched = set()
+    stopped = False  # An ordered ingest stops writing at its first failure
+
+    try:
+        for index, row in enumerate(iter_bulk_rows()):
+            report["received"] += 1
+            if stopped:
+                # Still read to the end, so every row the caller sent is accounted for
+                report["failed"].append({"row": index, "error": "Not processed after an earlier error"})
+                continue
+            try:
+                docs.append(validate_bulk_row(row))
+                rows.append(index)
+            except ValueError as e:
+                report["failed"].append({"row": index, "error": str(e)})
+                stopped = ordered
+
+            # Valid rows before an ordered failure are still written
+            if len(docs) >= BULK_CHUNK_SIZE or (stopped and docs):
+                touched.update(doc["user_id"] for doc in docs)
+                stopped = not insert_bulk_chunk(docs, rows, ordered, report) or stopped
+                docs, rows = [], []
+
+        if docs:
+            touched.update(doc["user_id"] for doc in docs)
+            insert_bulk_chunk(docs, rows, ordered, report)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Error ingesting transactions: %s", e)
+        report["error"] = str(e)
+        return jsonify(report), 500
+    finally:
+        # Users whose transactions may have changed (their cached analytics are now stale)
+        versions.bump(*(versions.user_key(user_id) for user_id in touched))
+
+    # 207 Multi-Status when some rows were rejected
+    return jsonify(report), 207 if report["failed"] else 200
+
+# Payee search results per request: default and upper bound
+PAYEE_SEARCH_LIMIT = 20
+PAYEE_SEARCH_MAX_LIMIT = 100
+
+
+def normalize_name(*parts):
+    # Case-folded, single-spaced name used for sorting and prefix search
+    return " ".join(" ".join(part or "" for part in parts).split()).casefold()
+
+
+def build_payee(user_id, data):
+    # Validate a payee form body (camelCase, as AddPayee/ViewPayees send it) into a Payee
+    values = {}
+    for field in ('firstName', 'lastName', 'bankName', 'accountNumber', 'accountBSB'):
+        value = data.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{field} is required")
+        values[field] = value.strip()
+
+    bsb = re.sub(r"[\s-]", "", values['accountBSB'])
+    if not re.fullmatch(r"\d{6}", bsb):
+        raise ValueError("accountBSB must be 6 digits")
+    account_number = re.sub(r"\s", "", values['accountNumber'])
+    if not re.fullmatch(r"\d{4,10}", account_number):
+        raise ValueError("accountNumber must be 4 to 10 digits")
+
+    return Payee(
+        user_id=user_id,
+        first_name=values['firstName'],
+        last_name=values['lastName'],
+        normalized_name=normalize_name(values['firstName'], values['lastName']),
+        bank_details={"bank_name": values['bankName'], "bsb": f"{bsb[:3]}-{bsb[3:]}", "account_number": account_number}
+    )
+
+
+def load_payee_list(user_id):
+    # The encoded list and its ETag, so cache hits skip both the query and the encoding
+    payees = payees_collection.find(
+        {"user_id": user_id}, Payee.projection(*Payee.PUBLIC),
+        sort=[("normalized_name", ASCENDING), ("_id", ASCENDING)]
+    )
+    body = current_app.json.dumps([Payee.from_doc(payee).to_json() for payee in payees])
+    return {"etag": hashlib.sha1(body.encode()).hexdigest(), "body": body}
+
+
+def parse_payee_limit(value):
+    limit = int(value) if value else PAYEE_SEARCH_LIMIT
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, PAYEE_SEARCH_MAX_LIMIT)
+
+
+# Route to add a payee for the logged-in user
+@api.route('/api/new_payee', methods=['POST'])
+@auth.login_required
+def new_payee():
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        try:
+            payee = build_payee(user_id, request.get_json() or {})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        result = payees_collection.insert_one(payee.to_doc())
+        versions.bump(user_id)
+        return jsonify({"message": "Payee added successfully", "payee_id": str(result.inserted_id)}), 200
+
+    except Exception as e:
+        logger.exception("Error adding payee: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to list the user's payees (cached, with ETag revalidation) or search them by name prefix
+@api.route('/api/payees', methods=['GET'])
+@auth.login_required
+def get_payees():
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        prefix = normalize_name(request.args.get('q'))
+
+        if prefix:
+            # Anchored prefix on the (user_id, normalized_name) index, e.g. ?q=jo&limit=10
+            try:
+                limit = parse_payee_limit(request.args.get('limit'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            payees = payees_collection.find(
+                {"user_id": user_id, "normalized_name": {"$regex": "^" + re.escape(prefix)}},
+                Payee.projection(*Payee.PUBLIC),
+                sort=[("normalized_name", ASCENDING), ("_id", ASCENDING)],
+                limit=limit
+            )
+            return jsonify([Payee.from_doc(payee).to_json() for payee in payees]), 200
+
+        # Keyed by the user's data version, so a payee write in any worker moves every
+        # worker to a new entry
+        version = versions.current(user_id)
+        cached = payee_cache.get_or_load(f"{user_id}:{version}", lambda: load_payee_list(user_id))
+        response = Response(cached["body"], mimetype="application/json")
+        # Browsers revalidate every time; an unchanged list comes back as an empty 304
+        response.set_etag(cached["etag"])
+        response.headers["Cache-Control"] = "private, no-cache"
+        return http_cache.revalidate(response)
+
+    except Exception as e:
+        logger.exception("Error fetching payees: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to update one of the user's payees
+@api.route('/api/edit_payee/<payee_id>', methods=['PUT'])
+@auth.login_required
+def edit_payee(payee_id):
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        try:
+            payee_id = ObjectId(payee_id)
+            payee = build_payee(user_id, request.get_json() or {})
+        except InvalidId:
+            return jsonify({"error": "Invalid payee ID"}), 400
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        result = payees_collection.update_one({"_id": payee_id, "user_id": user_id}, {"$set": payee.to_doc()})
+
+        if result.matched_count == 0:
+            return jsonify({"error": "Payee not found"}), 404
+
+        versions.bump(user_id)
+        return jsonify({"message": "Payee updated successfully"}), 200
+
+    except Exception as e:
+        logger.exception("Error updating payee: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to delete several of the user's payees at once
+@api.route('/api/delete_payees', methods=['POST'])
+@auth.login_required
+def delete_payees():
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        ids = (request.get_json() or {}).get('ids')
+        if not isinstance(ids, list) or not ids:
+            return jsonify({"error": "ids must be a non-empty list"}), 400
+        try:
+            ids = [ObjectId(payee_id) for payee_id in ids]
+        except (InvalidId, TypeError):
+            return jsonify({"error": "Invalid payee ID"}), 400
+
+        # Scoped to the user, so other users' payees are never touched
+        result = payees_collection.delete_many({"_id": {"$in": ids}, "user_id": user_id})
+        versions.bump(user_id)
+        return jsonify({"message": "Payees deleted successfully", "deleted": result.deleted_count}), 200
+
+    except Exception as e:
+        logger.exception("Error deleting payees: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to schedule a one-off or recurring payment, paid later by the scheduler worker
+@api.route('/api/schedule_payment', methods=['POST'])
+@auth.login_required
+def schedule_payment():
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        data = request.get_json()
+        accounts = get_user_accounts(user_id)
+
+        if not accounts:
+            return jsonify({"message": "No accounts found for this user"}), 404
+
+        # Paid from the given account, or the user's first account when none is chosen
+        try:
+            account_id = ObjectId(data['account_id']) if data.get('account_id') else accounts[0].id
+            if account_id not in {account.id for account in accounts}:
+                return jsonify({"error": "Account not found"}), 404
+            payment = scheduler.new_payment(user_id, account_id, data)
+        except (InvalidId, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        result = scheduler.scheduled_payments_collection.insert_one(payment)
+        return jsonify({"message": "Payment scheduled successfully", "payment_id": str(result.inserted_id)}), 201
+
+    except Exception as e:
+        logger.exception("Error scheduling payment: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to list the user's scheduled payments
+@api.route('/api/scheduled_payments', methods=['GET'])
+@auth.login_required
+def get_scheduled_payments():
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        payments = scheduler.scheduled_payments_collection.find(
+            {"user_id": user_id},
+            ScheduledPayment.projection(*ScheduledPayment.PUBLIC),
+            sort=[("selected_date", ASCENDING), ("_id", ASCENDING)]
+        )
+        return jsonify([ScheduledPayment.from_doc(payment).to_json() for payment in payments]), 200
+
+    except Exception as e:
+        logger.exception("Error fetching scheduled payments: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Route to cancel a scheduled payment
+@api.route('/api/delete_payment/<payment_id>', methods=['DELETE'])
+@auth.login_required
+def delete_payment(payment_id):
+    try:
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
+
+        try:
+            payment_id = ObjectId(payment_id)
+        except InvalidId:
+            return jsonify({"error": "Invalid payment ID"}), 400
+
+        # A run already claimed by a worker still completes; no further runs happen
+        result = scheduler.scheduled_payments_collection.delete_one({"_id": payment_id, "user_id": user_id})
+
+        if result.deleted_count == 0:
+            return jsonify({"error": "Payment not found"}), 404
+
+        return jsonify({"message": "Payment deleted successfully"}), 200
+
+    except Exception as e:
+        logger.exception("Error deleting payment: %s", e)
+        return jsonify({"error": str(e)}), 500
 
 # Route to get all users
 @api.route('/api/users', methods=['GET'])
 def get_all_users():
     try:
         # Fetch all users from the 'users' collection
-        users = list(users_collection.find({}, {'_id': 0}))  # Exclude the '_id' field for cleaner output
+        # Public fields only: no '_id' and never the password hash
+        users = [User.from_doc(user).to_json() for user in users_collection.find({}, User.projection(*User.PUBLIC))]
 
         if not users:
             return jsonify({"message": "No users found."}), 404
@@ -293,25 +1130,21 @@ def get_all_users():
 
 # Route to get all AccountIDs by UserID
 @api.route('/api/get_accounts_by_user', methods=['GET'])
+@auth.login_required
+@http_cache.conditional
 def get_accounts_by_user():
     try:
-        # Get user_id from the cookies
-        user_id = request.cookies.get('user_id')
-
-        if not user_id:
-            return jsonify({"error": "User ID not found in cookies!"}), 400
-
-        # Convert the user_id to an ObjectId (assuming MongoDB stores user IDs as ObjectIds)
-        user_id = ObjectId(user_id)
+        # The signed-in user, from the session token verified once per request
+        user_id = auth.current_user_id()
 
         # Query the accounts collection for all accounts associated with this user
-        accounts = list(accounts_collection.find({"userID": user_id}))
+        accounts = get_user_accounts(user_id)
 
         if not accounts:
             return jsonify({"message": "No accounts found for this user"}), 404
 
         # Extract all AccountIDs and return them
-        account_ids = [str(account["_id"]) for account in accounts]
+        account_ids = [str(account.id) for account in accounts]
 
         response = {
             "UserID": str(user_id),
@@ -321,5 +1154,5 @@ def get_accounts_by_user():
         return jsonify(response), 200
 
     except Exception as e:
-        print(f"Error fetching accounts by user_id: {e}")
+        logger.exception("Error fetching accounts by user_id: %s", e)
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,246 @@
+import calendar
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import ledger
+from db import get_collection
+from models import ScheduledPayment, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Scheduled payments; due ones are found through the next_run_at index
+scheduled_payments_collection = get_collection("ScheduledPayment")
+
+# Payments claimed per round, threads paying them, and how long a claim is held before
+# another worker may take it over (a worker that dies mid-payment releases it this way)
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", 100))
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", 8))
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", 60))
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", 5))
+# Failed runs are retried with a growing delay, then the payment is marked failed
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", 3))
+SCHEDULER_RETRY_SECONDS = float(os.getenv("SCHEDULER_RETRY_SECONDS", 300))
+
+PAYMENT_TYPES = ("one-off", "recurring")
+RECURRENCES = ("weekly", "monthly")
+# A start date may be this far before today (UTC), for clients whose today is UTC's yesterday
+START_DATE_GRACE = timedelta(days=1)
+
+
+def parse_date(value, field):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a 'YYYY-MM-DD' date")
+
+
+def new_payment(user_id, account_id, data, now=None):
+    # Validate a schedule_payment body and build the stored document
+    try:
+        amount = float(data.get('amount'))
+    except (TypeError, ValueError):
+        raise ValueError("amount must be a number")
+    ledger.check_amount(amount)  # float() also parses 'nan' and 'inf'
+    if not data.get('payee'):
+        raise ValueError("payee is required")
+
+    payment_type = data.get('paymentType', 'one-off')
+    if payment_type not in PAYMENT_TYPES:
+        raise ValueError(f"paymentType must be one of {', '.join(PAYMENT_TYPES)}")
+    selected_date = parse_date(data.get('selectedDate'), 'selectedDate')
+    # Runs are anchored on the start date and overdue ones are all paid, so a recurring
+    # payment dated a year back would pay 52 weeks at once
+    today = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    if selected_date < today - START_DATE_GRACE:
+        raise ValueError("selectedDate must not be in the past")
+
+    recurrence = end_date = None
+    if payment_type == 'recurring':
+        recurrence = data.get('recurrence', 'weekly')
+        if recurrence not in RECURRENCES:
+            raise ValueError(f"recurrence must be one of {', '.join(RECURRENCES)}")
+        if data.get('endDate'):
+            end_date = parse_date(data['endDate'], 'endDate')
+            if end_date < selected_date:
+                raise ValueError("endDate must not be before selectedDate")
+
+    return ScheduledPayment(
+        user_id=user_id,
+        account_id=account_id,
+        payee=data['payee'],
+        amount=amount,
+        payment_type=payment_type,
+        selected_date=selected_date,
+        recurrence=recurrence,
+        end_date=end_date,
+        is_indefinite=payment_type == 'recurring' and end_date is None,
+        status="scheduled",
+        next_run_at=selected_date,
+        runs=0,
+        attempts=0
+    ).to_doc()
+
+
+def add_months(date, months):
+    # Same day next month(s), clamped to the month's last day (Jan 31 -> Feb 29)
+    month_index = date.month - 1 + months
+    year, month = date.year + month_index // 12, month_index % 12 + 1
+    return date.replace(year=year, month=month, day=min(date.day, calendar.monthrange(year, month)[1]))
+
+
+def next_run(payment):
+    # The run after payment.runs completed ones, anchored on the first date so monthly
+    # payments don't drift after a short month; None when the schedule is finished
+    if payment.payment_type != 'recurring':
+        return None
+    occurrence = payment.runs + 1
+    if payment.recurrence == 'monthly':
+        run_at = add_months(payment.selected_date, occurrence)
+    else:
+        run_at = payment.selected_date + timedelta(weeks=occurrence)
+    if payment.end_date is not None and run_at > payment.end_date:
+        return None
+    return run_at
+
+
+def due_query(now):
+    # Due and not leased by a live worker (a missing or expired lease both qualify)
+    return {"next_run_at": {"$lte": now}, "lease_expires_at": {"$not": {"$gt": now}}}
+
+
+def claim(worker_id, now=None, lease_seconds=SCHEDULER_LEASE_SECONDS):
+    # Atomically lease the most overdue payment; None when nothing is due
+    now = now or datetime.utcnow()
+    doc = scheduled_payments_collection.find_one_and_update(
+        due_query(now),
+        {"$set": {"lease_owner": worker_id, "lease_expires_at": now + timedelta(seconds=lease_seconds)}},
+        sort=[("next_run_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+    return ScheduledPayment.from_doc(doc) if doc else None
+
+
+def claim_batch(worker_id, size=SCHEDULER_BATCH_SIZE, now=None):
+    payments = []
+    while len(payments) < size:
+        payment = claim(worker_id, now)
+        if payment is None:
+            break
+        payments.append(payment)
+    return payments
+
+
+def transaction_key(payment):
+    # One key per scheduled run: the unique transaction_key index turns a repeated run of
+    # the same occurrence into a DuplicateKeyError, which the ledger rolls back
+    return f"scheduled:{payment.id}:{payment.runs}"
+
+
+def pay(payment):
+    run_date = payment.next_run_at
+    transaction = Transaction(
+        user_id=str(payment.user_id),
+        type="transfer",
+        amount=payment.amount,
+        date=run_date,
+        category="Scheduled Payment",
+        recipient=payment.payee,
+        account_id=payment.account_id,
+        to_account_id=payment.to_account_id,
+        transaction_key=transaction_key(payment)
+    ).to_doc()
+    ledger.transfer(
+        payment.account_id, payment.user_id, payment.amount, to_account_id=payment.to_account_id,
+        description=f"Scheduled payment to {payment.payee}", date=run_date, transaction=transaction,
+        category="Scheduled Payment"
+    )
+
+
+def complete(payment, worker_id, now):
+    # Advance to the next run (or finish) and release the lease, only if we still hold it
+    run_at = next_run(payment)
+    return scheduled_payments_collection.update_one(
+        {"_id": payment.id, "lease_owner": worker_id},
+        {"$set": {
+            "next_run_at": run_at,
+            "status": "scheduled" if run_at else "completed",
+            "last_run_at": now,
+            "last_error": None,
+            "attempts": 0,
+            "lease_owner": None,
+            "lease_expires_at": None,
+        }, "$inc": {"runs": 1}}
+    ).modified_count == 1
+
+
+def fail(payment, worker_id, now, error):
+    # Retry later with backoff; after SCHEDULER_MAX_ATTEMPTS the payment stops running
+    attempts = (payment.attempts or 0) + 1
+    update = {"attempts": attempts, "last_error": str(error), "lease_owner": None, "lease_expires_at": None}
+    if attempts >= SCHEDULER_MAX_ATTEMPTS:
+        update.update(status="failed", next_run_at=None)
+    else:
+        update["next_run_at"] = now + timedelta(seconds=SCHEDULER_RETRY_SECONDS * 2 ** (attempts - 1))
+    scheduled_payments_collection.update_one({"_id": payment.id, "lease_owner": worker_id}, {"$set": update})
+
+
+def run_payment(payment, worker_id):
+    # Returns 'paid', 'duplicate' (this run was already paid) or 'failed'
+    now = datetime.utcnow()
+    try:
+        pay(payment)
+        outcome = "paid"
+    except DuplicateKeyError:
+        outcome = "duplicate"
+    except ledger.LedgerError as e:
+        logger.warning("Scheduled payment %s failed: %s", payment.id, e)
+        fail(payment, worker_id, now, e)
+        return "failed"
+    except Exception as e:
+        logger.exception("Scheduled payment %s failed: %s", payment.id, e)
+        fail(payment, worker_id, now, e)
+        return "failed"
+    complete(payment, worker_id, now)
+    return outcome
+
+
+def process_due(worker_id, executor=None, batch_size=SCHEDULER_BATCH_SIZE, now=None):
+    # Claim one batch of due payments and pay them; returns outcome counts
+    payments = claim_batch(worker_id, batch_size, now)
+    outcomes = {"paid": 0, "duplicate": 0, "failed": 0}
+    if executor is None:
+        results = [run_payment(payment, worker_id) for payment in payments]
+    else:
+        results = executor.map(lambda payment: run_payment(payment, worker_id), payments)
+    for outcome in results:
+        outcomes[outcome] += 1
+    return outcomes
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def run_worker(worker_id=None, concurrency=SCHEDULER_CONCURRENCY, batch_size=SCHEDULER_BATCH_SIZE,
+               poll_seconds=SCHEDULER_POLL_SECONDS, stop=None, once=False):
+    # Worker loop: keep claiming while batches come back full, sleep when caught up
+    worker_id = worker_id or default_worker_id()
+    stop = stop or threading.Event()
+    totals = {"paid": 0, "duplicate": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="scheduler") as executor:
+        while not stop.is_set():
+            outcomes = process_due(worker_id, executor, batch_size)
+            for outcome, count in outcomes.items():
+                totals[outcome] += count
+            if sum(outcomes.values()):
+                logger.info("Scheduler %s processed %s", worker_id, outcomes)
+            if once and sum(outcomes.values()) < batch_size:
+                break
+            if sum(outcomes.values()) < batch_size:
+                stop.wait(poll_seconds)
+    return totals
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+from db import get_collection
+from json_provider import bson_default
+from models import Account, TransactionLog
+import versions
+
+logger = logging.getLogger(__name__)
+
+# Live balance and transaction-log push for /api/stream (Server-Sent Events). One watcher
+# thread per process learns which users' data changed from the DataVersion collection,
+# which every ledger write already bumps: a change stream where the deployment supports
+# one, otherwise a poll of recently bumped versions (mongomock, standalone servers). Only
+# users with an open stream are then re-read, and each event is serialised once and fanned
+# out to all of that user's streams.
+accounts_collection = get_collection("Account")
+transaction_logs_collection = get_collection("TransactionLog")
+
+# 'auto' tries a change stream and falls back to polling; 'change_stream' or 'poll' forces one
+STREAM_SOURCE = os.getenv("STREAM_SOURCE", "auto")
+# Poll interval, and how long the change stream waits for events before checking new streams
+STREAM_POLL_SECONDS = float(os.getenv("STREAM_POLL_SECONDS", 2))
+# Comment lines sent on an idle stream so proxies (typically 60 s) don't time it out; they
+# are nearly all of an idle stream's CPU cost, so no more often than needed
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", 30))
+# Events buffered per stream; a client that falls further behind is told to resync
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 100))
+# Most new logs pushed per user per change
+STREAM_MAX_LOGS = int(os.getenv("STREAM_MAX_LOGS", 100))
+# Logs can commit out of _id order (ids are generated before the ledger commits), so
+# every read looks back this far and skips logs it has already pushed
+LOG_SLACK = timedelta(seconds=float(os.getenv("STREAM_LOG_SLACK_SECONDS", 10)))
+
+RESYNC = object()
+
+
+def format_event(name, data, event_id=None):
+    lines = [f"event: {name}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, default=bson_default, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscription:
+    """One open stream: a bounded buffer of formatted events, read by a blocking thread."""
+
+    __slots__ = ("user_id", "lagged", "_queue")
+
+    def __init__(self, user_id, maxsize=STREAM_QUEUE_SIZE):
+        self.user_id = user_id
+        self.lagged = False
+        self._queue = queue.Queue(maxsize)
+
+    def publish(self, event):
+        # Called from the watcher thread; never blocks it
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.lagged = True
+
+    def get(self, timeout):
+        # The next event, None on heartbeat timeout, or RESYNC once events were dropped
+        if self.lagged:
+            return RESYNC
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return RESYNC if self.lagged else None
+
+
+class AsyncSubscription(Subscription):
+    """Same buffer as an asyncio.Queue, filled from the watcher thread through the event loop."""
+
+    __slots__ = ("_loop",)
+
+    def __init__(self, user_id, loop, maxsize=STREAM_QUEUE_SIZE):
+        self.user_id = user_id
+        self.lagged = False
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize)
+
+    def publish(self, event):
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # The loop has closed; the stream is gone
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def get(self, timeout):
+        if self.lagged:
+            return RESYNC
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return RESYNC if self.lagged else None
+
+
+class UserState:
+    """What a user's streams have been sent: balances per account and recently pushed logs."""
+
+    __slots__ = ("balances", "since", "pushed")
+
+    def __init__(self, since):
+        self.balances = None  # account id -> balance, after the first read
+        self.since = since  # Logs with an _id generated before this are not pushed
+        self.pushed = deque()  # (_id, generation time) of logs pushed within LOG_SLACK
+
+
+class StreamHub:
+    """Per-process registry of open streams and the single watcher thread that feeds them."""
+
+    def __init__(self, source=STREAM_SOURCE, poll_seconds=STREAM_POLL_SECONDS):
+        self.source = source
+        self.poll_seconds = poll_seconds
+        self._subscriptions = {}  # user id -> set of Subscription
+        self._state = {}  # user id -> UserState
+        self._pending = []  # New subscriptions awaiting their snapshot
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.mode = None  # 'change_stream' or 'poll' once started
+
+    def subscribe(self, subscription):
+        # Never reads the database, so it is safe from an event loop; the watcher sends the snapshot
+        with self._lock:
+            self._subscriptions.setdefault(subscription.user_id, set()).add(subscription)
+            self._pending.append(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stream-watcher", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return subscription
+
+    def stop(self, timeout=5):
+        # Stop the watcher thread, at shutdown or when a test is done with the hub; a stopped
+        # hub stays stopped
+        with self._lock:
+            thread = self._thread
+        self._stop.set()
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+                    self._state.pop(subscription.user_id, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def _publish(self, user_id, event, only=None):
+        with self._lock:
+            subscriptions = [only] if only is not None else list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.publish(event)
+
+    def refresh(self, user_id, snapshot_for=()):
+        # Re-read a changed user's balances and new logs and push the differences; a new
+        # subscription is sent every balance as its snapshot
+        with self._lock:
+            if user_id not in self._subscriptions:
+                return
+            state = self._state.get(user_id)
+            if state is None:
+                state = self._state[user_id] = UserState(datetime.now(timezone.utc))
+
+        accounts = [Account.from_doc(doc) for doc in accounts_collection.find(
+            {"userID": user_id}, Account.projection("id", "balance"))]
+        balances = {account.id: account.balance for account in accounts}
+        if state.balances is not None:
+            for account_id, balance in balances.items():
+                if state.balances.get(account_id) != balance:
+                    self._publish(user_id, format_event("balance", {"account_id": account_id, "balance": balance}))
+        state.balances = balances
+
+        if accounts:
+            since = state.since
+            while state.pushed and state.pushed[0][1] < since - LOG_SLACK:
+                state.pushed.popleft()
+            pushed = {log_id for log_id, _ in state.pushed}
+            logs = transaction_logs_collection.find(
+                {"AccountID": {"$in": list(balances)}, "_id": {"$gt": ObjectId.from_datetime(since - LOG_SLACK)}},
+                TransactionLog.projection(), sort=[("_id", ASCENDING)], limit=STREAM_MAX_LOGS
+            )
+            for log in map(TransactionLog.from_doc, logs):
+                if log.id in pushed:
+                    continue
+                generated = log.id.generation_time
+                state.pushed.append((log.id, generated))
+                state.since = max(state.since, generated)
+                self._publish(user_id, format_event("transaction_log", log.to_json(), log.id))
+
+        snapshot = format_event("snapshot", {"accounts": [
+            {"account_id": account_id, "balance": balance} for account_id, balance in balances.items()]})
+        for subscription in snapshot_for:
+            self._publish(user_id, snapshot, only=subscription)
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        by_user = {}
+        for subscription in pending:
+            by_user.setdefault(subscription.user_id, []).append(subscription)
+        return by_user
+
+    def _refresh_all(self, user_ids, pending):
+        for user_id in set(user_ids) | set(pending):
+            try:
+                self.refresh(user_id, pending.get(user_id, ()))
+            except PyMongoError as e:
+                logger.warning("Stream refresh failed for %s: %s", user_id, e)
+
+    def _run(self):
+        if self.source in ("auto", "change_stream"):
+            try:
+                self._watch_change_stream()
+                return
+            except (PyMongoError, NotImplementedError, TypeError) as e:
+                # TypeError: stand-ins such as mongomock have no watch()
+                if self.source == "change_stream":
+                    logger.exception("Change stream unavailable: %s", e)
+                    raise
+                logger.info("Change streams unavailable (%s); polling every %gs", e, self.poll_seconds)
+        self._poll()
+
+    def _watch_change_stream(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        resume_token = None
+        while not self._stop.is_set():
+            with versions.versions_collection.watch(
+                pipeline, resume_after=resume_token, max_await_time_ms=int(self.poll_seconds * 1000)
+            ) as changes:
+                self.mode = "change_stream"
+                logger.info("Streaming changes from DataVersion")
+                try:
+                    while changes.alive and not self._stop.is_set():
+                        changed = []
+                        change = changes.try_next()
+                        while change is not None:
+                            changed.append(change["documentKey"]["_id"])
+                            change = changes.try_next() if len(changed) < 1000 else None
+                        resume_token = changes.resume_token
+                        self._refresh_all(changed, self._take_pending())
+                except PyMongoError as e:
+                    logger.warning("Change stream interrupted, resuming: %s", e)
+                    self._stop.wait(1)
+
+    def _poll(self):
+        self.mode = "poll"
+        # Versions bumped since the previous poll began, looking back a full interval to cover
+        # clock differences between this process and the database
+        last = datetime.now(timezone.utc)
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            pending = self._take_pending()
+            started = datetime.now(timezone.utc)
+            changed = []
+            try:
+                with self._lock:
+                    watched = bool(self._subscriptions)
+                if watched:
+                    since = last - timedelta(seconds=self.poll_seconds)
+                    changed = [doc["_id"] for doc in versions.versions_collection.find(
+                        {"updated_at": {"$gte": since.replace(tzinfo=None)}}, {"_id": 1})]
+                last = started
+            except PyMongoError as e:
+                logger.warning("Stream poll failed: %s", e)
+            self._refresh_all(changed, pending)
+
+
+def events(hub, subscription, heartbeat=STREAM_HEARTBEAT_SECONDS):
+    # The text/event-stream body for a blocking (WSGI) server; unsubscribes when the client goes
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            event = subscription.get(heartbeat)
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event is RESYNC:
+                yield format_event("resync", {})
+                return
+            else:
+                yield event
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def events_async(hub, subscription, heartbeat=STREAM_HEARTBEAT_SECONDS):
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            event = await subscription.get(heartbeat)
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event is RESYNC:
+                yield format_event("resync", {})
+                return
+            else:
+                yield event
+    finally:
+        hub.unsubscribe(subscription)
+
+
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+hub = StreamHub()
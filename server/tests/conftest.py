@@ -0,0 +1,20 @@
+import mongomock
+import pytest
+import db as database
+import ledger
+from cache import CACHES
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # Every module's collections resolve to a fresh local stand-in database; mongomock has
+    # no sessions, so the ledger runs its non-transactional fallback
+    client = mongomock.MongoClient()
+    database.use_client(client, "test")
+    monkeypatch.setattr(ledger, "LEDGER_TRANSACTIONS", "off")
+    for cache in CACHES:
+        cache.backend.clear()
+    yield client.test
+    for cache in CACHES:
+        cache.backend.clear()
+    database.close_client()
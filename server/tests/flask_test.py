@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import patch, MagicMock
 from flask import Flask
 from bson import ObjectId  # Import ObjectId from bson
+import auth
 from routes import api  # Assuming this is where your blueprint is registered
 
 @pytest.fixture
@@ -20,16 +21,16 @@ def test_create_account_missing_user_id(client):
         "balance": 1000.00
     }
 
-    # Send POST request without user_id cookie
+    # Send POST request without a session cookie
     response = client.post('/api/create_account', json=data)
 
-    # Assert that the response status is 400 (Bad Request) and the appropriate message is returned
-    assert response.status_code == 400
-    assert b"User ID not found in cookies!" in response.data
+    # Assert that the response status is 401 (Unauthorized) and the appropriate message is returned
+    assert response.status_code == 401
+    assert b"Not logged in" in response.data
 
 # 2. Test case for successful account creation
 @patch('routes.accounts_collection')
-@patch('routes.users_collection')
+@patch('auth.users_collection')
 def test_create_account_success(mock_users_collection, mock_accounts_collection, client):
     # Mock the user lookup to return a valid user
     user_id = str(ObjectId())
@@ -47,7 +48,7 @@ def test_create_account_success(mock_users_collection, mock_accounts_collection,
     }
 
     # Set the user_id as a cookie directly
-    client.set_cookie('localhost', 'user_id', user_id)
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
 
     # Send the POST request to create an account
     response = client.post('/api/create_account', json=data)
@@ -59,7 +60,7 @@ def test_create_account_success(mock_users_collection, mock_accounts_collection,
 
 # 3. Test case for user not found
 @patch('routes.accounts_collection')
-@patch('routes.users_collection')
+@patch('auth.users_collection')
 def test_create_account_user_not_found(mock_users_collection, mock_accounts_collection, client):
     # Mock the user lookup to return None (user not found)
     mock_users_collection.find_one.return_value = None
@@ -71,7 +72,7 @@ def test_create_account_user_not_found(mock_users_collection, mock_accounts_coll
     }
 
     # Set a valid user_id as a cookie
-    client.set_cookie('localhost', 'user_id', str(ObjectId()))
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
 
     # Send the POST request to create an account
     response = client.post('/api/create_account', json=data)
@@ -82,7 +83,7 @@ def test_create_account_user_not_found(mock_users_collection, mock_accounts_coll
 
 # 4. Test case for invalid balance (non-numeric value)
 @patch('routes.accounts_collection')
-@patch('routes.users_collection')
+@patch('auth.users_collection')
 def test_create_account_invalid_balance(mock_users_collection, mock_accounts_collection, client):
     # Mock the user lookup to return a valid user
     mock_users_collection.find_one.return_value = {"_id": str(ObjectId())}
@@ -94,7 +95,7 @@ def test_create_account_invalid_balance(mock_users_collection, mock_accounts_col
     }
 
     # Set a valid user_id as a cookie
-    client.set_cookie('localhost', 'user_id', str(ObjectId()))
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
 
     # Send the POST request to create an account
     response = client.post('/api/create_account', json=data)
@@ -105,7 +106,7 @@ def test_create_account_invalid_balance(mock_users_collection, mock_accounts_col
 
 # 5. Test case for database insertion failure
 @patch('routes.accounts_collection')
-@patch('routes.users_collection')
+@patch('auth.users_collection')
 def test_create_account_db_insertion_failure(mock_users_collection, mock_accounts_collection, client):
     # Mock the user lookup to return a valid user
     mock_users_collection.find_one.return_value = {"_id": str(ObjectId())}
@@ -120,7 +121,7 @@ def test_create_account_db_insertion_failure(mock_users_collection, mock_account
     }
 
     # Set a valid user_id as a cookie
-    client.set_cookie('localhost', 'user_id', str(ObjectId()))
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
 
     # Send the POST request to create an account
     response = client.post('/api/create_account', json=data)
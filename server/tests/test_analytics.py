@@ -0,0 +1,75 @@
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from flask import Flask
+import analytics
+import auth
+from routes import api
+
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    client = app.test_client()
+    yield client
+
+
+def txn(user_id, date, amount, category, type="transfer", recipient=None):
+    return {"user_id": user_id, "type": type, "amount": amount, "date": datetime.strptime(date, "%Y-%m-%d"),
+            "category": category, "recipient": recipient}
+
+
+def test_report_totals_trends_and_merchants():
+    docs = [
+        txn("u", "2024-01-10", 100.0, "Groceries", recipient="Coles"),
+        txn("u", "2024-02-03", 50.0, "Groceries", recipient="Coles"),
+        txn("u", "2024-03-01", 30.0, "Groceries", recipient="Woolworths"),
+        txn("u", "2024-03-05", 20.0, "Groceries", recipient="Coles"),
+        txn("u", "2024-03-09", 150.0, "Rent", recipient="Landlord"),
+        txn("u", "2024-03-15", 1000.0, "Income", type="deposit"),
+    ]
+    report = analytics.build_report(analytics.Columns.from_docs(docs), 2024, 3, history=3, window=2, top=2)
+
+    assert report["totals"] == {"income": 1000.0, "spending": 200.0, "net": 800.0, "count": 4}
+    assert [(c["category"], c["spending"], c["income"], c["share"]) for c in report["categories"]] == [
+        ("Rent", 150.0, 0.0, 75.0), ("Groceries", 50.0, 0.0, 25.0), ("Income", 0.0, 1000.0, 0.0)
+    ]
+    assert [(m["month"], m["spending"], m["spending_change"], m["spending_change_pct"], m["rolling_spending"])
+            for m in report["monthly"]] == [
+        (1, 100.0, None, None, 100.0), (2, 50.0, -50.0, -50.0, 75.0), (3, 200.0, 150.0, 300.0, 125.0)
+    ]
+    assert report["top_merchants"] == [
+        {"recipient": "Landlord", "spending": 150.0, "count": 1},
+        {"recipient": "Woolworths", "spending": 30.0, "count": 1}
+    ]
+
+
+def test_empty_report():
+    report = analytics.build_report(analytics.Columns.from_docs([]), 2024, 1, history=2)
+
+    assert report["totals"]["count"] == 0
+    assert report["categories"] == [] and report["top_merchants"] == []
+    assert [m["month"] for m in report["monthly"]] == [12, 1]
+
+
+def test_analytics_route_is_memoised_until_a_new_transaction(db, client):
+    user_id = str(ObjectId())
+    db.transactions.insert_many([txn(user_id, "2024-09-02", 40.0, "Food"), txn("other", "2024-09-02", 9.0, "Food")])
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
+
+    response = client.get(f'/api/user/{user_id}/analytics?month=September&year=2024')
+    assert response.status_code == 200
+    assert response.get_json()["totals"]["spending"] == 40.0
+
+    # Served from the cache: a write that bypasses the routes isn't seen
+    db.transactions.insert_one(txn(user_id, "2024-09-03", 60.0, "Food"))
+    assert client.get(f'/api/user/{user_id}/analytics?month=9&year=2024').get_json()["totals"]["spending"] == 40.0
+
+    client.post(f'/api/user/{user_id}/transaction', json={
+        "type": "transfer", "amount": 5, "date": "2024-09-04", "category": "Food"
+    })
+    assert client.get(f'/api/user/{user_id}/analytics?month=9&year=2024').get_json()["totals"]["spending"] == 105.0
+
+    assert client.get(f'/api/user/{user_id}/analytics?month=13').status_code == 400
@@ -1,15 +1,34 @@
+import os
+import subprocess
+import sys
+import mongomock
 import pytest
-from app import app
+from bson import ObjectId
+import auth
+import db
+import ledger
+from app import create_app
 
 @pytest.fixture
-def client():
-    app.config['TESTING'] = True
+def mongo():
+    # Local stand-in database injected through the factory; no network needed
+    client = mongomock.MongoClient()
+    yield client
+    db.close_client()
+
+@pytest.fixture
+def app(mongo):
+    return create_app({"TESTING": True, "MONGO_CLIENT": mongo, "MONGO_DB_NAME": "ZenithBankTest"})
+
+@pytest.fixture
+def client(app):
     with app.test_client() as client:
         yield client
 
 # Test fetching transactions for the valid ObjectId user
 def test_get_transactions(client):
-    # Use the provided valid ObjectId
+    # Use the provided valid ObjectId, signed in as that user
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token('66dd278176f84b91f0dc77f0'))
     response = client.get('/api/user/66dd278176f84b91f0dc77f0/transactions?month=September')
     assert response.status_code == 200 or response.status_code == 400  # Expect either a success or a bad request
 
@@ -21,6 +40,69 @@ def test_post_transaction(client):
         "category": "Income",
         "recipient": "Self"
     }
-    response = client.post('/api/user/123/transaction', json=new_transaction)
+    # Only the signed-in user can add to their own transactions
+    user_id = '66dd278176f84b91f0dc77f0'
+    assert client.post(f'/api/user/{user_id}/transaction', json=new_transaction).status_code == 401
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
+    response = client.post(f'/api/user/{user_id}/transaction', json=new_transaction)
+    assert response.status_code == 201
+    assert response.json['message'] == "Transaction added successfully"
+    assert client.post('/api/user/66dd278176f84b91f0dc77f1/transaction', json=new_transaction).status_code == 403
+
+
+def test_injected_database_serves_routes(client, mongo):
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token('66dd278176f84b91f0dc77f0'))
+    client.post('/api/user/66dd278176f84b91f0dc77f0/transaction', json={
+        "type": "deposit", "amount": 25, "date": "2024-09-03", "category": "Income", "recipient": "Self"
+    })
+
+    assert mongo.ZenithBankTest.transactions.count_documents({}) == 1
+    response = client.get('/api/user/66dd278176f84b91f0dc77f0/transactions?month=9&year=2024')
+    assert [txn["date"] for txn in response.get_json()] == ["2024-09-03"]
+
+
+def test_transactions_route_registered_once(app):
+    rules = [rule for rule in app.url_map.iter_rules() if rule.rule == '/api/user/<user_id>/transactions']
+    assert len(rules) == 1
+    assert rules[0].endpoint == 'api.get_user_transactions'
+
+
+def test_import_has_no_side_effects():
+    # A fresh interpreter: importing the app module builds no app or client
+    code = "import app, db; assert app._app is None and db._client is None"
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
+
+
+def test_settings_from_env_file_are_honoured(tmp_path):
+    # Settings read at import (here SERVICE_TOKENS) must see server/.env; a fresh
+    # interpreter reads a stand-in .env instead of the real one
+    (tmp_path / ".env").write_text("SERVICE_TOKENS=feed-token\n")
+    code = f"""
+import functools, dotenv, mongomock
+dotenv.load_dotenv = functools.partial(dotenv.load_dotenv, {str(tmp_path / ".env")!r})
+from app import create_app
+client = create_app({{"TESTING": True, "MONGO_CLIENT": mongomock.MongoClient()}}).test_client()
+response = client.post("/api/transactions/bulk", json=[], headers={{"Authorization": "Bearer feed-token"}})
+assert response.status_code != 401, response.status_code
+"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env.pop("SERVICE_TOKENS", None)
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
+
+
+def test_injected_stand_in_moves_money_without_sessions(client, mongo, monkeypatch):
+    # mongomock has no sessions; the ledger falls back to its compensating writes
+    monkeypatch.setattr(ledger, "LEDGER_TRANSACTIONS", "auto")
+    monkeypatch.setattr(ledger, "_transactions_supported", None)
+    user_id = ObjectId('66dd278176f84b91f0dc77f0')
+    account = mongo.ZenithBankTest.Account.insert_one({"userID": user_id, "balance": 10.0, "status": "Active"})
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(user_id)))
+
+    response = client.post(f'/api/user/{user_id}/transaction', json={
+        "type": "deposit", "amount": 25, "date": "2024-09-03", "category": "Income",
+        "account_id": str(account.inserted_id)
+    })
     assert response.status_code == 201
-    assert response.json['message'] == "Transaction added successfully"
\ No newline at end of file
+    assert response.get_json()["balance"] == 35.0
+    assert ledger._transactions_supported is False
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from bson import ObjectId
+import auth
+from async_app import create_async_app
+
+
+def motor_collection(documents):
+    # Stand-in for a Motor collection whose find() cursor resolves to the documents
+    collection = MagicMock()
+    collection.find.return_value.to_list = AsyncMock(return_value=documents)
+    return collection
+
+
+def get(path, cookies=None):
+    async def request():
+        client = create_async_app().test_client()
+        for key, value in (cookies or {}).items():
+            client.set_cookie('localhost', key, value)
+        response = await client.get(path)
+        return response.status_code, await response.get_json()
+    return asyncio.run(request())
+
+
+@pytest.fixture
+def motor_db():
+    # No writes yet: every user is at data version 0
+    db = {"DataVersion": MagicMock(find_one=AsyncMock(return_value=None))}
+    with patch('async_app.get_motor_db', return_value=db):
+        yield db
+
+
+def test_transaction_logs_contract(motor_db):
+    user_id, account_id = ObjectId(), ObjectId()
+    motor_db["Account"] = motor_collection([{"_id": account_id, "userID": user_id}])
+    motor_db["TransactionLog"] = motor_collection([{
+        "_id": ObjectId(), "Amount": 100.0, "Date": datetime(2024, 9, 1), "Description": "Deposit",
+        "AccountID": account_id
+    }])
+
+    status, data = get('/api/transaction_logs?limit=10', {auth.SESSION_COOKIE: auth.issue_token(user_id)})
+
+    assert status == 200
+    assert data['TransactionLogs'][0]['AccountID'] == str(account_id)
+    assert data['Accounts'] == [{"_id": str(account_id)}]
+    assert data['next_cursor'] is None
+    assert motor_db["TransactionLog"].find.call_args[1]['limit'] == 11
+
+
+def test_account_details_contract(motor_db):
+    user_id, account_id = ObjectId(), ObjectId()
+    motor_db["Account"] = motor_collection([{
+        "_id": account_id, "userID": user_id, "accountType": "Savings", "balance": 10.0, "status": "Active"
+    }])
+
+    status, data = get(f'/api/account_details?account_ids={account_id}', {auth.SESSION_COOKIE: auth.issue_token(user_id)})
+
+    assert status == 200
+    assert data == [{
+        "id": str(account_id), "userID": str(user_id), "accountType": "Savings", "balance": 10.0,
+        "status": "Active"
+    }]
+
+
+def test_user_transactions_month_filter(motor_db):
+    user_id = ObjectId()
+    motor_db["transactions"] = motor_collection([{
+        "_id": ObjectId(), "user_id": str(user_id), "amount": 5, "date": datetime(2024, 9, 1)
+    }])
+
+    # Only the signed-in user's own transactions
+    assert get(f'/api/user/{user_id}/transactions')[0] == 401
+    assert get(f'/api/user/{ObjectId()}/transactions', {auth.SESSION_COOKIE: auth.issue_token(user_id)})[0] == 403
+    status, data = get(f'/api/user/{user_id}/transactions?month=September&year=2024',
+                       {auth.SESSION_COOKIE: auth.issue_token(user_id)})
+
+    assert status == 200
+    assert data[0]['date'] == "2024-09-01"
+    query = motor_db["transactions"].find.call_args[0][0]
+    assert query['date'] == {"$gte": datetime(2024, 9, 1), "$lt": datetime(2024, 10, 1)}
+
+
+def test_missing_cookie(motor_db):
+    status, data = get('/api/transaction_logs')
+    assert status == 401
@@ -0,0 +1,83 @@
+from unittest.mock import MagicMock, patch
+import pytest
+from bson import ObjectId
+from flask import Flask
+from werkzeug.security import generate_password_hash
+import auth
+from cache import user_cache
+from routes import api
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-secret'
+    user_cache.backend.clear()
+    # Conditional routes read the user's data version first
+    with patch('versions.versions_collection', MagicMock(find_one=MagicMock(return_value=None))):
+        yield app.test_client()
+    user_cache.backend.clear()
+
+
+def test_tokens_round_trip_and_reject_tampering():
+    user_id = ObjectId()
+    token = auth.issue_token(user_id)
+
+    assert auth.verify_token(token) == user_id
+    assert auth.verify_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB")) is None
+    assert auth.verify_token(str(user_id)) is None
+    assert auth.verify_token(token, max_age=-1) is None  # Expired
+    assert auth.verify_token(None) is None
+
+
+@patch('routes.accounts_collection')
+def test_raw_user_id_cookie_is_not_trusted(mock_accounts_collection, client):
+    client.set_cookie('user_id', str(ObjectId()))
+
+    response = client.get('/api/get_accounts_by_user')
+
+    assert response.status_code == 401
+    mock_accounts_collection.find.assert_not_called()
+
+
+@patch('routes.accounts_collection')
+@patch('routes.users_collection')
+def test_login_issues_session_cookie(mock_users_collection, mock_accounts_collection, client):
+    user_id = ObjectId()
+    mock_users_collection.find_one.return_value = {
+        "_id": user_id, "first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com",
+        "password": generate_password_hash("secret")
+    }
+    mock_accounts_collection.find.return_value = [{"_id": ObjectId(), "userID": user_id}]
+
+    response = client.post('/api/LoginPage', json={"email": "ada@example.com", "password": "secret"})
+
+    assert response.status_code == 200
+    cookie = client.get_cookie(auth.SESSION_COOKIE)
+    assert cookie.http_only and cookie.same_site == 'Lax'
+    assert client.get('/api/get_accounts_by_user').status_code == 200
+
+    client.post('/api/logout')
+    assert client.get_cookie(auth.SESSION_COOKIE) is None
+    assert client.get('/api/get_accounts_by_user').status_code == 401
+
+
+@patch('routes.accounts_collection')
+@patch('auth.users_collection')
+def test_principal_is_cached_between_requests(mock_users_collection, mock_accounts_collection, client):
+    user_id = ObjectId()
+    mock_users_collection.find_one.return_value = {"_id": user_id, "first_name": "Ada"}
+    mock_accounts_collection.insert_one.return_value.inserted_id = ObjectId()
+    # Signed with the app's SECRET_KEY
+    with client.application.app_context():
+        client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
+
+    for _ in range(3):
+        response = client.post('/api/create_account', json={"accountType": "Savings", "balance": 10})
+        assert response.status_code == 200
+
+    assert mock_users_collection.find_one.call_count == 1
+    # The password hash is never loaded into the cached principal
+    assert "password" not in mock_users_collection.find_one.call_args[0][1]
@@ -0,0 +1,96 @@
+from unittest.mock import MagicMock, patch
+import mongomock
+import pytest
+from bson import ObjectId
+from flask import Flask
+import auth
+from cache import MISSING, ReadThroughCache, RedisCache, TTLCache
+from routes import api
+
+
+class FakeRedis:
+    # In-memory stand-in for a redis.Redis client (expiry is not simulated)
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    client = app.test_client()
+    with patch('versions.versions_collection', MagicMock(find_one=MagicMock(return_value=None))):
+        yield client
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    backend = TTLCache() if request.param == "memory" else RedisCache(FakeRedis())
+    return ReadThroughCache(backend, "accounts", ttl=60)
+
+
+def test_read_through_counts_hits_and_misses(cache):
+    user_id = ObjectId()
+    accounts = [{"_id": ObjectId(), "userID": user_id, "balance": 10.0}]
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return accounts
+
+    assert cache.get_or_load(user_id, loader) == accounts
+    assert cache.get_or_load(user_id, loader) == accounts
+    assert len(loads) == 1
+
+    # A new data version is a new key, so it loads again
+    cache.get_or_load(f"{user_id}:1", loader)
+    assert len(loads) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2}
+
+
+def test_empty_results_are_cached(cache):
+    cache.get_or_load("user", list)
+    assert cache.get_or_load("user", lambda: pytest.fail("should be cached")) == []
+
+
+def test_ttl_cache_expiry_and_lru_eviction():
+    ttl_cache = TTLCache(maxsize=2)
+    ttl_cache.set("expired", 1, ttl=-1)
+    assert ttl_cache.get("expired") is MISSING
+
+    ttl_cache.set("a", 1, ttl=60)
+    ttl_cache.set("b", 2, ttl=60)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3, ttl=60)
+    assert ttl_cache.get("b") is MISSING
+    assert ttl_cache.get("a") == 1
+
+
+@patch('routes.accounts_collection')
+def test_account_routes_share_cached_accounts(mock_accounts_collection, client):
+    user_id = ObjectId()
+    account_id = ObjectId()
+    mock_accounts_collection.find.return_value = [{
+        "_id": account_id, "userID": user_id, "accountType": "Savings", "balance": 10.0, "status": "Active"
+    }]
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(user_id)))
+
+    assert client.get('/api/get_accounts_by_user').get_json()['AccountIDs'] == [str(account_id)]
+    details = client.get(f'/api/account_details?account_ids={account_id}').get_json()
+    assert details[0]['id'] == str(account_id)
+    assert mock_accounts_collection.find.call_count == 1
+
+    # Creating an account bumps the user's data version, which moves every process to a new entry
+    with patch('auth.users_collection') as mock_users_collection, \
+            patch('versions.versions_collection', mongomock.MongoClient().db.DataVersion):
+        mock_users_collection.find_one.return_value = {"_id": user_id}
+        client.post('/api/create_account', json={"accountType": "Checking", "balance": 0})
+        client.get('/api/get_accounts_by_user')
+    assert mock_accounts_collection.find.call_count == 2
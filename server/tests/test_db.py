@@ -0,0 +1,69 @@
+from unittest.mock import patch
+import pytest
+import db
+from app import app
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def fresh_client(monkeypatch):
+    # Start every test without a cached client and against a local URI
+    monkeypatch.setenv("MONGO_URI", "mongodb://localhost:27017")
+    db.close_client()
+    yield
+    db.close_client()
+
+
+def test_client_is_shared_and_lazy(fresh_client):
+    # No client exists until the first operation asks for one
+    assert db._client is None
+
+    client = db.get_client()
+    assert db.get_client() is client
+    assert db.get_db().name == db.DEFAULT_DB_NAME
+
+
+def test_client_options_from_environment(fresh_client, monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "7")
+    monkeypatch.setenv("MONGO_READ_PREFERENCE", "secondaryPreferred")
+
+    options = db.get_client().options
+    assert options.pool_options.max_pool_size == 7
+    assert options.read_preference.mongos_mode == "secondaryPreferred"
+
+
+def test_client_reset_after_fork(fresh_client):
+    parent_client = db.get_client()
+    db._reset_after_fork()
+    assert db.get_client() is not parent_client
+
+
+def test_missing_uri_raises_on_first_use(fresh_client, monkeypatch):
+    monkeypatch.delenv("MONGO_URI")
+    with pytest.raises(ValueError):
+        db.get_client()
+
+
+def test_lazy_collection_resolves_shared_db(fresh_client):
+    collection = db.get_collection("Account")
+    assert collection.full_name == f"{db.DEFAULT_DB_NAME}.Account"
+
+
+@patch('db.ping')
+def test_ready(mock_ping, client):
+    response = client.get('/api/ready')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == "ready"
+
+
+@patch('db.ping')
+def test_not_ready_when_mongo_unreachable(mock_ping, client):
+    mock_ping.side_effect = Exception("No servers found")
+    response = client.get('/api/ready')
+    assert response.status_code == 503
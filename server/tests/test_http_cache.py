@@ -0,0 +1,122 @@
+import gzip
+import pytest
+from bson import ObjectId
+from flask import Flask, Response, jsonify
+import auth
+import http_cache
+import ledger
+import versions
+from routes import api
+
+
+@pytest.fixture
+def app(db):
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    http_cache.init_app(app)
+    app.config['TESTING'] = True
+
+    @app.route('/test/text/<int:size>')
+    def text(size):
+        return jsonify({"data": "x" * size})
+
+    @app.route('/test/stream')
+    def stream():
+        return Response((chunk for chunk in ("x" * 4096,)), mimetype="application/x-ndjson")
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def test_unchanged_data_revalidates_until_a_write(db, client):
+    user_id = ObjectId()
+    account = db.Account.insert_one({"userID": user_id, "balance": 10.0, "status": "Active"}).inserted_id
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(user_id)))
+
+    response = client.get('/api/get_accounts_by_user')
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    response = client.get('/api/get_accounts_by_user', headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    # Same version, different URL: a different representation, so a different tag
+    response = client.get(f'/api/account_details?account_ids={account}', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    ledger.deposit(account, user_id, 5.0)
+    response = client.get('/api/get_accounts_by_user', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_write_in_another_process_is_not_served_from_cache(db, client):
+    user_id = ObjectId()
+    account = db.Account.insert_one({"userID": user_id, "balance": 10.0, "status": "Active"}).inserted_id
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(user_id)))
+    etag = client.get(f'/api/account_details?account_ids={account}').headers["ETag"]
+
+    # A scheduler worker elsewhere pays from the account: it bumps the version but can't
+    # touch this process's cache
+    db.Account.update_one({"_id": account}, {"$inc": {"balance": -4.0}})
+    versions.bump(user_id)
+
+    response = client.get(f'/api/account_details?account_ids={account}', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()[0]["balance"] == 6.0
+
+
+def test_transfer_bumps_both_owners(db):
+    sender, recipient = ObjectId(), ObjectId()
+    source = db.Account.insert_one({"userID": sender, "balance": 10.0, "status": "Active"}).inserted_id
+    target = db.Account.insert_one({"userID": recipient, "balance": 0.0, "status": "Active"}).inserted_id
+
+    ledger.transfer(source, sender, 5.0, to_account_id=target)
+
+    assert versions.current(sender) == 1
+    assert versions.current(recipient) == 1
+    assert versions.current(ObjectId()) == 0
+
+
+def test_errors_carry_no_etag(db, client):
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+
+    response = client.get('/api/get_accounts_by_user')
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+
+
+def test_compression_threshold(client):
+    small = client.get('/test/text/10', headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    assert small.headers["Vary"] == "Accept-Encoding"
+
+    large = client.get('/test/text/5000', headers={"Accept-Encoding": "gzip"})
+    assert large.headers["Content-Encoding"] == "gzip"
+    assert int(large.headers["Content-Length"]) < 5000
+    assert b"x" * 5000 in gzip.decompress(large.data)
+
+    assert "Content-Encoding" not in client.get('/test/text/5000').headers
+    assert "Content-Encoding" not in client.get('/test/stream', headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_compressed_responses_get_their_own_etag(db, client, monkeypatch):
+    monkeypatch.setattr(http_cache, "COMPRESSION_MIN_SIZE", 1)
+    user_id = ObjectId()
+    db.Account.insert_one({"userID": user_id, "balance": 10.0, "status": "Active"})
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(user_id)))
+
+    plain = client.get('/api/get_accounts_by_user').headers["ETag"]
+    response = client.get('/api/get_accounts_by_user', headers={"Accept-Encoding": "gzip"})
+    assert response.headers["ETag"] == plain[:-1] + '-gzip"'
+
+    response = client.get('/api/get_accounts_by_user',
+                          headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
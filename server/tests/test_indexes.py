@@ -0,0 +1,79 @@
+from unittest.mock import MagicMock, patch
+import mongomock
+import pytest
+from flask import Flask
+from pymongo.errors import DuplicateKeyError
+import manage
+from indexes import INDEXES, ensure_indexes, plan_stages
+from routes import api
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    client = app.test_client()
+    yield client
+
+
+def test_ensure_indexes_creates_every_declared_index():
+    db = mongomock.MongoClient().db
+
+    created = ensure_indexes(db)
+
+    assert set(created) == set(INDEXES)
+    assert db.User.index_information()['email_1']['unique']
+    assert 'AccountID_1_Date_1__id_1' in db.TransactionLog.index_information()
+    # Running it again is a no-op
+    assert ensure_indexes(db) == created
+
+
+def test_plan_stages_reports_index_scans():
+    plan = {
+        "stage": "FETCH",
+        "inputStage": {"stage": "IXSCAN", "indexName": "userID_1"}
+    }
+    assert plan_stages(plan) == "FETCH <- IXSCAN (userID_1)"
+
+
+def scanning_db():
+    # Sorted route queries plan as a collection scan, the others use an index
+    db = MagicMock()
+    db.__getitem__.return_value.find_one.return_value = None
+    db.__getitem__.return_value.find.return_value.sort.return_value.explain.return_value = {
+        "queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}
+    }
+    db.__getitem__.return_value.find.return_value.explain.return_value = {
+        "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}
+    }
+    return db
+
+
+def test_manage_explain_flags_collection_scans(capsys):
+    with patch('manage.get_db', return_value=scanning_db()):
+        assert manage.main(["explain"]) == 1
+
+    output = capsys.readouterr().out
+    assert "OK   login / check_email" in output
+    assert "SCAN transaction_logs" in output
+
+
+def test_manage_ensure_indexes_explain_fails_on_collection_scans(capsys):
+    with patch('manage.get_db', return_value=scanning_db()), \
+            patch('manage.ensure_indexes', return_value={"User": ["email_1"]}):
+        assert manage.main(["ensure-indexes", "--explain"]) == 1
+        assert manage.main(["ensure-indexes"]) == 0
+
+    assert "User: email_1" in capsys.readouterr().out
+
+
+@patch('routes.users_collection')
+def test_create_user_duplicate_email(mock_users_collection, client):
+    mock_users_collection.insert_one.side_effect = DuplicateKeyError("E11000 duplicate key error")
+
+    response = client.post('/api/create_user', json={
+        "first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", "password": "secret"
+    })
+
+    assert response.status_code == 409
@@ -0,0 +1,44 @@
+from datetime import datetime
+from unittest.mock import patch
+import pytest
+from bson import Decimal128, ObjectId
+from flask import Flask, jsonify
+from json_provider import BSONJSONProvider
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = BSONJSONProvider(app)
+    return app
+
+
+def test_jsonify_bson_types(app):
+    object_id = ObjectId()
+    with app.app_context():
+        response = jsonify({
+            "_id": object_id,
+            "Date": datetime(2024, 9, 1, 12, 30),
+            "Amount": Decimal128("100.25")
+        })
+
+    assert response.get_json() == {
+        "_id": str(object_id),
+        "Date": "2024-09-01T12:30:00",
+        "Amount": 100.25
+    }
+
+
+def test_stdlib_fallback_matches_orjson(app):
+    data = {"_id": ObjectId(), "Date": datetime(2024, 9, 1), "Amount": Decimal128("1.5")}
+    with app.app_context():
+        fast = app.json.loads(app.json.dumps(data))
+        with patch('json_provider.orjson', None):
+            slow = app.json.loads(app.json.dumps(data))
+
+    assert fast == slow
+
+
+def test_unknown_type_raises(app):
+    with pytest.raises(TypeError):
+        app.json.dumps({"value": object()})
@@ -0,0 +1,257 @@
+import threading
+import time
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from flask import Flask
+import auth
+import db as database
+import ledger
+import rollups
+from routes import api
+
+
+class AtomicCollection:
+    # mongomock runs find_one_and_update as a separate read and write, while the server
+    # applies every single-document write atomically; serialize calls to match that
+    def __init__(self, collection):
+        self._collection = collection
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+class AtomicDatabase:
+    # The stand-in database with every collection wrapped in one shared AtomicCollection
+    def __init__(self, database):
+        self._database = database
+        self._collections = {}
+
+    def __getitem__(self, name):
+        return self._collections.setdefault(name, AtomicCollection(self._database[name]))
+
+
+@pytest.fixture
+def db(db, monkeypatch):
+    atomic = AtomicDatabase(db)
+    monkeypatch.setattr(database, "get_db", lambda: atomic)
+    return db
+
+
+@pytest.fixture
+def user_id():
+    return ObjectId()
+
+
+def open_account(db, user_id, balance):
+    return db.Account.insert_one({"userID": user_id, "balance": balance, "status": "Active"}).inserted_id
+
+
+def test_deposit_updates_balance_and_logs(db, user_id):
+    account = open_account(db, user_id, 100.0)
+
+    result = ledger.deposit(account, user_id, 50.0)
+
+    assert result["balance"] == 150.0
+    assert db.Account.find_one({"_id": account})["balance"] == 150.0
+    assert db.TransactionLog.find_one({"AccountID": account})["Amount"] == 50.0
+
+
+def test_transfer_writes_both_legs(db, user_id):
+    source, target = open_account(db, user_id, 100.0), open_account(db, ObjectId(), 0.0)
+
+    result = ledger.transfer(source, user_id, 40.0, to_account_id=target)
+
+    assert result["balance"] == 60.0
+    assert db.Account.find_one({"_id": target})["balance"] == 40.0
+    legs = list(db.TransactionLog.find({"TransferID": result["transfer_id"]}))
+    assert sorted(leg["Amount"] for leg in legs) == [-40.0, 40.0]
+
+
+def test_transfer_insufficient_funds(db, user_id):
+    source = open_account(db, user_id, 10.0)
+
+    with pytest.raises(ledger.InsufficientFunds):
+        ledger.transfer(source, user_id, 40.0)
+    assert db.Account.find_one({"_id": source})["balance"] == 10.0
+
+
+def test_transfer_from_someone_elses_account(db, user_id):
+    source = open_account(db, ObjectId(), 100.0)
+
+    with pytest.raises(ledger.AccountNotFound):
+        ledger.transfer(source, user_id, 40.0)
+
+
+def test_transfer_to_missing_account_is_compensated(db, user_id):
+    source = open_account(db, user_id, 100.0)
+
+    with pytest.raises(ledger.AccountNotFound):
+        ledger.transfer(source, user_id, 40.0, to_account_id=ObjectId())
+
+    # The debit was rolled back and no ledger legs were written
+    assert db.Account.find_one({"_id": source})["balance"] == 100.0
+    assert db.TransactionLog.count_documents({}) == 0
+
+
+def test_concurrent_transfers_reconcile(db, user_id):
+    # Many threads drain one account; the guard must stop it exactly at zero
+    threads, attempts, amount = 16, 200, 1.0
+    source, target = open_account(db, user_id, 1000.0), open_account(db, user_id, 0.0)
+    outcomes = {"ok": 0, "rejected": 0}
+    outcomes_lock = threading.Lock()
+
+    def worker():
+        for _ in range(attempts):
+            try:
+                ledger.transfer(source, user_id, amount, to_account_id=target)
+                outcome = "ok"
+            except ledger.InsufficientFunds:
+                outcome = "rejected"
+            with outcomes_lock:
+                outcomes[outcome] += 1
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"{threads * attempts / elapsed:.0f} transfer ops/sec across {threads} threads")
+
+    assert outcomes == {"ok": 1000, "rejected": threads * attempts - 1000}
+    assert db.Account.find_one({"_id": source})["balance"] == 0.0
+    assert db.Account.find_one({"_id": target})["balance"] == 1000.0
+
+    # The ledger legs reconcile with the balances
+    ledger_total = sum(leg["Amount"] for leg in db.TransactionLog.find({"AccountID": target}))
+    assert ledger_total == 1000.0
+    assert db.TransactionLog.count_documents({"AccountID": source}) == 1000
+
+
+def test_add_transaction_transfers_between_accounts(db, user_id):
+    source, target = open_account(db, user_id, 100.0), open_account(db, user_id, 0.0)
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    client = app.test_client()
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
+
+    transfer = {
+        "type": "transfer",
+        "amount": 25,
+        "date": "2024-09-01",
+        "category": "Transfer",
+        "account_id": str(source),
+        "to_account_id": str(target)
+    }
+    response = client.post(f'/api/user/{user_id}/transaction', json=transfer)
+    assert response.status_code == 201
+    assert response.get_json()["balance"] == 75.0
+    assert db.transactions.find_one()["account_id"] == source
+
+    # A second transfer larger than the remaining balance is refused
+    response = client.post(f'/api/user/{user_id}/transaction', json=dict(transfer, amount=100))
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize("amount", [float("nan"), float("inf"), float("-inf"), 0, -5.0])
+def test_non_finite_or_non_positive_amounts_are_refused(db, user_id, amount):
+    source, target = open_account(db, user_id, 100.0), open_account(db, user_id, 0.0)
+
+    with pytest.raises(ValueError):
+        ledger.deposit(source, user_id, amount)
+    with pytest.raises(ValueError):
+        ledger.transfer(source, user_id, amount, to_account_id=target)
+    assert db.Account.find_one({"_id": source})["balance"] == 100.0
+    assert db.TransactionLog.count_documents({}) == 0
+
+
+@pytest.mark.parametrize("amount", ["NaN", "Infinity", "-Infinity"])
+def test_add_transaction_rejects_non_finite_json_amounts(db, user_id, amount):
+    account = open_account(db, user_id, 100.0)
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    client = app.test_client()
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
+
+    # Python's json parses these literals into floats
+    body = ('{"type": "deposit", "amount": %s, "date": "2024-09-01", "category": "Income", "account_id": "%s"}'
+            % (amount, account))
+    response = client.post(f'/api/user/{user_id}/transaction', data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert db.Account.find_one({"_id": account})["balance"] == 100.0
+
+
+
+class HeldCollection(AtomicCollection):
+    # Holds the first write until released, so a later leg's rollup write lands before it
+    def __init__(self, collection):
+        super().__init__(collection)
+        self.held, self.release = threading.Event(), threading.Event()
+
+    def __getattr__(self, name):
+        attr = super().__getattr__(name)
+        if name not in ("update_one", "replace_one"):
+            return attr
+
+        def write(*args, **kwargs):
+            if not self.held.is_set():
+                self.held.set()
+                self.release.wait(5)
+            return attr(*args, **kwargs)
+        return write
+
+
+def test_rollup_write_landing_late_keeps_month_in_order(db, user_id, monkeypatch):
+    # Without transactions two legs' rollup writes can land in either order; the month must
+    # still open before the first leg and close after the last
+    held = HeldCollection(db.MonthlyRollup)
+    monkeypatch.setattr(rollups, "rollups_collection", held)
+    account = open_account(db, user_id, 100.0)
+    date = datetime(2024, 3, 15)
+
+    first = threading.Thread(target=ledger.deposit, args=(account, user_id, 50.0), kwargs={"date": date})
+    first.start()
+    assert held.held.wait(5)  # 100 -> 150 is applied, its rollup write is held
+    ledger.deposit(account, user_id, 20.0, date=date)  # 150 -> 170 lands first
+    held.release.set()
+    first.join()
+
+    march = db.MonthlyRollup.find_one({"account_id": account, "year": 2024, "month": 3})
+    assert (march["opening_balance"], march["closing_balance"], march["count"]) == (100.0, 170.0, 2)
+    assert (march["credits"], march["totals"]) == (70.0, {"Deposit": 70.0})
+
+
+def test_concurrent_legs_keep_the_monthly_rollup_in_order(db, user_id):
+    threads, attempts = 8, 25
+    account, other = open_account(db, user_id, 100.0), open_account(db, user_id, 0.0)
+    date = datetime(2024, 3, 15)
+
+    def worker(index):
+        for attempt in range(attempts):
+            if (index + attempt) % 2:
+                ledger.deposit(account, user_id, 2.0, date=date)
+            else:
+                ledger.transfer(account, user_id, 1.0, to_account_id=other, date=date)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    balance = db.Account.find_one({"_id": account})["balance"]
+    assert balance == 100.0 + threads * attempts / 2
+    march = db.MonthlyRollup.find_one({"account_id": account, "year": 2024, "month": 3})
+    assert (march["opening_balance"], march["closing_balance"], march["count"]) == (100.0, balance, threads * attempts)
+    march = db.MonthlyRollup.find_one({"account_id": other, "year": 2024, "month": 3})
+    assert (march["opening_balance"], march["closing_balance"]) == (0.0, threads * attempts / 2)
@@ -0,0 +1,81 @@
+import json
+import logging
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+import metrics
+from logs import JSONFormatter
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    for metric in metrics.METRICS:
+        metric.clear()
+    yield
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/api/user/<user_id>/ping')
+    def ping(user_id):
+        return "pong"
+
+    app.config['TESTING'] = True
+    client = app.test_client()
+    yield client
+
+
+def test_requests_recorded_per_route(client):
+    client.get('/api/user/1/ping')
+    client.get('/api/user/2/ping')
+
+    output = client.get('/metrics').get_data(as_text=True)
+
+    # Both users share the URL rule's series
+    assert ('zenith_http_request_duration_seconds_count'
+            '{route="/api/user/<user_id>/ping",method="GET",status="200"} 2') in output
+    assert 'le="+Inf"' in output
+    assert 'zenith_cache_events_total{cache="accounts",event="hits"}' in output
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("latency", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(("/a",), value)
+
+    lines = histogram.render()
+
+    assert 'latency_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'latency_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_count{route="/a"} 3' in lines
+
+
+def test_command_listener_records_duration_and_documents():
+    listener = metrics.CommandMetrics()
+    started = SimpleNamespace(connection_id=("db", 27017), request_id=1, command_name="find",
+                              command={"find": "Account", "filter": {}})
+    succeeded = SimpleNamespace(connection_id=("db", 27017), request_id=1, command_name="find",
+                                duration_micros=2500, reply={"cursor": {"firstBatch": [{}, {}, {}]}})
+
+    listener.started(started)
+    listener.succeeded(succeeded)
+
+    assert 'zenith_mongo_documents_returned_total{command="find",collection="Account"} 3' in \
+        metrics.mongo_documents_returned.render()
+    assert 'zenith_mongo_command_duration_seconds_sum{command="find",collection="Account"} 0.0025' in \
+        metrics.mongo_command_duration.render()
+
+
+def test_json_log_lines_carry_extra_fields():
+    record = logging.LogRecord("routes", logging.DEBUG, __file__, 1, "Fetched transactions", None, None)
+    record.count = 3
+
+    entry = json.loads(JSONFormatter().format(record))
+
+    assert entry["message"] == "Fetched transactions"
+    assert entry["level"] == "DEBUG"
+    assert entry["count"] == 3
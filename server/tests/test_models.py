@@ -0,0 +1,64 @@
+from datetime import datetime
+from unittest.mock import patch
+import pytest
+from bson import ObjectId
+from flask import Flask
+from models import Account, Transaction, User
+from routes import api
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    client = app.test_client()
+    yield client
+
+
+def test_records_have_no_instance_dict():
+    account = Account(balance=10.0)
+    assert not hasattr(account, '__dict__')
+    with pytest.raises(AttributeError):
+        account.nickname = "Savings"
+
+
+def test_projection_maps_attributes_to_stored_fields():
+    assert Account.projection() == {"userID": 1, "accountType": 1, "balance": 1, "status": 1}
+    assert User.projection("email") == {"email": 1, "_id": 0}
+
+
+def test_round_trip_uses_stored_field_names():
+    doc = {"_id": ObjectId(), "userID": ObjectId(), "accountType": "Savings", "balance": 5.0, "status": "Active"}
+
+    account = Account.from_doc(doc)
+
+    assert account.user_id == doc["userID"]
+    assert account.to_doc() == doc
+
+
+def test_transaction_json_keeps_date_format_and_drops_unset_fields():
+    txn = Transaction(user_id="123", type="deposit", amount=10, date=datetime(2024, 9, 1), category="Income")
+
+    assert txn.to_doc() == {
+        "user_id": "123", "type": "deposit", "amount": 10, "date": datetime(2024, 9, 1), "category": "Income"
+    }
+    assert txn.to_json() == {
+        "user_id": "123", "type": "deposit", "amount": 10, "date": "2024-09-01", "category": "Income",
+        "recipient": None
+    }
+
+
+@patch('routes.users_collection')
+def test_get_all_users_never_returns_password_hashes(mock_users_collection, client):
+    mock_users_collection.find.return_value = [
+        {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", "address": ""}
+    ]
+
+    response = client.get('/api/users')
+
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", "address": ""}
+    ]
+    assert "password" not in mock_users_collection.find.call_args[0][1]
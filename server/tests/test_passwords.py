@@ -0,0 +1,87 @@
+import threading
+from unittest.mock import patch
+import pytest
+from bson import ObjectId
+from flask import Flask
+from werkzeug.security import check_password_hash, generate_password_hash
+import passwords
+from passwords import HashingPool, HashingPoolSaturated
+from routes import api
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    client = app.test_client()
+    yield client
+
+
+def test_pool_rejects_work_when_saturated():
+    pool = HashingPool(workers=1, queue_size=1)
+    release = threading.Event()
+
+    # One job running and one queued fill every slot
+    running = pool.submit(release.wait)
+    queued = pool.submit(release.wait)
+    with pytest.raises(HashingPoolSaturated):
+        pool.submit(release.wait)
+
+    release.set()
+    running.result()
+    queued.result()
+    assert pool.run(sum, [1, 2]) == 3
+    pool.shutdown()
+
+
+def test_needs_rehash_follows_configured_method():
+    current = passwords.hash_password("secret")
+    legacy = generate_password_hash("secret", method="pbkdf2:sha256:1000")
+
+    assert not passwords.needs_rehash(current)
+    assert passwords.needs_rehash(legacy)
+
+
+@patch('routes.users_collection')
+def test_login_upgrades_legacy_hash(mock_users_collection, client):
+    user = {
+        "_id": ObjectId(),
+        "first_name": "Ada",
+        "last_name": "Lovelace",
+        "email": "ada@example.com",
+        "password": generate_password_hash("secret", method="pbkdf2:sha256:1000")
+    }
+    mock_users_collection.find_one.return_value = user
+
+    response = client.post('/api/LoginPage', json={"email": user["email"], "password": "secret"})
+
+    assert response.status_code == 200
+    query, update = mock_users_collection.update_one.call_args[0]
+    assert query == {"_id": user["_id"], "password": user["password"]}
+    new_hash = update["$set"]["password"]
+    assert not passwords.needs_rehash(new_hash)
+    assert check_password_hash(new_hash, "secret")
+
+
+@patch('routes.verify_password')
+@patch('routes.users_collection')
+def test_login_sheds_load_when_pool_saturated(mock_users_collection, mock_verify_password, client):
+    mock_users_collection.find_one.return_value = {"_id": ObjectId(), "password": "hash"}
+    mock_verify_password.side_effect = HashingPoolSaturated()
+
+    response = client.post('/api/LoginPage', json={"email": "ada@example.com", "password": "secret"})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+@patch('routes.hash_password')
+def test_create_user_sheds_load_when_pool_saturated(mock_hash_password, client):
+    mock_hash_password.side_effect = HashingPoolSaturated()
+
+    response = client.post('/api/create_user', json={
+        "first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", "password": "secret"
+    })
+
+    assert response.status_code == 503
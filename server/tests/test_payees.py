@@ -0,0 +1,107 @@
+import pytest
+from bson import ObjectId
+from flask import Flask
+import auth
+import versions
+from cache import payee_cache
+from routes import api, build_payee
+
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+    yield client
+
+
+def payee_form(first="Jane", last="Doe", **fields):
+    return dict({"firstName": first, "lastName": last, "bankName": "Zenith",
+                 "accountNumber": "12345678", "accountBSB": "062-000"}, **fields)
+
+
+def test_build_payee_structures_bank_details():
+    payee = build_payee(ObjectId(), payee_form(" Jane ", "van  der Berg", accountBSB="062 000"))
+
+    assert payee.normalized_name == "jane van der berg"
+    assert payee.bank_details == {"bank_name": "Zenith", "bsb": "062-000", "account_number": "12345678"}
+
+    for field, value in (("firstName", ""), ("accountBSB", "12345"), ("accountNumber", "12ab")):
+        with pytest.raises(ValueError):
+            build_payee(ObjectId(), payee_form(**{field: value}))
+
+
+def test_payee_crud(db, client):
+    response = client.post('/api/new_payee', json=payee_form())
+    assert response.status_code == 200
+    payee_id = response.get_json()["payee_id"]
+    assert client.post('/api/new_payee', json=payee_form(accountBSB="nope")).status_code == 400
+
+    payees = client.get('/api/payees').get_json()
+    assert payees == [{"_id": payee_id, "first_name": "Jane", "last_name": "Doe", "bank_name": "Zenith",
+                       "account_bsb": "062-000", "account_number": "12345678"}]
+
+    response = client.put(f'/api/edit_payee/{payee_id}', json=payee_form("Janet"))
+    assert response.status_code == 200
+    assert client.get('/api/payees').get_json()[0]["first_name"] == "Janet"
+    assert client.put(f'/api/edit_payee/{ObjectId()}', json=payee_form()).status_code == 404
+
+    response = client.post('/api/delete_payees', json={"ids": [payee_id]})
+    assert response.get_json()["deleted"] == 1
+    assert client.get('/api/payees').get_json() == []
+
+
+def test_payees_are_scoped_to_the_user(db, client):
+    db.Payee.insert_one(build_payee(ObjectId(), payee_form()).to_doc())
+
+    assert client.get('/api/payees').get_json() == []
+    assert client.get('/api/payees?q=ja').get_json() == []
+
+
+def test_payee_list_etag(db, client):
+    client.post('/api/new_payee', json=payee_form())
+
+    response = client.get('/api/payees')
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    response = client.get('/api/payees', headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert payee_cache.stats()["hits"] >= 1
+
+    # A write changes the list, so the old ETag no longer matches
+    client.post('/api/new_payee', json=payee_form("John", "Smith"))
+    response = client.get('/api/payees', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_payee_write_in_another_worker_is_seen(db, client):
+    client.post('/api/new_payee', json=payee_form())
+    etag = client.get('/api/payees').headers["ETag"]
+    user_id = auth.verify_token(client.get_cookie(auth.SESSION_COOKIE).value)
+
+    # Another worker adds a payee: its write bumps the shared version, not this worker's cache
+    db.Payee.insert_one(build_payee(user_id, payee_form("John", "Smith")).to_doc())
+    versions.bump(user_id)
+
+    response = client.get('/api/payees', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [payee["first_name"] for payee in response.get_json()] == ["Jane", "John"]
+
+
+def test_payee_prefix_search(db, client):
+    for first, last in (("Jane", "Doe"), ("John", "Smith"), ("Joan", "Arc"), ("Bob", "Jones"), ("J.", "Dot")):
+        client.post('/api/new_payee', json=payee_form(first, last))
+
+    names = lambda url: [payee["first_name"] for payee in client.get(url).get_json()]
+
+    # Anchored on the full name, sorted, limited, and regex characters are literal
+    assert names('/api/payees?q=jo') == ["Joan", "John"]
+    assert names('/api/payees?q=JOHN%20sm') == ["John"]
+    assert names('/api/payees?q=j&limit=2') == ["J.", "Jane"]
+    assert names('/api/payees?q=j.') == ["J."]
+    assert client.get('/api/payees?q=j&limit=0').status_code == 400
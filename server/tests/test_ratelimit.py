@@ -0,0 +1,87 @@
+from unittest.mock import MagicMock, patch
+from flask import Flask
+import metrics
+import ratelimit
+from ratelimit import Limit, MemoryBucketStore, RateLimiter, RedisBucketStore
+from routes import api
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_a_burst_then_refills():
+    store = MemoryBucketStore()
+    now = 100.0
+    assert [store.take("k", 3, 0.5, now)[0] for _ in range(4)] == [True, True, True, False]
+    assert store.take("k", 3, 0.5, now) == (False, 2.0)
+
+    # One token back every two seconds, never more than the capacity
+    assert store.take("k", 3, 0.5, now + 2)[0]
+    assert not store.take("k", 3, 0.5, now + 2)[0]
+    assert [store.take("k", 3, 0.5, now + 1000)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_redis_store_fails_open():
+    client = MagicMock()
+    client.register_script.return_value = MagicMock(return_value=[0, "0.25"])
+    store = RedisBucketStore(client)
+    assert store.take("k", 5, 0.5, 100.0) == (False, 1.5)
+
+    client.register_script.return_value.side_effect = ConnectionError("down")
+    assert store.take("k", 5, 0.5, 100.0) == (True, 0.0)
+
+
+def test_login_is_limited_per_email_before_any_lookup():
+    metrics.rate_limited.clear()
+    lookup = MagicMock()
+    limiter = RateLimiter(MemoryBucketStore(), clock=Clock())
+    limits = (Limit("login_ip", 4, 60, ratelimit.client_ip), Limit("login_email", 2, 60, ratelimit.email_from_body))
+    app = Flask(__name__)
+
+    @app.route('/login', methods=['POST'])
+    @limiter.limit(*limits)
+    def login():
+        lookup()
+        return "", 404
+
+    client = app.test_client()
+    post = lambda email, ip="10.0.0.1": client.post(  # noqa: E731
+        '/login', json={"email": email, "password": "x"}, environ_base={"REMOTE_ADDR": ip})
+
+    assert post("ada@example.com").status_code == 404
+    assert post(" ADA@example.com").status_code == 404
+    # Third try for the same email, even from another address
+    response = post("ada@example.com", ip="10.0.0.2")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+    assert lookup.call_count == 2
+
+    # The first address still has two tokens for other emails, then runs out
+    assert post("bob@example.com").status_code == 404
+    assert post("cy@example.com").status_code == 404
+    assert post("dee@example.com").status_code == 429
+    rendered = metrics.render()
+    assert 'zenith_rate_limited_total{limit="login_email"} 1' in rendered
+    assert 'zenith_rate_limited_total{limit="login_ip"} 1' in rendered
+
+
+@patch('routes.users_collection')
+def test_auth_routes_are_limited(mock_users_collection, monkeypatch):
+    monkeypatch.setattr(ratelimit.limiter, "store", MemoryBucketStore())
+    mock_users_collection.find_one.return_value = None
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    client = app.test_client()
+
+    statuses = [client.get('/api/check_email?email=ada@example.com').status_code for _ in range(31)]
+    assert statuses[-2:] == [200, 429]
+    assert mock_users_collection.find_one.call_count == 30
+
+    statuses = [client.post('/api/LoginPage', json={"email": "ada@example.com", "password": "x"}).status_code
+                for _ in range(6)]
+    assert statuses == [404] * 5 + [429]
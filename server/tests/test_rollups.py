@@ -0,0 +1,95 @@
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from flask import Flask
+import auth
+import ledger
+import rollups
+from routes import api
+
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def open_account(db, user_id, balance):
+    return db.Account.insert_one({"userID": user_id, "balance": balance, "status": "Active"}).inserted_id
+
+
+def test_ledger_writes_update_monthly_rollup(db):
+    user_id = ObjectId()
+    account = open_account(db, user_id, 100.0)
+
+    ledger.deposit(account, user_id, 50.0, date=datetime(2024, 3, 2), category="Salary")
+    ledger.transfer(account, user_id, 30.0, date=datetime(2024, 3, 9), category="Groceries")
+    ledger.transfer(account, user_id, 5.0, date=datetime(2024, 4, 1), category="Groceries")
+
+    march = db.MonthlyRollup.find_one({"account_id": account, "year": 2024, "month": 3})
+    assert march["opening_balance"] == 100.0
+    assert march["closing_balance"] == 120.0
+    assert (march["credits"], march["debits"], march["count"]) == (50.0, 30.0, 2)
+    assert march["totals"] == {"Salary": 50.0, "Groceries": -30.0}
+    april = db.MonthlyRollup.find_one({"account_id": account, "year": 2024, "month": 4})
+    assert (april["opening_balance"], april["closing_balance"]) == (120.0, 115.0)
+
+
+def test_back_and_forward_dated_writes_keep_rollups_consistent(db):
+    user_id = ObjectId()
+    account = open_account(db, user_id, 100.0)
+
+    ledger.deposit(account, user_id, 50.0, date=datetime(2024, 3, 2), category="Salary")
+    # Forward-dated, then back-dated into an earlier month and into March after May exists
+    ledger.transfer(account, user_id, 10.0, date=datetime(2024, 5, 1), category="Rent")
+    ledger.deposit(account, user_id, 20.0, date=datetime(2024, 2, 20), category="Gift")
+    ledger.transfer(account, user_id, 5.0, date=datetime(2024, 3, 20), category="Groceries")
+
+    months = {(r["month"]): (r["opening_balance"], r["closing_balance"], r["count"]) for r in db.MonthlyRollup.find()}
+    assert months == {2: (100.0, 120.0, 1), 3: (120.0, 165.0, 2), 5: (165.0, 155.0, 1)}
+    assert db.Account.find_one({"_id": account})["balance"] == 155.0
+
+
+def test_rebuild_matches_incremental_rollups(db):
+    user_id = ObjectId()
+    account, other = open_account(db, user_id, 100.0), open_account(db, ObjectId(), 0.0)
+    ledger.deposit(account, user_id, 50.0, date=datetime(2024, 3, 2), category="Salary")
+    ledger.transfer(account, user_id, 30.0, to_account_id=other, date=datetime(2024, 4, 9), category="Rent.Due")
+
+    def snapshot():
+        return sorted(
+            (str(r["account_id"]), r["year"], r["month"], r["opening_balance"], r["closing_balance"],
+             r["credits"], r["debits"], r["count"], r["totals"])
+            for r in db.MonthlyRollup.find()
+        )
+
+    incremental = snapshot()
+    db.MonthlyRollup.delete_many({})
+
+    assert rollups.rebuild() == 3
+    assert snapshot() == incremental
+
+
+def test_monthly_statement_route(db, client):
+    user_id = ObjectId()
+    active, idle = open_account(db, user_id, 100.0), open_account(db, user_id, 20.0)
+    ledger.deposit(active, user_id, 50.0, date=datetime(2024, 3, 2), category="Salary")
+    ledger.deposit(idle, user_id, 5.0, date=datetime(2024, 2, 2), category="Interest")
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(user_id)))
+
+    response = client.get('/api/statements/2024/3')
+
+    assert response.status_code == 200
+    summaries = {s["account_id"]: s for s in response.json["Accounts"]}
+    assert summaries[str(active)]["closing_balance"] == 150.0
+    assert summaries[str(active)]["totals"] == {"Salary": 50.0}
+    # No activity in March: carried over from February
+    assert summaries[str(idle)]["opening_balance"] == 25.0
+    assert summaries[str(idle)]["count"] == 0
+
+
+def test_monthly_statement_rejects_invalid_month(client):
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+    assert client.get('/api/statements/2024/13').status_code == 400
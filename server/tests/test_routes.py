@@ -1,9 +1,14 @@
 from flask import Flask
 from unittest.mock import patch, MagicMock
-from bson import ObjectId
+from bson import ObjectId, json_util
 import pytest
+import auth
 from app import app
-from routes import api
+from routes import api, decode_cursor, month_date_range
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+import base64
+import json
 
 @pytest.fixture
 def client():
@@ -11,11 +16,13 @@ def client():
     app.register_blueprint(api)  # Register the 'api' blueprint
     app.config['TESTING'] = True
     client = app.test_client()
-    yield client
+    # Conditional routes read the user's data version first
+    with patch('versions.versions_collection', MagicMock(find_one=MagicMock(return_value=None))):
+        yield client
 
-@patch('server.routes.users_collection')
-@patch('server.routes.accounts_collection')
-@patch('server.routes.transaction_logs_collection')
+@patch('auth.users_collection')
+@patch('routes.accounts_collection')
+@patch('routes.transaction_logs_collection')
 def test_create_account(mock_transaction_logs_collection, mock_accounts_collection, mock_users_collection, client):
     # Create a valid ObjectId for the user
     valid_user_id = ObjectId()  # Use ObjectId directly
@@ -28,8 +35,8 @@ def test_create_account(mock_transaction_logs_collection, mock_accounts_collecti
     mock_inserted_id.inserted_id = ObjectId()  # Generate a new valid ObjectId
     mock_accounts_collection.insert_one.return_value = mock_inserted_id
 
-    # Set the user_id as a cookie directly
-    client.set_cookie('user_id', str(valid_user_id))  # Ensure it's a string
+    # Sign in as the user
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(valid_user_id)))
     
     # Send the POST request to create an account with required data
     response = client.post('/api/create_account', json={
@@ -53,7 +60,7 @@ def test_get_transaction_logs(mock_accounts_collection, mock_transaction_logs_co
     valid_user_id = str(ObjectId())
 
     # Set the user_id as a cookie directly on the client
-    client.set_cookie('user_id', valid_user_id)
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(valid_user_id))
 
     # Mock the accounts lookup to return account ids for the user
     mock_account_id = ObjectId()
@@ -89,4 +96,271 @@ def test_get_transaction_logs(mock_accounts_collection, mock_transaction_logs_co
 
     # Check that the account list is serialized correctly
     assert len(data['Accounts']) == 1
-    assert data['Accounts'][0]['_id'] == str(mock_account_id)
\ No newline at end of file
+    assert data['Accounts'][0]['_id'] == str(mock_account_id)
+
+@patch('routes.transactions_collection')
+def test_get_user_transactions_month_filter(mock_transactions_collection, client):
+    user_id = str(ObjectId())
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
+    # Mock the transactions lookup to return a BSON-dated transaction
+    mock_transactions_collection.find.return_value = [{
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "type": "deposit",
+        "amount": 100,
+        "date": datetime(2024, 9, 1),
+        "category": "Income"
+    }]
+
+    response = client.get(f'/api/user/{user_id}/transactions?month=September&year=2024')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data[0]['date'] == "2024-09-01"
+
+    # The month filter should be pushed down to MongoDB as a date range
+    query = mock_transactions_collection.find.call_args[0][0]
+    assert query == {
+        "user_id": user_id,
+        "date": {"$gte": datetime(2024, 9, 1), "$lt": datetime(2024, 10, 1)}
+    }
+
+
+def test_get_user_transactions_invalid_month(client):
+    user_id = str(ObjectId())
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
+    response = client.get(f'/api/user/{user_id}/transactions?month=Smarch')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("path", ["transactions", "analytics"])
+@patch('routes.transactions_collection')
+def test_user_reads_are_scoped_to_the_signed_in_user(mock_transactions_collection, path, client):
+    other = str(ObjectId())
+    assert client.get(f'/api/user/{other}/{path}').status_code == 401
+
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+    assert client.get(f'/api/user/{other}/{path}').status_code == 403
+    mock_transactions_collection.find.assert_not_called()
+
+
+def test_month_date_range_december():
+    # December rolls over into January of the next year
+    assert month_date_range('12', 2024) == (datetime(2024, 12, 1), datetime(2025, 1, 1))
+
+
+@patch('routes.transaction_logs_collection')
+@patch('routes.accounts_collection')
+def test_get_transaction_logs_pagination(mock_accounts_collection, mock_transaction_logs_collection, client):
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+
+    mock_account_id = ObjectId()
+    mock_accounts_collection.find.return_value = [{"_id": mock_account_id}]
+
+    # Mock one more log than the page size so a next page is detected
+    logs = [{
+        "_id": ObjectId(),
+        "Amount": 10.0 * day,
+        "Date": datetime(2024, 9, day),
+        "Description": "Deposit",
+        "AccountID": mock_account_id
+    } for day in range(1, 4)]
+    mock_transaction_logs_collection.find.return_value = logs
+
+    response = client.get('/api/transaction_logs?limit=2&start_date=2024-09-01&end_date=2024-09-30')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['TransactionLogs']) == 2
+    assert data['next_cursor']
+
+    # The date range and keyset order are evaluated by MongoDB
+    query = mock_transaction_logs_collection.find.call_args[0][0]
+    assert query['Date'] == {"$gte": datetime(2024, 9, 1), "$lt": datetime(2024, 10, 1)}
+    assert mock_transaction_logs_collection.find.call_args[1]['limit'] == 3
+
+    # Requesting the next page resumes strictly after the last log returned
+    client.get(f"/api/transaction_logs?limit=2&cursor={data['next_cursor']}")
+    query = mock_transaction_logs_collection.find.call_args[0][0]
+    after = query['$and'][1]['$or'][2]
+    assert after == {"AccountID": mock_account_id, "Date": datetime(2024, 9, 2), "_id": {"$gt": logs[1]["_id"]}}
+
+
+@patch('routes.accounts_collection')
+def test_get_transaction_logs_invalid_cursor(mock_accounts_collection, client):
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+    mock_accounts_collection.find.return_value = [{"_id": ObjectId()}]
+
+    response = client.get('/api/transaction_logs?cursor=not-a-cursor')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("position", [
+    [{"$exists": True}, {"$exists": True}, {"$exists": True}],
+    [str(ObjectId()), {"$regex": "."}, str(ObjectId())],
+    [ObjectId(), "2024-09-02", ObjectId()],
+])
+def test_decode_cursor_refuses_anything_but_a_position(position):
+    cursor = base64.urlsafe_b64encode(json_util.dumps(position).encode()).decode()
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+@patch('routes.accounts_collection')
+def test_get_dashboard(mock_accounts_collection, client):
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+
+    savings, checking = ObjectId(), ObjectId()
+    recent_savings = {"_id": ObjectId(), "AccountID": savings, "Amount": 50.0, "Date": datetime(2024, 9, 3)}
+    recent_checking = {"_id": ObjectId(), "AccountID": checking, "Amount": -20.0, "Date": datetime(2024, 9, 5)}
+
+    # Mock the single aggregation result, one monthly/recent entry per account
+    mock_accounts_collection.aggregate.return_value = iter([{
+        "_id": None,
+        "totalBalance": 1500.0,
+        "accounts": [
+            {"id": savings, "accountType": "Savings", "balance": 1000.0, "status": "Active", "TransactionCount": 1},
+            {"id": checking, "accountType": "Checking", "balance": 500.0, "status": "Active", "TransactionCount": 1}
+        ],
+        "monthly": [
+            [{"_id": {"year": 2024, "month": 9}, "in": 50.0, "out": 0}],
+            [{"_id": {"year": 2024, "month": 9}, "in": 0, "out": 20.0}]
+        ],
+        "recent": [[recent_savings], [recent_checking]]
+    }])
+
+    response = client.get('/api/dashboard?recent=1')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['TotalBalance'] == 1500.0
+    assert data['Accounts'][0]['id'] == str(savings)
+    assert data['Monthly'] == [{"year": 2024, "month": 9, "in": 50.0, "out": 20.0}]
+    assert [log['_id'] for log in data['RecentLogs']] == [str(recent_checking['_id'])]
+
+    # Everything comes from one aggregation round trip
+    mock_accounts_collection.aggregate.assert_called_once()
+    mock_accounts_collection.find.assert_not_called()
+
+
+@patch('routes.accounts_collection')
+def test_get_dashboard_no_accounts(mock_accounts_collection, client):
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+    mock_accounts_collection.aggregate.return_value = iter([])
+
+    response = client.get('/api/dashboard')
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("recent", ["abc", "0", "-1"])
+@patch('routes.accounts_collection')
+def test_get_dashboard_invalid_recent(mock_accounts_collection, recent, client):
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+
+    response = client.get(f'/api/dashboard?recent={recent}')
+
+    assert response.status_code == 400
+    mock_accounts_collection.aggregate.assert_not_called()
+
+
+def bulk_row(key, **overrides):
+    row = {
+        "user_id": "123",
+        "transaction_key": key,
+        "type": "deposit",
+        "amount": 100,
+        "date": "2024-09-01",
+        "category": "Income"
+    }
+    row.update(overrides)
+    return row
+
+
+# Service credentials of the core banking feed
+SERVICE_HEADERS = {"Authorization": "Bearer feed-token"}
+
+
+@pytest.fixture
+def service_token(monkeypatch):
+    monkeypatch.setattr(auth, "SERVICE_TOKENS", ("feed-token",))
+
+
+@patch('routes.transactions_collection')
+def test_bulk_ingest_ndjson_reports_row_failures(mock_transactions_collection, client, service_token):
+    mock_transactions_collection.insert_many.side_effect = lambda docs, ordered: MagicMock(
+        inserted_ids=[ObjectId() for _ in docs]
+    )
+
+    body = "\n".join([
+        json.dumps(bulk_row("a")),
+        json.dumps(bulk_row("b", amount="lots")),
+        "{not json",
+        json.dumps(bulk_row("c", date="2024-09-02"))
+    ])
+    response = client.post('/api/transactions/bulk', data=body, content_type='application/x-ndjson',
+                           headers=SERVICE_HEADERS)
+
+    assert response.status_code == 207
+    data = response.get_json()
+    assert data['received'] == 4
+    assert data['inserted'] == 2
+    assert [failure['row'] for failure in data['failed']] == [1, 2]
+
+    # Valid rows are written together, unordered, with their idempotency keys
+    docs = mock_transactions_collection.insert_many.call_args[0][0]
+    assert [doc['transaction_key'] for doc in docs] == ["a", "c"]
+    assert mock_transactions_collection.insert_many.call_args[1] == {"ordered": False}
+
+
+@patch('routes.transactions_collection')
+def test_bulk_ingest_duplicate_keys_are_idempotent(mock_transactions_collection, client, service_token):
+    # Row 'a' was already ingested by an earlier run of the batch
+    mock_transactions_collection.insert_many.side_effect = BulkWriteError({
+        "nInserted": 1,
+        "writeErrors": [{"index": 0, "code": 11000, "errmsg": "duplicate key"}]
+    })
+
+    response = client.post('/api/transactions/bulk', json=[bulk_row("a"), bulk_row("b")], headers=SERVICE_HEADERS)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['inserted'] == 1
+    assert data['duplicates'] == 1
+    assert data['failed'] == []
+
+
+def test_bulk_ingest_rejects_non_array_body(client, service_token):
+    response = client.post('/api/transactions/bulk', json={"not": "a list"}, headers=SERVICE_HEADERS)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Bearer wrong"}, {"Authorization": "feed-token"}])
+@patch('routes.transactions_collection')
+def test_bulk_ingest_requires_service_credentials(mock_transactions_collection, headers, client, service_token):
+    # A signed-in user's session is not enough either
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+
+    response = client.post('/api/transactions/bulk', json=[bulk_row("a")], headers=headers)
+
+    assert response.status_code == 401
+    mock_transactions_collection.insert_many.assert_not_called()
+
+
+@patch('routes.transactions_collection')
+def test_bulk_ingest_ordered_reports_rows_after_failure(mock_transactions_collection, client, service_token):
+    mock_transactions_collection.insert_many.side_effect = lambda docs, ordered: MagicMock(
+        inserted_ids=[ObjectId() for _ in docs]
+    )
+
+    rows = [bulk_row("a"), bulk_row("b", amount="lots"), bulk_row("c"), bulk_row("d")]
+    response = client.post('/api/transactions/bulk?ordered=true', json=rows, headers=SERVICE_HEADERS)
+
+    assert response.status_code == 207
+    data = response.get_json()
+    assert data['received'] == 4
+    assert data['inserted'] == 1
+    assert [failure['row'] for failure in data['failed']] == [1, 2, 3]
+    assert data['failed'][2]['error'] == "Not processed after an earlier error"
+    # Only the row before the failure is written
+    docs = mock_transactions_collection.insert_many.call_args[0][0]
+    assert [doc['transaction_key'] for doc in docs] == ["a"]
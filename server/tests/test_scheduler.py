@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from flask import Flask
+import auth
+import scheduler
+from routes import api
+
+
+@pytest.fixture
+def db(db):
+    # Stands in for the partial unique index on transaction_key
+    db.transactions.create_index("transaction_key", unique=True, sparse=True)
+    return db
+
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    client = app.test_client()
+    yield client
+
+
+@pytest.fixture
+def user_id():
+    return ObjectId()
+
+
+def open_account(db, user_id, balance):
+    return db.Account.insert_one({"userID": user_id, "balance": balance, "status": "Active"}).inserted_id
+
+
+def schedule(db, user_id, account_id, **fields):
+    # Scheduled on 2024-01-01, so the runs are due by the time the tests process them
+    data = dict({"amount": "25", "payee": "Jane Doe", "paymentType": "one-off", "selectedDate": "2024-01-31"}, **fields)
+    return db.ScheduledPayment.insert_one(
+        scheduler.new_payment(user_id, account_id, data, now=datetime(2024, 1, 1))).inserted_id
+
+
+def test_schedule_list_and_delete_routes(db, client, user_id):
+    account = open_account(db, user_id, 100.0)
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(user_id)))
+
+    start = (datetime.utcnow() + timedelta(days=30)).strftime("%Y-%m-%d")
+    response = client.post('/api/schedule_payment', json={
+        "amount": "25", "payee": "Jane Doe", "paymentType": "recurring", "selectedDate": start,
+        "recurrence": "monthly", "endDate": None
+    })
+    assert response.status_code == 201
+    payment_id = response.get_json()["payment_id"]
+
+    payments = client.get('/api/scheduled_payments').get_json()
+    assert payments[0]["_id"] == payment_id
+    assert payments[0]["payee"] == "Jane Doe"
+    assert payments[0]["selected_date"] == start
+    assert payments[0]["is_indefinite"] is True
+    assert db.ScheduledPayment.find_one()["account_id"] == account
+
+    assert client.delete(f'/api/delete_payment/{payment_id}').status_code == 200
+    assert client.delete(f'/api/delete_payment/{payment_id}').status_code == 404
+
+
+def test_schedule_payment_validation(db, client, user_id):
+    open_account(db, user_id, 100.0)
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(user_id)))
+
+    response = client.post('/api/schedule_payment', json={"amount": "-5", "payee": "Jane", "selectedDate": "2024-01-01"})
+    assert response.status_code == 400
+
+
+def test_start_date_in_the_past_is_refused(user_id):
+    now = datetime(2024, 6, 15, 9, 30)
+    data = {"amount": "25", "payee": "Jane", "paymentType": "recurring", "recurrence": "weekly"}
+
+    with pytest.raises(ValueError, match="past"):
+        scheduler.new_payment(user_id, ObjectId(), dict(data, selectedDate="2023-06-15"), now=now)
+    # UTC's yesterday is still today for clients west of UTC
+    payment = scheduler.new_payment(user_id, ObjectId(), dict(data, selectedDate="2024-06-14"), now=now)
+    assert payment["next_run_at"] == datetime(2024, 6, 14)
+
+
+@pytest.mark.parametrize("amount", ["nan", "inf", "-inf", float("nan")])
+def test_non_finite_amounts_are_not_scheduled(user_id, amount):
+    with pytest.raises(ValueError, match="finite"):
+        scheduler.new_payment(user_id, ObjectId(), {"amount": amount, "payee": "Jane", "selectedDate": "2024-01-01"},
+                              now=datetime(2024, 1, 1))
+
+
+def test_due_payment_is_paid_once(db, user_id):
+    account = open_account(db, user_id, 100.0)
+    payment_id = schedule(db, user_id, account)
+
+    assert scheduler.process_due("worker-1") == {"paid": 1, "duplicate": 0, "failed": 0}
+    assert scheduler.process_due("worker-1") == {"paid": 0, "duplicate": 0, "failed": 0}
+
+    assert db.Account.find_one({"_id": account})["balance"] == 75.0
+    payment = db.ScheduledPayment.find_one({"_id": payment_id})
+    assert (payment["status"], payment["next_run_at"], payment["runs"]) == ("completed", None, 1)
+    assert db.transactions.find_one()["transaction_key"] == f"scheduled:{payment_id}:0"
+
+
+def test_leased_payment_cannot_be_claimed_twice(db, user_id):
+    schedule(db, user_id, open_account(db, user_id, 100.0))
+    now = datetime.utcnow()
+
+    assert scheduler.claim("worker-1", now) is not None
+    assert scheduler.claim("worker-2", now) is None
+    # Once the lease expires (worker died), another worker takes over
+    later = now + timedelta(seconds=scheduler.SCHEDULER_LEASE_SECONDS + 1)
+    assert scheduler.claim("worker-2", later) is not None
+
+
+def test_rerun_of_a_paid_occurrence_does_not_pay_again(db, user_id):
+    account = open_account(db, user_id, 100.0)
+    schedule(db, user_id, account)
+    payment = scheduler.claim("worker-1")
+    scheduler.pay(payment)  # Paid, but the worker died before recording it
+
+    later = datetime.utcnow() + timedelta(seconds=scheduler.SCHEDULER_LEASE_SECONDS + 1)
+    assert scheduler.process_due("worker-2", now=later) == {"paid": 0, "duplicate": 1, "failed": 0}
+
+    assert db.Account.find_one({"_id": account})["balance"] == 75.0
+    assert db.TransactionLog.count_documents({}) == 1
+
+
+def test_monthly_recurrence_is_anchored_on_the_first_date(db, user_id):
+    account = open_account(db, user_id, 100.0)
+    payment_id = schedule(db, user_id, account, paymentType="recurring", recurrence="monthly", endDate="2024-03-31")
+    runs = []
+    for _ in range(4):
+        runs.append(db.ScheduledPayment.find_one({"_id": payment_id})["next_run_at"])
+        scheduler.process_due("worker-1", now=datetime(2025, 1, 1))
+
+    assert runs == [datetime(2024, 1, 31), datetime(2024, 2, 29), datetime(2024, 3, 31), None]
+    assert db.Account.find_one({"_id": account})["balance"] == 25.0
+    assert db.ScheduledPayment.find_one({"_id": payment_id})["status"] == "completed"
+
+
+def test_failed_payment_is_retried_then_given_up(db, user_id, monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHEDULER_MAX_ATTEMPTS", 2)
+    payment_id = schedule(db, user_id, open_account(db, user_id, 10.0))
+    far_future = datetime.utcnow() + timedelta(days=365)
+
+    assert scheduler.process_due("worker-1")["failed"] == 1
+    payment = db.ScheduledPayment.find_one({"_id": payment_id})
+    assert payment["status"] == "scheduled" and payment["next_run_at"] > datetime.utcnow()
+    assert payment["last_error"] == "Insufficient funds"
+
+    assert scheduler.process_due("worker-1", now=far_future)["failed"] == 1
+    payment = db.ScheduledPayment.find_one({"_id": payment_id})
+    assert (payment["status"], payment["next_run_at"]) == ("failed", None)
@@ -0,0 +1,95 @@
+import csv
+import io
+import resource
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+import auth
+from routes import api
+
+ACCOUNT_ID = ObjectId()
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(str(ObjectId())))
+    yield client
+
+
+class SyntheticTransactionLogs:
+    # Local stand-in for the TransactionLog collection that yields rows lazily
+    def __init__(self, count):
+        self.count = count
+        self.find_kwargs = None
+
+    def find(self, query, projection=None, **kwargs):
+        self.find_kwargs = kwargs
+        start = datetime(2024, 1, 1)
+        return ({
+            "_id": ObjectId(),
+            "AccountID": ACCOUNT_ID,
+            "Date": start + timedelta(minutes=i),
+            "Amount": float(i % 500) - 250.0,
+            "Description": f"Synthetic transaction {i}"
+        } for i in range(self.count))
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def stream_lines(response):
+    lines = 0
+    for chunk in response.response:
+        lines += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+    response.close()
+    return lines
+
+
+@patch('routes.accounts_collection')
+def test_export_csv(mock_accounts_collection, client):
+    mock_accounts_collection.find.return_value = [{"_id": ACCOUNT_ID}]
+
+    with patch('routes.transaction_logs_collection', SyntheticTransactionLogs(3)):
+        response = client.get('/api/statements/export?format=csv')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 3
+    assert rows[0]['AccountID'] == str(ACCOUNT_ID)
+    assert rows[0]['Date'] == '2024-01-01T00:00:00'
+
+
+@patch('routes.accounts_collection')
+def test_export_invalid_format(mock_accounts_collection, client):
+    response = client.get('/api/statements/export?format=xml')
+    assert response.status_code == 400
+
+
+@patch('routes.accounts_collection')
+def test_export_million_rows_bounded_memory(mock_accounts_collection, client):
+    mock_accounts_collection.find.return_value = [{"_id": ACCOUNT_ID}]
+
+    # Warm up with a small export so the baseline includes Flask/werkzeug overhead
+    with patch('routes.transaction_logs_collection', SyntheticTransactionLogs(10_000)):
+        assert stream_lines(client.get('/api/statements/export', buffered=False)) == 10_000
+    baseline = peak_rss_mb()
+
+    logs = SyntheticTransactionLogs(1_000_000)
+    with patch('routes.transaction_logs_collection', logs):
+        response = client.get('/api/statements/export?format=ndjson', buffered=False)
+        assert response.mimetype == 'application/x-ndjson'
+        assert stream_lines(response) == 1_000_000
+
+    # Buffering 1M rows would take hundreds of MB; streaming stays within a few batches
+    assert peak_rss_mb() - baseline < 50
+    assert logs.find_kwargs['batch_size'] > 0
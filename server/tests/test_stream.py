@@ -0,0 +1,106 @@
+import asyncio
+import json
+import threading
+import pytest
+from bson import ObjectId
+from flask import Flask
+import auth
+import ledger
+import stream
+from routes import api
+from stream import RESYNC, AsyncSubscription, StreamHub, Subscription
+
+
+def next_event(subscription, timeout=5):
+    # The next non-heartbeat event as (name, data)
+    event = subscription.get(timeout)
+    assert event is not None and event is not RESYNC
+    fields = dict(line.split(": ", 1) for line in event.strip().split("\n"))
+    return fields["event"], json.loads(fields["data"])
+
+
+@pytest.fixture
+def make_hub(db):
+    # Hubs whose watchers are stopped before the stand-in database is dropped, so no
+    # thread goes on to poll the real one
+    hubs = []
+
+    def make(**options):
+        hubs.append(StreamHub(**options))
+        return hubs[-1]
+    yield make
+    for hub in hubs:
+        hub.stop()
+
+
+def test_pushes_balances_and_new_logs_by_polling(db, make_hub):
+    hub = make_hub(source="auto", poll_seconds=0.05)
+    user_id = ObjectId()
+    account = db.Account.insert_one({"userID": user_id, "balance": 100.0, "status": "Active"}).inserted_id
+    subscription = hub.subscribe(Subscription(user_id))
+
+    assert next_event(subscription) == ("snapshot", {"accounts": [{"account_id": str(account), "balance": 100.0}]})
+    assert hub.mode == "poll"  # mongomock has no change streams
+
+    ledger.deposit(account, user_id, 25.0, description="Pay day")
+    events = dict(next_event(subscription) for _ in range(2))
+    assert events["balance"] == {"account_id": str(account), "balance": 125.0}
+    assert events["transaction_log"]["Description"] == "Pay day"
+
+    # Another user's writes aren't sent, and nothing is sent twice
+    other = ObjectId()
+    ledger.deposit(db.Account.insert_one({"userID": other, "balance": 0.0}).inserted_id, other, 5.0)
+    assert subscription.get(0.3) is None
+
+
+def test_one_watcher_serves_every_stream(db, make_hub):
+    hub = make_hub(source="poll", poll_seconds=0.05)
+    threads = threading.active_count()
+    subscriptions = [hub.subscribe(Subscription(ObjectId())) for _ in range(50)]
+    assert hub.subscriber_count() == 50
+    assert threading.active_count() == threads + 1
+
+    for subscription in subscriptions:
+        hub.unsubscribe(subscription)
+    assert hub.subscriber_count() == 0
+
+    hub.stop()
+    assert threading.active_count() == threads
+
+
+def test_slow_client_is_told_to_resync():
+    subscription = Subscription(ObjectId(), maxsize=1)
+    subscription.publish("event: a\n\n")
+    subscription.publish("event: b\n\n")
+    assert subscription.get(0) is RESYNC
+
+
+def test_async_subscription_times_out_to_a_heartbeat():
+    async def read():
+        subscription = AsyncSubscription(ObjectId(), asyncio.get_running_loop())
+        first = await subscription.get(0.01)
+        subscription.publish("event: a\n\n")
+        return first, await subscription.get(1)
+
+    assert asyncio.run(read()) == (None, "event: a\n\n")
+
+
+def test_stream_route(db, make_hub, monkeypatch):
+    monkeypatch.setattr(stream, "hub", make_hub(source="poll", poll_seconds=0.05))
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    client = app.test_client()
+
+    assert client.get('/api/stream').status_code == 401
+
+    user_id = ObjectId()
+    db.Account.insert_one({"userID": user_id, "balance": 10.0})
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
+    response = client.get('/api/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.iter_encoded()
+    assert next(chunks) == b"retry: 5000\n\n"
+    assert next(chunks).startswith(b"event: snapshot\n")
+
+    response.close()
+    assert stream.hub.subscriber_count() == 0
@@ -0,0 +1,138 @@
+import pytest
+from bson import ObjectId
+from flask import Flask
+import auth
+import metrics
+import velocity
+from routes import api
+from velocity import MemoryWindowStore, RedisWindowStore, Rule, RuleEngine, VelocityLimitExceeded
+
+
+class FakeRedis:
+    # In-memory stand-in for the hash, set and pipeline calls RedisWindowStore makes
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+    def hincrby(self, key, field, amount):
+        hash_ = self.data.setdefault(key, {})
+        hash_[field] = int(hash_.get(field, 0)) + amount
+
+    def hincrbyfloat(self, key, field, amount):
+        hash_ = self.data.setdefault(key, {})
+        hash_[field] = float(hash_.get(field, 0)) + amount
+
+    def hgetall(self, key):
+        return {field.encode(): str(value).encode() for field, value in self.data.get(key, {}).items()}
+
+    def expire(self, key, seconds):
+        pass
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.data.get(key, {}).pop(field, None)
+
+    def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(member)
+
+    def sismember(self, key, member):
+        return member in self.data.get(key, set())
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    return MemoryWindowStore(bucket_seconds=10) if request.param == "memory" \
+        else RedisWindowStore(FakeRedis(), bucket_seconds=10)
+
+
+def test_count_limit_slides_with_the_window(store):
+    clock = Clock()
+    engine = RuleEngine(store, [Rule("transfers", 600, max_count=2)], clock=clock)
+
+    engine.check("u1", "transfer", 10.0)
+    engine.check("u1", "transfer", 10.0)
+    with pytest.raises(VelocityLimitExceeded) as e:
+        engine.check("u1", "transfer", 10.0)
+    assert e.value.rule.name == "transfers"
+
+    # Other users, and deposits, have their own (or no) windows
+    engine.check("u2", "transfer", 10.0)
+    engine.check("u1", "deposit", 10.0)
+
+    clock.now += 610
+    engine.check("u1", "transfer", 10.0)
+    assert store.totals("transfers:u1", clock.now, 600) == (1, 10.0)
+
+
+def test_amount_limit_for_new_recipients(store):
+    clock = Clock()
+    engine = RuleEngine(store, [Rule("new", 600, max_amount=100.0, new_recipients_only=True)], clock=clock)
+
+    engine.check("u1", "transfer", 80.0, recipient="alice")
+    with pytest.raises(VelocityLimitExceeded):
+        engine.check("u1", "transfer", 30.0, recipient="bob")
+
+    # Once paid, a recipient is no longer new and the rule doesn't apply
+    engine.remember_recipient("u1", "alice")
+    engine.check("u1", "transfer", 500.0, recipient="alice")
+
+
+def test_blocked_attempts_are_not_counted(store):
+    engine = RuleEngine(store, [Rule("amount", 600, max_amount=100.0)], clock=Clock())
+
+    with pytest.raises(VelocityLimitExceeded):
+        engine.check("u1", "transfer", 150.0)
+    engine.check("u1", "transfer", 100.0)
+
+
+def test_blocks_are_counted_in_metrics():
+    metrics.velocity_blocks.clear()
+    engine = RuleEngine(MemoryWindowStore(), [Rule("one", 60, max_count=1)])
+    engine.check("u1", "transfer", 1.0)
+    with pytest.raises(VelocityLimitExceeded):
+        engine.check("u1", "transfer", 1.0)
+    assert 'zenith_velocity_blocks_total{rule="one"} 1' in metrics.render()
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(velocity, "engine", RuleEngine(MemoryWindowStore(), [
+        Rule("transfers", 600, max_count=2), Rule("new", 600, max_amount=100.0, new_recipients_only=True)
+    ]))
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.database = db
+    return client
+
+
+def test_add_transaction_enforces_velocity_rules(client):
+    user_id = ObjectId()
+    account = client.database.Account.insert_one({"userID": user_id, "balance": 1000.0, "status": "Active"}).inserted_id
+    transfer = {"type": "transfer", "amount": 60, "date": "2024-09-01", "category": "Bills",
+                "account_id": str(account), "recipient": "Power Co"}
+    client.set_cookie(auth.SESSION_COOKIE, auth.issue_token(user_id))
+
+    assert client.post(f'/api/user/{user_id}/transaction', json=transfer).status_code == 201
+    # Power Co is known now, so the new-recipient limit doesn't apply to the second one
+    assert client.post(f'/api/user/{user_id}/transaction', json=transfer).status_code == 201
+
+    response = client.post(f'/api/user/{user_id}/transaction', json=transfer)
+    assert response.status_code == 429
+    assert response.get_json()["rule"] == "transfers"
+    assert response.headers["Retry-After"] == "600"
+    assert client.database.Account.find_one({"_id": account})["balance"] == 880.0
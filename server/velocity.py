@@ -0,0 +1,245 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+import metrics
+
+# Velocity (fraud) rules on the transaction write path. Each rule limits how many, and how
+# much, matching transactions a user makes within a sliding window; counters live in a
+# store (per-process memory by default, Redis to share them between workers), so no
+# rule ever queries the transactions collection.
+VELOCITY_ENABLED = os.getenv("VELOCITY_ENABLED", "true").lower() in ("1", "true", "yes")
+# Width of one counter bucket; windows slide a bucket at a time
+VELOCITY_BUCKET_SECONDS = float(os.getenv("VELOCITY_BUCKET_SECONDS", 10))
+# How long a recipient stays 'known' after the user last paid them
+VELOCITY_RECIPIENT_MEMORY_SECONDS = float(os.getenv("VELOCITY_RECIPIENT_MEMORY_SECONDS", 90 * 24 * 3600))
+# Most (rule, user) windows and recipient sets the in-memory store keeps, least recently used dropped
+VELOCITY_MAX_KEYS = int(os.getenv("VELOCITY_MAX_KEYS", 1000000))
+
+
+class VelocityLimitExceeded(Exception):
+    def __init__(self, rule):
+        super().__init__(f"Too many transactions: {rule.description}")
+        self.rule = rule
+
+
+class Event:
+    """One attempted deposit or transfer, as the rules see it."""
+
+    __slots__ = ("user_id", "kind", "amount", "recipient", "new_recipient")
+
+    def __init__(self, user_id, kind, amount, recipient=None, new_recipient=False):
+        self.user_id = user_id
+        self.kind = kind  # 'deposit' or 'transfer'
+        self.amount = amount
+        self.recipient = recipient
+        self.new_recipient = new_recipient  # A recipient the user hasn't paid recently
+
+
+class Rule:
+    """At most max_count matching transactions, or max_amount in total, per window seconds.
+
+    Subclass and override applies() for other kinds of transactions."""
+
+    def __init__(self, name, window, max_count=None, max_amount=None, kinds=("transfer",),
+                 new_recipients_only=False):
+        self.name = name
+        self.window = window
+        self.max_count = max_count
+        self.max_amount = max_amount
+        self.kinds = kinds
+        self.new_recipients_only = new_recipients_only
+
+    @property
+    def description(self):
+        limits = [f"{self.max_count} transactions" if self.max_count else None,
+                  f"${self.max_amount:g}" if self.max_amount else None]
+        scope = "to new recipients " if self.new_recipients_only else ""
+        return f"more than {' or '.join(filter(None, limits))} {scope}within {self.window / 60:g} minutes"
+
+    def applies(self, event):
+        return event.kind in self.kinds and (event.new_recipient or not self.new_recipients_only)
+
+    def exceeded(self, count, total, event):
+        # count/total cover the window before this event
+        return ((self.max_count is not None and count + 1 > self.max_count)
+                or (self.max_amount is not None and total + event.amount > self.max_amount))
+
+
+class MemoryWindowStore:
+    """Per-process sliding-window counters in fixed-width buckets, plus known-recipient sets."""
+
+    def __init__(self, bucket_seconds=VELOCITY_BUCKET_SECONDS, maxsize=VELOCITY_MAX_KEYS):
+        self.bucket_seconds = bucket_seconds
+        self.maxsize = maxsize
+        # key -> deque of [bucket, count, total], oldest first
+        self._windows = OrderedDict()
+        # key -> {member: expires_at}
+        self._members = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, now):
+        return int(now // self.bucket_seconds)
+
+    def _buckets(self, key, now, window):
+        # The key's buckets with those that slid out of the window dropped
+        buckets = self._windows.get(key)
+        if buckets is None:
+            return None
+        oldest = self._bucket(now - window)
+        while buckets and buckets[0][0] <= oldest:
+            buckets.popleft()
+        self._windows.move_to_end(key)
+        return buckets
+
+    def totals(self, key, now, window):
+        with self._lock:
+            buckets = self._buckets(key, now, window)
+            if not buckets:
+                return 0, 0.0
+            return sum(bucket[1] for bucket in buckets), sum(bucket[2] for bucket in buckets)
+
+    def add(self, key, now, amount, window):
+        bucket = self._bucket(now)
+        with self._lock:
+            buckets = self._buckets(key, now, window)
+            if buckets is None:
+                buckets = self._windows[key] = deque()
+                while len(self._windows) > self.maxsize:
+                    self._windows.popitem(last=False)
+            if buckets and buckets[-1][0] == bucket:
+                buckets[-1][1] += 1
+                buckets[-1][2] += amount
+            else:
+                buckets.append([bucket, 1, amount])
+
+    def is_member(self, key, member, now):
+        with self._lock:
+            expires_at = self._members.get(key, {}).get(member)
+            return expires_at is not None and expires_at > now
+
+    def add_member(self, key, member, now, ttl):
+        with self._lock:
+            members = self._members.get(key)
+            if members is None:
+                members = self._members[key] = {}
+                while len(self._members) > self.maxsize:
+                    self._members.popitem(last=False)
+            self._members.move_to_end(key)
+            members[member] = now + ttl
+
+
+class RedisWindowStore:
+    """Same counters in Redis hashes (one field pair per bucket), shared by every worker."""
+
+    def __init__(self, client, bucket_seconds=VELOCITY_BUCKET_SECONDS, prefix="zenith:velocity:"):
+        self._client = client
+        self.bucket_seconds = bucket_seconds
+        self._prefix = prefix
+
+    def _bucket(self, now):
+        return int(now // self.bucket_seconds)
+
+    def totals(self, key, now, window):
+        oldest = self._bucket(now - window)
+        count, total, stale = 0, 0.0, []
+        for field, value in self._client.hgetall(self._prefix + key).items():
+            field = field.decode() if isinstance(field, bytes) else field
+            bucket, _, measure = field.partition(":")
+            if int(bucket) <= oldest:
+                stale.append(field)
+            elif measure == "n":
+                count += int(value)
+            else:
+                total += float(value)
+        # Buckets that slid out are dropped here, so a busy user's hash stays small
+        if stale:
+            self._client.hdel(self._prefix + key, *stale)
+        return count, total
+
+    def add(self, key, now, amount, window):
+        bucket = self._bucket(now)
+        pipeline = self._client.pipeline()
+        pipeline.hincrby(self._prefix + key, f"{bucket}:n", 1)
+        pipeline.hincrbyfloat(self._prefix + key, f"{bucket}:amount", amount)
+        pipeline.expire(self._prefix + key, int(window + self.bucket_seconds))
+        pipeline.execute()
+
+    def is_member(self, key, member, now):
+        return bool(self._client.sismember(self._prefix + key, member))
+
+    def add_member(self, key, member, now, ttl):
+        pipeline = self._client.pipeline()
+        pipeline.sadd(self._prefix + key, member)
+        pipeline.expire(self._prefix + key, int(ttl))
+        pipeline.execute()
+
+
+class RuleEngine:
+    """Evaluates every applicable rule for an event and records it if none is exceeded."""
+
+    def __init__(self, store, rules=(), clock=time.time):
+        self.store = store
+        self.rules = list(rules)
+        self.clock = clock
+        # Check-then-record must not interleave within a process
+        self._lock = threading.Lock()
+
+    def add_rule(self, rule):
+        self.rules.append(rule)
+
+    def _key(self, rule, user_id):
+        return f"{rule.name}:{user_id}"
+
+    def check(self, user_id, kind, amount, recipient=None):
+        # Raises VelocityLimitExceeded; otherwise the event counts towards every rule's window
+        start = time.perf_counter()
+        now = self.clock()
+        try:
+            with self._lock:
+                new_recipient = recipient is not None and not self.store.is_member(
+                    f"recipients:{user_id}", str(recipient), now)
+                event = Event(user_id, kind, amount, recipient, new_recipient)
+                rules = [rule for rule in self.rules if rule.applies(event)]
+                for rule in rules:
+                    count, total = self.store.totals(self._key(rule, user_id), now, rule.window)
+                    if rule.exceeded(count, total, event):
+                        metrics.velocity_blocks.inc((rule.name,))
+                        raise VelocityLimitExceeded(rule)
+                for rule in rules:
+                    self.store.add(self._key(rule, user_id), now, amount, rule.window)
+        finally:
+            metrics.velocity_check_duration.observe((), time.perf_counter() - start)
+
+    def remember_recipient(self, user_id, recipient):
+        # After a successful transfer the recipient is no longer new to the user
+        if recipient is not None:
+            self.store.add_member(f"recipients:{user_id}", str(recipient), self.clock(),
+                                  VELOCITY_RECIPIENT_MEMORY_SECONDS)
+
+
+def default_rules():
+    # Limits per user, overridable from the environment (an unset limit is not enforced)
+    def limit(name, default, kind=int):
+        value = os.getenv(name, default)
+        return kind(value) if value not in ("", None) else None
+
+    window = limit("VELOCITY_WINDOW_SECONDS", 600, float)
+    return [
+        Rule("transfers", window, max_count=limit("VELOCITY_MAX_TRANSFERS", 20),
+             max_amount=limit("VELOCITY_MAX_TRANSFER_AMOUNT", 10000, float)),
+        Rule("new_recipient_transfers", window, max_count=limit("VELOCITY_MAX_NEW_RECIPIENTS", 3),
+             max_amount=limit("VELOCITY_MAX_NEW_RECIPIENT_AMOUNT", 2000, float), new_recipients_only=True),
+        Rule("deposits", window, max_count=limit("VELOCITY_MAX_DEPOSITS", 20), kinds=("deposit",)),
+    ]
+
+
+def build_store():
+    # VELOCITY_BACKEND=redis shares counters between workers; redis is optional
+    if os.getenv("VELOCITY_BACKEND", "memory") == "redis":
+        import redis
+        return RedisWindowStore(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    return MemoryWindowStore()
+
+
+engine = RuleEngine(build_store(), default_rules() if VELOCITY_ENABLED else ())
@@ -0,0 +1,34 @@
+import logging
+from bson.objectid import ObjectId
+from pymongo.errors import PyMongoError
+from db import get_collection
+
+logger = logging.getLogger(__name__)
+
+# One counter per user, bumped after every write to the user's accounts, ledger,
+# transactions or payees; read endpoints derive their ETags and cache keys from it
+versions_collection = get_collection("DataVersion")
+
+
+def user_key(user_id):
+    # 'transactions' stores user_id as a string; counters are keyed by the ObjectId where it is one
+    return ObjectId(user_id) if isinstance(user_id, str) and ObjectId.is_valid(user_id) else user_id
+
+
+def current(user_id):
+    doc = versions_collection.find_one({"_id": user_id}, {"version": 1})
+    return doc["version"] if doc else 0
+
+
+def bump(*user_ids):
+    # Called once the write is committed: a reader that sees the new version is guaranteed
+    # to see the new data. The write itself has already succeeded, so a failure here is
+    # only logged (clients holding the old ETag keep it until the next bump).
+    for user_id in {user_id for user_id in user_ids if user_id is not None}:
+        try:
+            # updated_at (the database's clock) lets /api/stream poll for recent changes
+            versions_collection.update_one(
+                {"_id": user_id}, {"$inc": {"version": 1}, "$currentDate": {"updated_at": True}}, upsert=True
+            )
+        except PyMongoError as e:
+            logger.exception("Error bumping data version for %s: %s", user_id, e)